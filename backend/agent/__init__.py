@@ -110,51 +110,22 @@ def tool_query_memories(
     except ImportError:
         logger.warning("hybrid_query unavailable, falling back to ILIKE")
 
-    # Fallback: ILIKE-only search (no embedding DB / no sentence-transformers)
-    from backend.database.models import Memory
+    # Fallback: substring search (pg_trgm-indexed and similarity-ranked when available)
+    from backend.rag.vector_store import substring_search
 
-    query = db.query(Memory).filter(Memory.family_id == family_id)
-
-    if person_id:
-        query = query.filter(Memory.person_id == person_id)
-
-    if date_range:
-        if date_range.get("start"):
-            query = query.filter(Memory.memory_date >= date_range["start"])
-        if date_range.get("end"):
-            query = query.filter(Memory.memory_date <= date_range["end"])
-
-    if keyword:
-        # Only match if ALL words appear (AND logic, not OR) for stricter filtering
-        terms = [t.strip() for t in keyword.split() if len(t.strip()) > 2]
-        if not terms:
-            terms = [keyword]
-        for term in terms:
-            query = query.filter(
-                Memory.title.ilike(f"%{term}%") |
-                Memory.story_text.ilike(f"%{term}%")
-            )
-
-    memories = query.order_by(Memory.memory_date.desc().nullslast()).limit(limit).all()
+    # Only match if ALL words appear (AND logic, not OR) for stricter filtering
+    terms = [t.strip() for t in keyword.split() if len(t.strip()) > 2]
+    if not terms:
+        terms = [keyword]
+    results = substring_search(family_id, terms, db, limit, person_id=person_id, date_range=date_range)
 
     logger.debug(
-        f"tool_query_memories (ILIKE fallback): keyword={keyword!r}, "
-        f"terms={[t for t in keyword.split() if len(t.strip()) > 2]!r}, "
-        f"{len(memories)} results"
+        f"tool_query_memories (substring fallback): keyword={keyword!r}, "
+        f"terms={terms!r}, {len(results)} results"
     )
 
-    results = []
-    for mem in memories:
-        person = db.query(Person).filter(Person.id == mem.person_id).first()
-        results.append({
-            "id": str(mem.id),
-            "title": mem.title,
-            "story_text": mem.story_text[:500] if mem.story_text else "",
-            "memory_date": mem.memory_date.isoformat() if mem.memory_date else None,
-            "person_name": person.name if person else "Unknown",
-            "score": 0.5,  # Neutral score for ILIKE fallback
-        })
-
+    for r in results:
+        r["story_text"] = r["story_text"][:500] if r["story_text"] else ""
     return results
 
 
@@ -1,8 +1,12 @@
 import os
+import time
 import logging
-from sqlalchemy import create_engine, text
+import threading
+import uuid
+from sqlalchemy import create_engine, text, exc as sa_exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
@@ -20,38 +24,317 @@ if DATABASE_URL.startswith("postgresql"):
     except ImportError:
         PGVECTOR_AVAILABLE = False
 
+# Connection pooling: queue (pooled, default) | pgbouncer (no app-side pool; a
+# transaction-mode PgBouncer does the pooling) | null (new connection per session)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Retire connections older than this many seconds (server/LB idle timeouts); -1 disables
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection.
+
+    Wait time is the signal that the pool is undersized: checked-out and
+    overflow counts only show the current state.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool for the asyncio engine (asyncio-aware wait queue)."""
+
+
+def _engine_kwargs(queue_pool=InstrumentedQueuePool) -> dict:
+    if DATABASE_URL.startswith("sqlite") and ":memory:" in DATABASE_URL:
+        return {}  # SQLAlchemy's default pool for in-memory SQLite keeps one shared connection
+    if DB_POOL_MODE in ("pgbouncer", "null"):
+        return {"poolclass": NullPool}
+    if DB_POOL_MODE != "queue":
+        raise ValueError(f"Unsupported DB_POOL_MODE: {DB_POOL_MODE}")
+    return {
+        "poolclass": queue_pool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 # Create engine
 if DATABASE_URL.startswith("postgresql"):
     engine = create_engine(
         DATABASE_URL,
-        poolclass=NullPool,
         connect_args={"sslmode": "prefer"} if "sslmode" not in DATABASE_URL else {},
+        **_engine_kwargs(),
     )
 else:
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+        **_engine_kwargs(),
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# ─── Async engine (API routes) ───────────────────────────────────────────────
+# Routes await their queries on an asyncio driver (asyncpg / aiosqlite) so a
+# slow query no longer stalls the event loop. The sync engine above stays for
+# init_db, Celery tasks, CLI jobs and search legs run in worker threads.
+
+def _async_url():
+    """DATABASE_URL with its driver swapped for the asyncio one, plus connect args."""
+    override = os.getenv("ASYNC_DATABASE_URL")
+    url = make_url(override or DATABASE_URL)
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        if not override:
+            url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes `ssl`, not libpq's `sslmode`
+        sslmode = url.query.get("sslmode", "prefer")
+        url = url.difference_update_query(["sslmode"])
+        connect_args["ssl"] = sslmode
+        if DB_POOL_MODE == "pgbouncer":
+            # Transaction-mode PgBouncer can hand each transaction a different
+            # server connection: no cached or reused named prepared statements
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+            url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+    elif url.get_backend_name() == "sqlite" and not override:
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, connect_args
+
+
+ASYNC_DB_AVAILABLE = False
+async_engine = None
+AsyncSessionLocal = None
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _url, _connect_args = _async_url()
+    async_engine = create_async_engine(
+        _url, connect_args=_connect_args, **_engine_kwargs(InstrumentedAsyncQueuePool),
+    )
+    # expire_on_commit=False: attribute access after commit must not trigger lazy IO
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    ASYNC_DB_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"Async database driver unavailable, API routes need asyncpg/aiosqlite + greenlet: {e}")
+
+
+# Seconds between background re-checks of database capabilities (0 disables)
+CAPABILITY_RECHECK_SECONDS = float(os.getenv("CAPABILITY_RECHECK_SECONDS", "300"))
+
+# Database features detected once at startup and refreshed in the background,
+# so request paths never spend a connection on pg_extension/catalog lookups.
+_capabilities = {"pgvector": False, "tsvector": False, "trigram": False, "fts5": False, "checked_at": 0.0}
+
+
+def detect_capabilities() -> dict:
+    """Probe the database for its search features. One connection.
+
+    PostgreSQL: pgvector, pg_trgm and the search_vector column.
+    SQLite: the memories_fts FTS5 table.
+
+    Updates the cached capabilities used by get_capabilities(). On failure the
+    previous values are kept.
+    """
+    detected = {"pgvector": False, "tsvector": False, "trigram": False, "fts5": False}
+    if DATABASE_URL.startswith("sqlite"):
+        try:
+            with engine.connect() as conn:
+                detected["fts5"] = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memories_fts'")
+                ).fetchone() is not None
+        except Exception as e:
+            logger.warning(f"Capability detection failed, keeping previous values: {e}")
+            return dict(_capabilities)
+    elif DATABASE_URL.startswith("postgresql"):
+        try:
+            with engine.connect() as conn:
+                detected["pgvector"] = conn.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'vector'")
+                ).fetchone() is not None
+                detected["trigram"] = conn.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).fetchone() is not None
+                detected["tsvector"] = conn.execute(text("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'memories' AND column_name = 'search_vector'
+                """)).fetchone() is not None
+        except Exception as e:
+            logger.warning(f"Capability detection failed, keeping previous values: {e}")
+            return dict(_capabilities)
+    _capabilities.update(detected, checked_at=time.time())
+    return dict(_capabilities)
+
+
+def get_capabilities() -> dict:
+    """Cached database capabilities; detected on first use. O(1)."""
+    if not _capabilities["checked_at"]:
+        return detect_capabilities()
+    return dict(_capabilities)
+
+
 def check_pgvector():
-    """Check if pgvector extension is available in PostgreSQL."""
-    if not DATABASE_URL.startswith("postgresql"):
-        return False
-    try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT * FROM pg_extension WHERE extname = 'vector'"))
-            return result.fetchone() is not None
-    except Exception:
-        return False
+    """Check if pgvector extension is available in PostgreSQL (cached)."""
+    return get_capabilities()["pgvector"]
+
+
+def _create_sqlite_fts(conn):
+    """FTS5 index over memories(title, story_text), kept in sync by triggers.
+
+    External-content table: the text lives only in `memories`; FTS5 stores the
+    inverted index keyed by memories.rowid. Built from existing rows on first run.
+    """
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memories_fts'")
+    ).fetchone()
+    conn.execute(text("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+            title, story_text, content='memories', content_rowid='rowid', tokenize='porter unicode61'
+        )
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts(rowid, title, story_text) VALUES (new.rowid, new.title, new.story_text);
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, title, story_text)
+            VALUES ('delete', old.rowid, old.title, old.story_text);
+        END
+    """))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF title, story_text ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, title, story_text)
+            VALUES ('delete', old.rowid, old.title, old.story_text);
+            INSERT INTO memories_fts(rowid, title, story_text) VALUES (new.rowid, new.title, new.story_text);
+        END
+    """))
+    if not exists:
+        conn.execute(text("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')"))
+        logger.info("Built memories_fts full-text index")
+    conn.commit()
+
+
+def _backfill_post_counters(conn):
+    """Fill newly added posts.likes_count/comments_count from the source tables."""
+    from backend.jobs.counters import reconcile_post_counters
+    repaired = reconcile_post_counters(conn)
+    logger.info(f"Added post counters, backfilled {repaired} posts")
+
+
+def _migrate_embedding_storage(conn, batch_size: int = 500):
+    """Convert legacy str(list) embeddings to the binary/vector column format.
+
+    - SQLite: rewrite TEXT values in place as float32 BLOBs.
+    - PostgreSQL with pgvector: cast a TEXT column to vector(384).
+    - PostgreSQL without pgvector: copy into a bytea column and swap it in.
+    Unparseable values are cleared so `reembed --target missing` regenerates them.
+    """
+    from backend.database.models import encode_embedding, EMBEDDING_DIM
+
+    def convert(select_sql: str, update_sql: str, clear_sql: str):
+        while True:
+            rows = conn.execute(text(select_sql), {"n": batch_size}).fetchall()
+            if not rows:
+                break
+            converted, broken = [], []
+            for memory_id, value in rows:
+                try:
+                    converted.append({"id": memory_id, "embedding": encode_embedding(value)})
+                except (ValueError, TypeError):
+                    broken.append({"id": memory_id})
+            if converted:
+                conn.execute(text(update_sql), converted)
+            if broken:
+                conn.execute(text(clear_sql), broken)
+            conn.commit()
+
+    if DATABASE_URL.startswith("sqlite"):
+        convert(
+            "SELECT id, embedding FROM memories WHERE typeof(embedding) = 'text' LIMIT :n",
+            "UPDATE memories SET embedding = :embedding WHERE id = :id",
+            "UPDATE memories SET embedding = NULL WHERE id = :id",
+        )
+        return
+
+    data_type = conn.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'memories' AND column_name = 'embedding'
+    """)).scalar()
+    if data_type != "text":
+        return
+    if PGVECTOR_AVAILABLE:
+        conn.execute(text(
+            f"ALTER TABLE memories ALTER COLUMN embedding TYPE vector({EMBEDDING_DIM}) "
+            f"USING embedding::vector"
+        ))
+        conn.commit()
+    else:
+        conn.execute(text("ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding_bin bytea"))
+        conn.commit()
+        convert(
+            "SELECT id, embedding FROM memories "
+            "WHERE embedding IS NOT NULL AND embedding_bin IS NULL LIMIT :n",
+            "UPDATE memories SET embedding_bin = :embedding WHERE id = :id",
+            "UPDATE memories SET embedding = NULL WHERE id = :id",
+        )
+        conn.execute(text("ALTER TABLE memories DROP COLUMN embedding"))
+        conn.execute(text("ALTER TABLE memories RENAME COLUMN embedding_bin TO embedding"))
+        conn.commit()
+    logger.info("Converted memories.embedding from text storage")
 
 
 def init_db():
     """Create all tables and migrations."""
     from backend.database.models import Base
+    if PGVECTOR_AVAILABLE:
+        # The vector type must exist before create_all emits VECTOR(384) columns
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        except Exception as e:
+            logger.warning(f"pgvector extension unavailable: {e}")
     Base.metadata.create_all(bind=engine)
+
+    # create_all skips indexes on tables that already exist; add any new ones
+    try:
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn, checkfirst=True)
+    except Exception as e:
+        logger.warning(f"Index creation warning (non-fatal): {e}")
     
     # Run migrations for existing tables (add new columns)
     try:
@@ -67,15 +350,51 @@ def init_db():
                     "interval_days": "INTEGER DEFAULT 1",
                     "ease_factor": "FLOAT DEFAULT 2.5",
                     "next_review_at": "DATETIME",
+                    "embedding_model": "VARCHAR",
                 }
                 for col_name, col_type in cols_to_add.items():
                     if col_name not in existing_cols:
                         conn.execute(text(f"ALTER TABLE memories ADD COLUMN {col_name} {col_type}"))
                         logger.info(f"Added column {col_name} to memories table")
                 conn.commit()
+
+                existing_post_cols = {row[1] for row in conn.execute(text("PRAGMA table_info(posts)")).fetchall()}
+                added_counters = False
+                for col_name in ("likes_count", "comments_count"):
+                    if col_name not in existing_post_cols:
+                        conn.execute(text(f"ALTER TABLE posts ADD COLUMN {col_name} INTEGER NOT NULL DEFAULT 0"))
+                        added_counters = True
+                if added_counters:
+                    _backfill_post_counters(conn)
+                conn.commit()
+
+                # FTS5 full-text index for keyword_search
+                try:
+                    _create_sqlite_fts(conn)
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"SQLite FTS5 index skipped (FTS5 not compiled in?): {e}")
             
+            # Legacy text embeddings -> binary/vector storage
+            try:
+                _migrate_embedding_storage(conn)
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Embedding storage migration skipped: {e}")
+
             # PostgreSQL migration
             if DATABASE_URL.startswith("postgresql"):
+                conn.execute(text("ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding_model VARCHAR"))
+                existing_post_cols = {row[0] for row in conn.execute(text("""
+                    SELECT column_name FROM information_schema.columns WHERE table_name = 'posts'
+                """)).fetchall()}
+                if not {"likes_count", "comments_count"} <= existing_post_cols:
+                    for col_name in ("likes_count", "comments_count"):
+                        conn.execute(text(
+                            f"ALTER TABLE posts ADD COLUMN IF NOT EXISTS {col_name} INTEGER NOT NULL DEFAULT 0"
+                        ))
+                    _backfill_post_counters(conn)
+                conn.commit()
                 try:
                     conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
                     try:
@@ -95,11 +414,57 @@ def init_db():
                     except Exception:
                         pass
                     conn.commit()
+                    # ANN index for semantic_search (HNSW by default, see VECTOR_INDEX)
+                    try:
+                        from backend.rag.pgvector_index import create_vector_index
+                        create_vector_index(conn)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.warning(f"Vector index creation skipped: {e}")
                 except Exception:
-                    pass
+                    conn.rollback()
+                # Trigram indexes so ILIKE '%term%' substring search avoids a full scan
+                try:
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    for column in ("title", "story_text"):
+                        conn.execute(text(f"""
+                            CREATE INDEX IF NOT EXISTS idx_memories_{column}_trgm
+                            ON memories USING GIN({column} gin_trgm_ops);
+                        """))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"pg_trgm indexes skipped: {e}")
     except Exception as e:
         logger.warning(f"Migration warning (non-fatal): {e}")
 
+    detect_capabilities()
+
+
+async def get_async_db():
+    """FastAPI dependency: one AsyncSession per request."""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database layer unavailable; install asyncpg or aiosqlite and greenlet")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def run_in_sync_session(fn, *args, **kwargs):
+    """Run blocking `fn(*args, db=<Session>, **kwargs)` in a worker thread on its
+    own sync session. For CPU-heavy sync code (embedding, agent tools) that
+    must stay off the event loop. Runs on the bounded io lane, so a saturated
+    lane raises ExecutorSaturated."""
+    from backend.utils.executors import run_io
+
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(*args, db=db, **kwargs)
+        finally:
+            db.close()
+    return await run_io(call)
+
 
 def get_db():
     db = SessionLocal()
@@ -107,3 +472,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def pool_stats() -> dict:
+    """Pool state for the sync and async engines (see _pool_stats)."""
+    stats = {"mode": DB_POOL_MODE, "sync": _pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = _pool_stats(async_engine.pool)
+    return stats
+
+
+def _pool_stats(pool) -> dict:
+    """Connection pool state plus checkout wait times (QueuePool modes only)."""
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # Negative while the pool has not yet opened pool_size connections
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            "wait_max_ms": round(pool.wait_max * 1000, 3),
+        })
+    return stats
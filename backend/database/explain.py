@@ -0,0 +1,254 @@
+"""
+EXPLAIN harness for the hot queries behind the API's request paths.
+
+Seeds a synthetic multi-family dataset, runs ANALYZE, then asks the planner
+for each registered query's plan and flags any full table scan:
+  - PostgreSQL: a "Seq Scan on <table>" node
+  - SQLite:     an EXPLAIN QUERY PLAN "SCAN <table>" step
+
+Everything runs inside one transaction that is rolled back at the end, so it
+is safe to point at a development database. Exits non-zero when a query
+scans, which makes it usable as a CI gate after schema changes.
+
+Usage:
+  python -m backend.database.explain
+  python -m backend.database.explain --families 500 --verbose
+
+Complexity: O(families * rows_per_family) inserts, one EXPLAIN per query.
+"""
+import re
+import sys
+import uuid
+import random
+import logging
+import argparse
+from datetime import datetime, date, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import select, func, update
+
+from backend.database.config import engine, init_db
+from backend.database.models import (
+    Base, User, Family, FamilyMember, Person, Relationship, Memory, Trip,
+    Post, PostLike, PostComment, Story, StoryView, VaultItem, Notification,
+    MemberRole,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ─── Hot queries ─────────────────────────────────────────────────────────────
+# Each entry builds the statement a route runs, from one seeded family's ids.
+
+HOT_QUERIES: Dict[str, Callable[[dict], object]] = {
+    "membership_check": lambda k: select(FamilyMember).where(
+        FamilyMember.family_id == k["family_id"], FamilyMember.user_id == k["user_id"]),
+    "user_families": lambda k: select(FamilyMember).where(FamilyMember.user_id == k["user_id"]),
+    "family_members": lambda k: select(FamilyMember).where(FamilyMember.family_id == k["family_id"]),
+    "people_page": lambda k: select(Person).where(Person.family_id == k["family_id"])
+        .order_by(Person.created_at.desc(), Person.id.desc()).limit(200),
+    "person_memories": lambda k: select(Memory).where(Memory.person_id == k["person_id"])
+        .order_by(Memory.memory_date.desc(), Memory.created_at.desc()),
+    "due_memories": lambda k: select(Memory).where(
+        Memory.family_id.in_([k["family_id"]]),
+        Memory.next_review_at.isnot(None),
+        Memory.next_review_at <= k["now"],
+    ).order_by(Memory.next_review_at.asc()).limit(10),
+    "family_relationships": lambda k: select(Relationship).where(Relationship.family_id == k["family_id"]),
+    "trips_page": lambda k: select(Trip).where(Trip.family_id == k["family_id"])
+        .order_by(Trip.created_at.desc(), Trip.id.desc()).limit(50),
+    "feed_page": lambda k: select(Post).where(Post.family_id == k["family_id"])
+        .order_by(Post.created_at.desc(), Post.id.desc()).limit(21),
+    "post_liked": lambda k: select(PostLike).where(
+        PostLike.post_id == k["post_id"], PostLike.user_id == k["user_id"]),
+    "post_comments": lambda k: select(PostComment).where(PostComment.post_id == k["post_id"])
+        .order_by(PostComment.created_at.asc(), PostComment.id.asc()).limit(100),
+    "active_stories": lambda k: select(Story).where(
+        Story.family_id == k["family_id"], Story.expires_at > k["now"]).order_by(Story.created_at.desc()),
+    "story_viewed": lambda k: select(StoryView).where(
+        StoryView.story_id == k["story_id"], StoryView.viewer_id == k["user_id"]),
+    "story_view_count": lambda k: select(func.count()).select_from(StoryView).where(
+        StoryView.story_id == k["story_id"]),
+    "vault_page": lambda k: select(VaultItem).where(VaultItem.family_id == k["family_id"])
+        .order_by(VaultItem.created_at.desc(), VaultItem.id.desc()).limit(100),
+    "notifications_page": lambda k: select(Notification).where(Notification.user_id == k["user_id"])
+        .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(50),
+    "unread_count": lambda k: select(func.count()).select_from(Notification).where(
+        Notification.user_id == k["user_id"], Notification.read == 0),
+    "mark_all_read": lambda k: update(Notification).where(
+        Notification.user_id == k["user_id"], Notification.read == 0).values(read=1),
+}
+
+
+# ─── Synthetic data ──────────────────────────────────────────────────────────
+
+def seed(conn, families: int = 200, members: int = 5, per_family: int = 40, rng=None) -> dict:
+    """Insert a synthetic dataset on `conn` and return one family's ids.
+
+    Per family: `members` users, `per_family` people/posts/trips/vault items,
+    4x that many memories, and comments, likes, stories, views and
+    notifications proportional to it.
+    """
+    rng = rng or random.Random(0)
+    now = datetime.utcnow()
+    rows: Dict[type, List[dict]] = {m: [] for m in (
+        User, Family, FamilyMember, Person, Relationship, Memory, Trip, Post,
+        PostLike, PostComment, Story, StoryView, VaultItem, Notification,
+    )}
+
+    def ts(days: int = 365):
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    for f in range(families):
+        user_ids = [uuid.uuid4() for _ in range(members)]
+        family_id = uuid.uuid4()
+        for i, uid in enumerate(user_ids):
+            rows[User].append({"id": uid, "email": f"{uid}@explain.invalid", "password_hash": "x",
+                               "name": f"User {f}.{i}", "created_at": ts()})
+        rows[Family].append({"id": family_id, "name": f"Family {f}", "invite_token": uuid.uuid4(),
+                             "created_by": user_ids[0], "created_at": ts()})
+        for i, uid in enumerate(user_ids):
+            rows[FamilyMember].append({"id": uuid.uuid4(), "user_id": uid, "family_id": family_id,
+                                       "role": MemberRole.admin if i == 0 else MemberRole.member,
+                                       "joined_at": ts()})
+
+        person_ids = [uuid.uuid4() for _ in range(per_family)]
+        for pid in person_ids:
+            rows[Person].append({"id": pid, "family_id": family_id, "name": "Person",
+                                 "created_by": user_ids[0], "created_at": ts()})
+        for a, b in zip(person_ids, person_ids[1:]):
+            rows[Relationship].append({"id": uuid.uuid4(), "family_id": family_id,
+                                       "person_a_id": a, "person_b_id": b, "label": "Sibling"})
+        for _ in range(per_family * 4):
+            rows[Memory].append({
+                "id": uuid.uuid4(), "family_id": family_id, "person_id": rng.choice(person_ids),
+                "title": "Memory", "story_text": "Synthetic memory", "created_by_user_id": rng.choice(user_ids),
+                "memory_date": date(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+                "created_at": ts(), "next_review_at": ts(60) + timedelta(days=30),
+                "interval_days": 1, "ease_factor": 2.5,
+            })
+        for _ in range(per_family):
+            rows[Trip].append({"id": uuid.uuid4(), "family_id": family_id, "name": "Trip",
+                               "created_by": user_ids[0], "created_at": ts()})
+            rows[VaultItem].append({"id": uuid.uuid4(), "family_id": family_id, "name": "file.jpg",
+                                    "file_url": "/uploads/file.jpg", "uploaded_by": rng.choice(user_ids),
+                                    "created_at": ts()})
+
+            post_id = uuid.uuid4()
+            rows[Post].append({"id": post_id, "family_id": family_id, "user_id": rng.choice(user_ids),
+                               "caption": "Post", "created_at": ts()})
+            for uid in rng.sample(user_ids, rng.randrange(members + 1)):
+                rows[PostLike].append({"id": uuid.uuid4(), "post_id": post_id, "user_id": uid, "created_at": ts()})
+            for _ in range(rng.randrange(4)):
+                rows[PostComment].append({"id": uuid.uuid4(), "post_id": post_id, "user_id": rng.choice(user_ids),
+                                          "text": "Nice", "created_at": ts()})
+            for uid in user_ids:
+                rows[Notification].append({"id": uuid.uuid4(), "user_id": uid, "type": "like",
+                                           "post_id": post_id, "from_user_id": rng.choice(user_ids),
+                                           "read": rng.randrange(2), "created_at": ts()})
+
+        for _ in range(max(1, per_family // 4)):
+            story_id = uuid.uuid4()
+            created = ts(3)
+            rows[Story].append({"id": story_id, "family_id": family_id, "user_id": rng.choice(user_ids),
+                                "media_url": "/uploads/s.jpg", "created_at": created,
+                                "expires_at": created + timedelta(hours=24)})
+            for uid in rng.sample(user_ids, rng.randrange(members + 1)):
+                rows[StoryView].append({"id": uuid.uuid4(), "story_id": story_id, "viewer_id": uid,
+                                        "viewed_at": ts(1)})
+
+    for model in rows:  # dict order is FK-safe
+        if rows[model]:
+            conn.execute(model.__table__.insert(), rows[model])
+
+    last_family = rows[Family][-1]["id"]
+    pick = lambda model: next(r for r in reversed(rows[model]) if r.get("family_id") == last_family)
+    post = pick(Post)
+    story = pick(Story)
+    return {
+        "family_id": last_family,
+        "user_id": rows[FamilyMember][-1]["user_id"],
+        "person_id": pick(Person)["id"],
+        "post_id": post["id"],
+        "story_id": story["id"],
+        "now": now,
+    }
+
+
+# ─── Plan inspection ─────────────────────────────────────────────────────────
+
+_TABLES = set(Base.metadata.tables)
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def explain(conn, statement) -> List[str]:
+    """Planner output for `statement`, one line per plan node.
+
+    Binds are rendered inline (through each type's bind processing, so GUIDs
+    and datetimes match what the ORM sends) because EXPLAIN rows must not go
+    through the wrapped statement's result processors.
+    """
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}").fetchall()]
+
+
+def full_scans(conn, plan: List[str]) -> List[str]:
+    """Tables the plan reads in full."""
+    pattern = _SQLITE_SCAN if conn.dialect.name == "sqlite" else _PG_SEQ_SCAN
+    scans = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) in _TABLES:
+            scans.append(match.group(1))
+    return scans
+
+
+def check_hot_queries(families: int = 200, per_family: int = 40,
+                      queries: Dict[str, Callable[[dict], object]] = None) -> List[Tuple[str, List[str], List[str]]]:
+    """Seed, ANALYZE and EXPLAIN every hot query, then roll everything back.
+
+    Returns (name, scanned_tables, plan) for each query; scanned_tables is
+    empty when the plan uses indexes only.
+    """
+    queries = queries or HOT_QUERIES
+    init_db()  # make sure every index exists before planning
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            keys = seed(conn, families=families, per_family=per_family)
+            conn.exec_driver_sql("ANALYZE")
+            report = []
+            for name, build in queries.items():
+                plan = explain(conn, build(keys))
+                report.append((name, full_scans(conn, plan), plan))
+            return report
+        finally:
+            trans.rollback()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if a hot query plans a full table scan.")
+    parser.add_argument("--families", type=int, default=200)
+    parser.add_argument("--per-family", type=int, default=40)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    failures = 0
+    for name, scans, plan in check_hot_queries(args.families, args.per_family):
+        status = f"SCAN {', '.join(scans)}" if scans else "ok"
+        failures += bool(scans)
+        print(f"{name:<24} {status}")
+        if args.verbose or scans:
+            for line in plan:
+                print(f"    {line}")
+    print(f"{failures} of {len(HOT_QUERIES)} hot queries scan a full table")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
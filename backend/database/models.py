@@ -1,8 +1,10 @@
+import os
+import json
 import uuid
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
-    Column, String, Integer, Text, DateTime, Date, ForeignKey, Enum,
+    Column, String, Integer, BigInteger, Text, DateTime, Date, ForeignKey, Enum,
     UniqueConstraint, Index, Float, LargeBinary, TypeDecorator
 )
 from sqlalchemy.dialects.postgresql import UUID
@@ -54,6 +56,63 @@ class GUID(TypeDecorator):
         return value
 
 
+# On-disk dtype for non-pgvector embeddings: float32 (exact) or float16 (half size)
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+EMBEDDING_DIM = 384
+
+
+def encode_embedding(value) -> Optional[bytes]:
+    """Pack an embedding (list, ndarray or legacy "[...]" text) into raw bytes."""
+    if value is None:
+        return None
+    import numpy as np
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=EMBEDDING_STORAGE_DTYPE).tobytes()
+
+
+def decode_embedding(value):
+    """Unpack stored bytes into a float32 ndarray (zero-copy for float32 storage).
+
+    Also accepts legacy text rows ("[0.1, ...]") not yet converted by init_db.
+    """
+    if value is None:
+        return None
+    import numpy as np
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        vector = np.frombuffer(value, dtype=EMBEDDING_STORAGE_DTYPE)
+        return vector if vector.dtype == np.float32 else vector.astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+class EmbeddingType(TypeDecorator):
+    """Embedding column: pgvector VECTOR(384) on PostgreSQL with pgvector,
+    compact float32/float16 bytes (LargeBinary) everywhere else.
+
+    Replaces the old str(list) text storage, cutting size >4x and removing
+    float formatting/parsing from every write and index load.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql" and PGVECTOR_AVAILABLE:
+            return dialect.type_descriptor(Vector(EMBEDDING_DIM))
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql" and PGVECTOR_AVAILABLE:
+            return value  # pgvector's Vector bind processor adapts lists/ndarrays
+        return encode_embedding(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql" and PGVECTOR_AVAILABLE:
+            return value  # already an ndarray from pgvector
+        return decode_embedding(value)
+
+
 Base = declarative_base()
 
 # ─── Enums ───────────────────────────────────────────────────────────────────
@@ -110,7 +169,12 @@ class FamilyMember(Base):
     role = Column(Enum(MemberRole), default=MemberRole.member)
     joined_at = Column(DateTime, default=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("user_id", "family_id"),)
+    # The unique (user_id, family_id) index serves "my families"; the reverse
+    # order serves member lists and the per-request membership check
+    __table_args__ = (
+        UniqueConstraint("user_id", "family_id"),
+        Index("ix_family_members_family_id_user_id", "family_id", "user_id"),
+    )
 
     user = relationship("User", back_populates="family_members")
     family = relationship("Family", back_populates="members")
@@ -128,6 +192,9 @@ class Person(Base):
     created_by = Column(GUID(), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination: WHERE family_id = ? ORDER BY created_at, id
+    __table_args__ = (Index("ix_people_family_id_created_at_id", "family_id", "created_at", "id"),)
+
     family = relationship("Family", back_populates="people")
     memories = relationship("Memory", back_populates="person", cascade="all, delete-orphan")
     relationships_a = relationship("Relationship", foreign_keys="[Relationship.person_a_id]", back_populates="person_a", cascade="all, delete-orphan")
@@ -137,7 +204,7 @@ class Relationship(Base):
     __tablename__ = "relationships"
 
     id = Column(GUID(), primary_key=True, default=uuid.uuid4)
-    family_id = Column(GUID(), ForeignKey("families.id"), nullable=False)
+    family_id = Column(GUID(), ForeignKey("families.id"), nullable=False, index=True)
     person_a_id = Column(GUID(), ForeignKey("people.id"), nullable=False)
     person_b_id = Column(GUID(), ForeignKey("people.id"), nullable=False)
     label = Column(String, nullable=True)
@@ -160,11 +227,10 @@ class Memory(Base):
     voice_note_url = Column(String, nullable=True)
     created_by_user_id = Column(GUID(), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    # embedding column - VECTOR(384) for pgvector, null fallback for SQLite
-    if PGVECTOR_AVAILABLE and Vector:
-        embedding = Column(Vector(384), nullable=True)
-    else:
-        embedding = Column(Text, nullable=True)
+    # embedding column - VECTOR(384) for pgvector, float32 bytes otherwise
+    embedding = Column(EmbeddingType(), nullable=True)
+    # EMBEDDING_MODEL_VERSION that produced `embedding` (drives stale re-embedding)
+    embedding_model = Column(String, nullable=True)
 
     # SM-2 Spaced Repetition fields (Section 5)
     last_shown_at = Column(DateTime, nullable=True)
@@ -172,6 +238,13 @@ class Memory(Base):
     ease_factor = Column(Float, default=2.5)
     next_review_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Person timeline: WHERE person_id = ? ORDER BY memory_date DESC
+        Index("ix_memories_person_id_memory_date", "person_id", "memory_date"),
+        # Due reviews: WHERE family_id IN (...) AND next_review_at <= now
+        Index("ix_memories_family_id_next_review_at", "family_id", "next_review_at"),
+    )
+
     person = relationship("Person", back_populates="memories")
     family = relationship("Family", back_populates="memories")
     photos = relationship("MemoryPhoto", back_populates="memory", cascade="all, delete-orphan")
@@ -223,6 +296,9 @@ class Trip(Base):
     created_by = Column(GUID(), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination: WHERE family_id = ? ORDER BY created_at, id
+    __table_args__ = (Index("ix_trips_family_id_created_at_id", "family_id", "created_at", "id"),)
+
     family = relationship("Family")
     creator = relationship("User")
     people = relationship("TripPerson", back_populates="trip", cascade="all, delete-orphan")
@@ -398,6 +474,12 @@ class Post(Base):
     caption = Column(Text, nullable=True)
     location = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Denormalized counters, updated atomically by the like/comment routes
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Keyset pagination: WHERE family_id = ? ORDER BY created_at, id
+    __table_args__ = (Index("ix_posts_family_id_created_at_id", "family_id", "created_at", "id"),)
 
     user = relationship("User")
     family = relationship("Family")
@@ -441,6 +523,9 @@ class PostComment(Base):
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination: WHERE post_id = ? ORDER BY created_at, id
+    __table_args__ = (Index("ix_post_comments_post_id_created_at_id", "post_id", "created_at", "id"),)
+
     post = relationship("Post", back_populates="comments")
     user = relationship("User")
 
@@ -457,6 +542,9 @@ class Story(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=False)
 
+    # Active stories: WHERE family_id = ? AND expires_at > now
+    __table_args__ = (Index("ix_stories_family_id_expires_at", "family_id", "expires_at"),)
+
     user = relationship("User")
     views = relationship("StoryView", back_populates="story", cascade="all, delete-orphan")
 
@@ -488,10 +576,33 @@ class VaultItem(Base):
     uploaded_by = Column(GUID(), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination: WHERE family_id = ? ORDER BY created_at, id
+    __table_args__ = (Index("ix_vault_items_family_id_created_at_id", "family_id", "created_at", "id"),)
+
     family = relationship("Family")
     uploader = relationship("User")
 
 
+class UploadBlob(Base):
+    """A content-addressed upload file, stored once per SHA-256.
+
+    ref_count counts the rows whose URL points at it (photos, voice notes,
+    story media, vault items); blobs at zero are removed by
+    `python -m backend.utils.uploads gc`.
+    """
+    __tablename__ = "upload_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)  # relative to UPLOAD_DIR
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    # GC: WHERE ref_count <= 0 AND updated_at < ?
+    __table_args__ = (Index("ix_upload_blobs_ref_count_updated_at", "ref_count", "updated_at"),)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -504,6 +615,13 @@ class Notification(Base):
     read = Column(Integer, default=0)  # 0 = unread, 1 = read
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination: WHERE user_id = ? ORDER BY created_at, id
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Unread count / mark-all-read: WHERE user_id = ? AND read = 0
+        Index("ix_notifications_user_id_read_created_at", "user_id", "read", "created_at"),
+    )
+
     user = relationship("User", foreign_keys=[user_id])
     from_user = relationship("User", foreign_keys=[from_user_id])
     post = relationship("Post")
@@ -12,7 +12,9 @@ logger = logging.getLogger(__name__)
 # Try to import Celery — gracefully degrade if unavailable
 try:
     from backend.jobs.celery_app import celery_app
-    from backend.jobs.tasks import generate_pdf, generate_embedding, precompute_resurfacing
+    from backend.jobs.tasks import (
+        generate_pdf, generate_embedding, precompute_resurfacing, reembed_memories, reconcile_post_counters,
+    )
     CELERY_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Celery/Redis not available: {e}. Async jobs disabled.")
@@ -21,6 +23,8 @@ except ImportError as e:
     generate_pdf = None
     generate_embedding = None
     precompute_resurfacing = None
+    reembed_memories = None
+    reconcile_post_counters = None
 
 
 def get_job_status(job_id: str) -> Optional[dict]:
@@ -37,6 +41,7 @@ def get_job_status(job_id: str) -> Optional[dict]:
 
 
 __all__ = [
-    "celery_app", "generate_pdf", "generate_embedding", "precompute_resurfacing",
+    "celery_app", "generate_pdf", "generate_embedding", "precompute_resurfacing", "reembed_memories",
+    "reconcile_post_counters",
     "get_job_status", "CELERY_AVAILABLE",
 ]
@@ -6,6 +6,7 @@ Configured via REDIS_URL env var (default: redis://localhost:6379/0).
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -33,5 +34,17 @@ celery_app.conf.update(
             "task": "backend.jobs.tasks.precompute_resurfacing",
             "schedule": 86400.0,  # Every 24 hours
         },
+        "reconcile-post-counters": {
+            "task": "backend.jobs.tasks.reconcile_post_counters",
+            "schedule": 3600.0,  # Every hour
+        },
     },
 )
+
+
+@worker_process_init.connect
+def _warm_up_embeddings(**kwargs):
+    """Load the embedding model once per worker process (EMBEDDING_WARMUP=true)."""
+    from backend.rag.embeddings import EMBEDDING_WARMUP, warm_up
+    if EMBEDDING_WARMUP:
+        warm_up()
@@ -0,0 +1,56 @@
+"""
+Denormalized counter maintenance for posts.
+
+posts.likes_count / posts.comments_count are updated atomically by the like
+and comment routes (UPDATE ... SET n = n +/- 1), so feed reads never aggregate.
+This module repairs any drift (crashes between statements, manual deletes,
+rows written before the columns existed) by recomputing them from the source
+tables in one UPDATE that only touches rows whose counts are wrong.
+
+Usage:
+  python -m backend.jobs.counters
+
+Complexity: O(p + l + c) for p posts, l likes, c comments (index lookups per post).
+"""
+import sys
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+_RECONCILE_SQL = text("""
+    UPDATE posts SET
+        likes_count = (SELECT count(*) FROM post_likes l WHERE l.post_id = posts.id),
+        comments_count = (SELECT count(*) FROM post_comments c WHERE c.post_id = posts.id)
+    WHERE likes_count IS NULL
+       OR comments_count IS NULL
+       OR likes_count != (SELECT count(*) FROM post_likes l WHERE l.post_id = posts.id)
+       OR comments_count != (SELECT count(*) FROM post_comments c WHERE c.post_id = posts.id)
+""")
+
+
+def reconcile_post_counters(conn) -> int:
+    """Recompute drifted post counters. Accepts a Session or Connection; the caller commits.
+
+    Returns the number of posts repaired.
+    """
+    return conn.execute(_RECONCILE_SQL).rowcount
+
+
+def main(argv=None):
+    from backend.database.config import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    db = SessionLocal()
+    try:
+        repaired = reconcile_post_counters(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Repaired counters on {repaired} posts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Bulk re-embedding pipeline for the memories table.
+
+Streams memories in keyset-paginated pages (WHERE id > :last_id ORDER BY id),
+embeds each page in batches across a process pool, and writes the vectors back
+with one executemany UPDATE per page. A checkpoint file is rewritten after
+every committed page, so an interrupted run resumes where it stopped.
+
+Targets:
+  - missing: memories without an embedding
+  - stale:   memories not embedded by the current EMBEDDING_MODEL_VERSION
+             (includes missing and pre-versioning rows)
+  - all:     every memory (e.g. after switching models)
+
+Usage:
+  python -m backend.jobs.reembed --target missing
+  python -m backend.jobs.reembed --target all --workers 4 --page-size 512 --restart
+
+Complexity: O(n) memories embedded, O(n / page_size) DB round trips.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from sqlalchemy import or_, update
+
+from backend.database.config import SessionLocal
+from backend.database.models import Memory
+from backend.rag import local_index
+from backend.rag.search_cache import invalidate_family
+from backend.rag.vector_store import uses_local_index
+from backend.rag.embeddings import embed_many, get_model, EMBEDDING_MODEL_VERSION
+
+logger = logging.getLogger(__name__)
+
+TARGETS = ("missing", "stale", "all")
+DEFAULT_PAGE_SIZE = 256
+DEFAULT_CHECKPOINT = os.getenv("REEMBED_CHECKPOINT", "./reembed_checkpoint.json")
+
+
+def _init_worker(threads_per_worker: int):
+    """Pool initializer: cap torch threads and load the model once per process."""
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    get_model()
+
+
+def _load_checkpoint(path: str, target: str) -> Optional[dict]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    # A checkpoint from a different target/model would skip the wrong rows
+    if checkpoint.get("target") != target or checkpoint.get("model_version") != EMBEDDING_MODEL_VERSION:
+        logger.info(f"Ignoring checkpoint {path} from a different run")
+        return None
+    return checkpoint
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)  # atomic: a crash never leaves a half-written checkpoint
+
+
+def _target_filter(query, target: str):
+    if target == "missing":
+        return query.filter(Memory.embedding.is_(None))
+    if target == "stale":
+        return query.filter(or_(
+            Memory.embedding_model.is_(None),
+            Memory.embedding_model != EMBEDDING_MODEL_VERSION,
+        ))
+    return query
+
+
+def run_backfill(
+    target: str = "missing",
+    page_size: int = DEFAULT_PAGE_SIZE,
+    workers: int = 0,
+    checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT,
+    restart: bool = False,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Re-embed memories matching `target`. Resumable via `checkpoint_path`.
+
+    Args:
+        target: 'missing' | 'stale' | 'all'.
+        page_size: Rows fetched, embedded and written per round trip.
+        workers: Embedding processes; 0 embeds in the current process
+                 (required inside daemonic Celery workers).
+        checkpoint_path: JSON file tracking the last committed id; None disables it.
+        restart: Ignore any existing checkpoint.
+        progress: Optional callback receiving the checkpoint dict after each page.
+
+    Returns:
+        The final checkpoint dict: target, model_version, last_id, processed, failed.
+    """
+    if target not in TARGETS:
+        raise ValueError(f"target must be one of {TARGETS}")
+
+    checkpoint = None if restart else _load_checkpoint(checkpoint_path, target)
+    if checkpoint is None or checkpoint.get("done"):
+        # Fresh run; a finished checkpoint must not hide rows added since
+        checkpoint = {
+            "target": target,
+            "model_version": EMBEDDING_MODEL_VERSION,
+            "last_id": None,
+            "processed": 0,
+            "failed": 0,
+        }
+    logger.info(f"Re-embedding target={target} from last_id={checkpoint['last_id']}")
+
+    pool = None
+    if workers > 0:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,))
+
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(Memory.id, Memory.family_id, Memory.title, Memory.story_text)
+            query = _target_filter(query, target)
+            if checkpoint["last_id"] is not None:
+                query = query.filter(Memory.id > checkpoint["last_id"])
+            rows = query.order_by(Memory.id).limit(page_size).all()
+            if not rows:
+                break
+
+            texts = [f"{r.title} {r.story_text or ''}" for r in rows]
+            if pool is not None:
+                chunk = -(-len(texts) // workers)  # ceil division
+                chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+                vectors = [v for part in pool.map(embed_many, chunks) for v in part]
+            else:
+                vectors = embed_many(texts)
+
+            params = [
+                {
+                    "id": r.id,
+                    "embedding": vec,
+                    "embedding_model": EMBEDDING_MODEL_VERSION,
+                }
+                for r, vec in zip(rows, vectors)
+                if vec is not None
+            ]
+            if not params and rows:
+                # Model unavailable: stop rather than spin through the table
+                raise RuntimeError("Embedding model unavailable; install requirements-ai.txt")
+            db.execute(update(Memory), params)
+            db.commit()
+            for family_id in {r.family_id for r in rows}:
+                invalidate_family(family_id)
+
+            checkpoint["last_id"] = str(rows[-1].id)
+            checkpoint["processed"] += len(params)
+            checkpoint["failed"] += len(rows) - len(params)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            if progress:
+                progress(checkpoint)
+            logger.info(f"Re-embedded {checkpoint['processed']} memories (last_id={checkpoint['last_id']})")
+
+        checkpoint["done"] = True
+        _save_checkpoint(checkpoint_path, checkpoint)
+        if uses_local_index():
+            # Vectors changed in place: drop the local index snapshots
+            local_index.invalidate()
+        return checkpoint
+    finally:
+        db.close()
+        if pool is not None:
+            pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill or refresh memory embeddings.")
+    parser.add_argument("--target", choices=TARGETS, default="missing")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--workers", type=int, default=0, help="embedding processes (0 = in-process)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    result = run_backfill(
+        target=args.target,
+        page_size=args.page_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+    )
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,7 @@ so the frontend can poll GET /home/jobs/{job_id} for progress.
 Complexity:
   - generate_pdf: O(m * p) where m = memories, p = pages
   - generate_embedding: O(n) on model size
+  - reembed_memories: O(n) memories, O(n / page_size) round trips
   - precompute_resurfacing: O(u * m) where u = users, m = memories per user
 """
 import logging
@@ -133,8 +134,9 @@ def generate_embedding(self, memory_id: str):
     _update_job_status(job_id, "processing", 0.1)
 
     try:
-        from backend.database.config import SessionLocal, PGVECTOR_AVAILABLE
+        from backend.database.config import SessionLocal
         from backend.rag.vector_store import _get_embedding
+        from backend.rag.embeddings import EMBEDDING_MODEL_VERSION
 
         db = SessionLocal()
         try:
@@ -146,16 +148,21 @@ def generate_embedding(self, memory_id: str):
             text = f"{memory.title} {memory.story_text or ''}"
             embedding = _get_embedding(text)
 
-            if embedding and PGVECTOR_AVAILABLE:
+            if embedding:
+                # EmbeddingType stores VECTOR(384) on pgvector, float32 bytes elsewhere
                 memory.embedding = embedding
+                memory.embedding_model = EMBEDDING_MODEL_VERSION
                 db.commit()
+                from backend.rag.vector_store import uses_local_index
+                if uses_local_index():
+                    from backend.rag import local_index
+                    local_index.add(memory.family_id, memory.id, embedding)
+                from backend.rag.search_cache import invalidate_family
+                invalidate_family(memory.family_id)
                 _update_job_status(job_id, "completed", 1.0)
             else:
                 _update_job_status(job_id, "completed", 1.0,
-                                   {"message": "pgvector unavailable, embedding stored as text"})
-                if embedding:
-                    memory.embedding = str(embedding)
-                    db.commit()
+                                   {"message": "embedding model unavailable"})
 
             return {"status": "completed", "job_id": job_id}
         finally:
@@ -166,6 +173,60 @@ def generate_embedding(self, memory_id: str):
         raise
 
 
+@celery_app.task(bind=True, name="backend.jobs.tasks.reembed_memories")
+def reembed_memories(self, target: str = "missing", page_size: int = 256, restart: bool = False):
+    """Bulk backfill/refresh of memory embeddings. Resumable.
+
+    target: 'missing' | 'stale' | 'all'. Embeds in-process (Celery workers are
+    daemonic and cannot fork a pool); use `python -m backend.jobs.reembed
+    --workers N` for a multi-process run. O(n).
+    """
+    from backend.jobs.reembed import run_backfill
+
+    job_id = self.request.id
+    _update_job_status(job_id, "processing", 0.0, {"target": target})
+
+    def report(checkpoint):
+        _update_job_status(job_id, "processing", 0.5, {
+            "target": target,
+            "processed": checkpoint["processed"],
+            "last_id": checkpoint["last_id"],
+        })
+
+    try:
+        result = run_backfill(
+            target=target,
+            page_size=page_size,
+            restart=restart,
+            progress=report,
+        )
+        _update_job_status(job_id, "completed", 1.0, result)
+        return {"status": "completed", "job_id": job_id, "processed": result["processed"]}
+    except Exception as e:
+        logger.error(f"Re-embedding failed: {e}")
+        _update_job_status(job_id, "failed", 0, {"error": str(e)})
+        raise
+
+
+@celery_app.task(name="backend.jobs.tasks.reconcile_post_counters")
+def reconcile_post_counters():
+    """Periodic Celery Beat task: repair drift in posts.likes_count/comments_count.
+
+    Complexity: O(p + l + c); only drifted rows are written.
+    """
+    from backend.jobs.counters import reconcile_post_counters as reconcile
+
+    db = SessionLocal()
+    try:
+        repaired = reconcile(db)
+        db.commit()
+        if repaired:
+            logger.warning(f"Repaired drifted counters on {repaired} posts")
+        return {"posts_repaired": repaired}
+    finally:
+        db.close()
+
+
 @celery_app.task(name="backend.jobs.tasks.precompute_resurfacing")
 def precompute_resurfacing():
     """Daily Celery Beat task: compute today's resurfacing memories for all users.
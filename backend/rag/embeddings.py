@@ -0,0 +1,327 @@
+"""
+Process-wide embedding model registry.
+
+Every embedding call site (memory creation, hybrid search, the assistant's
+memory tool and the Celery embedding task) goes through this module so the
+sentence-transformers model is loaded once per process instead of once per call.
+
+Backends (EMBEDDING_BACKEND env var):
+  - torch (default):  plain PyTorch weights
+  - onnx:             ONNX Runtime export of the same model
+  - onnx-quantized:   int8 dynamically-quantized ONNX weights (fastest on CPU)
+  - openvino:         OpenVINO runtime (Intel CPUs)
+
+Concurrent async callers go through EmbeddingBatcher, which collects requests
+for a few milliseconds and encodes them as one batch (much better CPU use than
+many single encodes, and lower tail latency under bursty search traffic).
+
+Results are cached in two tiers keyed by sha256(model, version, normalized text): an
+in-process LRU and, when REDIS_URL is set, Redis with a TTL storing compact
+float32 bytes. Repeated queries and re-embedding unchanged memories cost nothing.
+
+Complexity:
+  - get_model:  O(1) after the first (lazy, locked) load
+  - embed:      O(n) on text length
+  - embed_many: O(b * n) for b texts, encoded in batches of EMBEDDING_BATCH_SIZE
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from array import array
+from typing import Optional, List
+from dotenv import load_dotenv
+
+from backend.utils.cache import LRUCache, redis_mget, redis_set
+from backend.utils.executors import ExecutorSaturated, run_cpu
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Stored on each memory; bump it to mark every existing embedding as stale
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", EMBEDDING_MODEL_NAME)
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None  # e.g. "cpu", "cuda"
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "false").lower() in ("1", "true", "yes")
+# Quantized weights shipped in the model repo's onnx/ folder
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Micro-batcher: how long to wait for more requests, and the max batch it collects
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+EMBEDDING_DIM = 384
+
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: bounded in-process LRU, then Redis.
+
+    Redis values are raw little-endian float32 bytes (1.5KB for 384 dims).
+    Exposes hit/miss counters via stats().
+    """
+
+    def __init__(self, maxsize: int = EMBEDDING_CACHE_SIZE, ttl: int = EMBEDDING_CACHE_TTL):
+        self.local = LRUCache(maxsize)
+        self.ttl = ttl
+        self.lru_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Content hash of model, backend, version + whitespace-normalized text.
+
+        Including EMBEDDING_MODEL_VERSION means a version bump (and re-embed)
+        never reads vectors cached under the previous version. O(n).
+        """
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(
+            f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}:{EMBEDDING_MODEL_VERSION}\0{normalized}".encode("utf-8")
+        ).hexdigest()
+        return f"memoir:emb:{digest}"
+
+    @staticmethod
+    def _encode(vector: list) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(raw: bytes) -> list:
+        values = array("f")
+        values.frombytes(raw)
+        return values.tolist()
+
+    def get_local(self, key: str) -> Optional[list]:
+        """LRU-only lookup (no I/O), safe to call on the event loop."""
+        vector = self.local.get(key)
+        if vector is not None:
+            with self._stats_lock:
+                self.lru_hits += 1
+        return vector
+
+    def get_many(self, keys: List[str]) -> List[Optional[list]]:
+        """Look up keys in the LRU, then Redis for the remainder. Counts misses."""
+        found = [self.local.get(k) for k in keys]
+        missing = [i for i, v in enumerate(found) if v is None]
+        lru_hits = len(keys) - len(missing)
+        redis_hits = 0
+
+        if missing:
+            raw_values = redis_mget([keys[i] for i in missing])
+            for i, raw in zip(missing, raw_values):
+                if raw:
+                    found[i] = self._decode(raw)
+                    self.local.set(keys[i], found[i])
+                    redis_hits += 1
+
+        with self._stats_lock:
+            self.lru_hits += lru_hits
+            self.redis_hits += redis_hits
+            self.misses += len(missing) - redis_hits
+        return found
+
+    def set(self, key: str, vector: list):
+        self.local.set(key, vector)
+        redis_set(key, self._encode(vector), self.ttl)
+
+    def stats(self) -> dict:
+        total = self.lru_hits + self.redis_hits + self.misses
+        return {
+            "lru_hits": self.lru_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.lru_hits + self.redis_hits) / total, 4) if total else 0.0,
+            "lru_size": len(self.local),
+        }
+
+
+embedding_cache = EmbeddingCache()
+
+_model = None
+_model_lock = threading.Lock()
+# Set when sentence-transformers is not installed so we stop retrying the import
+_unavailable = False
+
+
+def _load_model():
+    """Construct the SentenceTransformer for the configured backend."""
+    from sentence_transformers import SentenceTransformer
+
+    if EMBEDDING_BACKEND == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE)
+    if EMBEDDING_BACKEND == "onnx":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE, backend="onnx")
+    if EMBEDDING_BACKEND == "onnx-quantized":
+        return SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            device=EMBEDDING_DEVICE,
+            backend="onnx",
+            model_kwargs={"file_name": EMBEDDING_ONNX_FILE},
+        )
+    if EMBEDDING_BACKEND == "openvino":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE, backend="openvino")
+    raise ValueError(f"Unsupported EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+
+
+def get_model():
+    """Return the shared embedding model, loading it on first use. O(1) after load.
+
+    Thread-safe: concurrent first callers block on a lock and only one of them
+    loads the weights. Returns None if sentence-transformers is unavailable.
+    """
+    global _model, _unavailable
+    if _model is not None:
+        return _model
+    if _unavailable:
+        return None
+
+    with _model_lock:
+        if _model is None and not _unavailable:
+            try:
+                _model = _load_model()
+                logger.info(f"Loaded embedding model {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})")
+            except ImportError as e:
+                _unavailable = True
+                logger.warning(f"sentence-transformers not installed, embeddings disabled: {e}")
+            except Exception as e:
+                # Leave _model unset so a later call can retry (e.g. transient download failure)
+                logger.warning(f"Embedding model load failed: {e}")
+    return _model
+
+
+def embeddings_disabled() -> bool:
+    """True once sentence-transformers proved missing: a permanent None from
+    embed(), unlike a failed load or encode, which later calls retry."""
+    return _unavailable
+
+
+def embed(text: str) -> Optional[list]:
+    """Embed a single text with the shared model (cached). Returns None if unavailable."""
+    key = embedding_cache.key(text)
+    cached = embedding_cache.get_many([key])[0]
+    if cached is not None:
+        return cached
+
+    model = get_model()
+    if model is None:
+        return None
+    try:
+        vector = model.encode(text).tolist()
+    except Exception as e:
+        logger.warning(f"Embedding generation failed: {e}")
+        return None
+    embedding_cache.set(key, vector)
+    return vector
+
+
+def embed_many(texts: List[str]) -> List[Optional[list]]:
+    """Embed several texts in one batched encode. O(b * n).
+
+    Only cache misses are encoded. Returns a list aligned with `texts`; entries
+    are None if the model is unavailable.
+    """
+    if not texts:
+        return []
+    keys = [embedding_cache.key(t) for t in texts]
+    results = embedding_cache.get_many(keys)
+    missing = [i for i, v in enumerate(results) if v is None]
+    if not missing:
+        return results
+
+    model = get_model()
+    if model is None:
+        return results
+    try:
+        vectors = model.encode([texts[i] for i in missing], batch_size=EMBEDDING_BATCH_SIZE)
+    except Exception as e:
+        logger.warning(f"Batch embedding generation failed: {e}")
+        return results
+    for i, v in zip(missing, vectors):
+        results[i] = v.tolist()
+        embedding_cache.set(keys[i], results[i])
+    return results
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embed requests on one event loop into batched encodes.
+
+    The first request of a window starts a timer of `max_wait_ms`; every request
+    arriving before it fires joins the same batch. A full batch flushes early.
+    The encode itself runs on the bounded cpu lane so the event loop stays
+    free; when the lane is saturated every waiter gets ExecutorSaturated.
+    """
+
+    def __init__(self, max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS, max_batch: int = EMBEDDING_MAX_BATCH):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[tuple] = []  # (text, future)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()  # strong refs so in-flight batches aren't garbage-collected
+
+    async def embed(self, text: str) -> Optional[list]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        # Identical texts in one window (e.g. the same search fired twice) are encoded once
+        unique_texts = list(dict.fromkeys(t for t, _ in batch))
+        try:
+            vectors = await run_cpu(embed_many, unique_texts)
+            by_text = dict(zip(unique_texts, vectors))
+        except ExecutorSaturated as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            logger.warning(f"Embedding batch failed: {e}")
+            by_text = {}
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text.get(text))
+
+
+# One batcher per event loop (uvicorn runs a single loop per worker process)
+_batchers = weakref.WeakKeyDictionary()
+
+
+async def embed_async(text: str) -> Optional[list]:
+    """Embed a text from async code, coalesced with concurrent callers."""
+    cached = embedding_cache.get_local(embedding_cache.key(text))
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = EmbeddingBatcher()
+    return await batcher.embed(text)
+
+
+def warm_up() -> bool:
+    """Load the model and run one encode so the first request pays nothing."""
+    return embed("warm-up") is not None
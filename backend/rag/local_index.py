@@ -0,0 +1,345 @@
+"""
+In-process vector index for deployments without pgvector (SQLite, plain Postgres).
+
+Each family gets a contiguous float32 matrix of L2-normalized embeddings, so
+cosine similarity is one matrix-vector product and top-k is an argpartition.
+The index is loaded lazily from memories.embedding, updated incrementally on
+memory create/delete, and snapshotted to VECTOR_INDEX_DIR as .npy files that
+are memory-mapped on the next start (no re-parsing of the embedding column).
+
+A snapshot is reconciled against the memory ids in the database when loaded,
+so rows added or deleted while the process was down are picked up. Vectors
+rewritten in place (re-embedding) need invalidate(), which also drops the
+snapshot files.
+
+add()/remove()/invalidate() only reach the calling process, so every search
+first compares a one-row DB fingerprint of the family's embedded memories
+(count, newest created_at, rows at the current model version) with the one
+the index was built against. Rows written by another API worker or a Celery
+task are then reconciled in; rows moving to the current model version
+without being new (a re-embed run elsewhere) rebuild the family from the
+database.
+
+Complexity:
+  - search: one aggregate query + O(n * d) dot products + O(n) argpartition
+            + O(k log k) sort
+  - add:    amortized O(d) (capacity doubling)
+  - remove: O(d) swap-with-last
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from backend.database.models import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+# Minimum seconds between snapshot writes for a frequently-mutated family
+SNAPSHOT_INTERVAL = float(os.getenv("VECTOR_SNAPSHOT_INTERVAL", "30"))
+
+
+def _normalize(vector) -> "np.ndarray":
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
+
+class FamilyVectorIndex:
+    """Normalized embedding matrix + row-id mapping for one family."""
+
+    def __init__(self, family_id: str, ids: List[str], matrix: "np.ndarray"):
+        self.family_id = family_id
+        self.ids = list(ids)
+        self.positions = {mid: i for i, mid in enumerate(self.ids)}
+        self.matrix = matrix  # may be a read-only memmap until the first mutation
+        self.dirty = False
+        self.saved_at = 0.0
+        self.fingerprint = None  # _fingerprint() of the DB rows this index reflects
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _writable(self, min_rows: int):
+        """Copy a read-only memmap into RAM and grow capacity (doubling) when needed."""
+        capacity = self.matrix.shape[0]
+        if self.matrix.flags.writeable and capacity >= min_rows:
+            return
+        new_capacity = max(min_rows, 16, capacity * 2 if capacity < min_rows else capacity)
+        grown = np.zeros((new_capacity, self.matrix.shape[1]), dtype=np.float32)
+        grown[:len(self.ids)] = self.matrix[:len(self.ids)]
+        self.matrix = grown
+
+    def add(self, memory_id: str, vector):
+        with self.lock:
+            v = _normalize(vector)
+            if self.matrix.shape[1] != v.shape[0]:
+                if self.ids:
+                    raise ValueError(f"Embedding dim {v.shape[0]} != index dim {self.matrix.shape[1]}")
+                self.matrix = np.zeros((0, v.shape[0]), dtype=np.float32)
+            pos = self.positions.get(memory_id)
+            if pos is None:
+                self._writable(len(self.ids) + 1)
+                pos = len(self.ids)
+                self.ids.append(memory_id)
+                self.positions[memory_id] = pos
+            else:
+                self._writable(len(self.ids))
+            self.matrix[pos] = v
+            self.dirty = True
+
+    def remove(self, memory_id: str):
+        with self.lock:
+            pos = self.positions.pop(memory_id, None)
+            if pos is None:
+                return
+            self._writable(len(self.ids))
+            last = len(self.ids) - 1
+            if pos != last:
+                moved = self.ids[last]
+                self.matrix[pos] = self.matrix[last]
+                self.ids[pos] = moved
+                self.positions[moved] = pos
+            self.ids.pop()
+            self.dirty = True
+
+    def search(self, query_vector, k: int) -> List[Tuple[str, float]]:
+        """Top-k (memory_id, cosine similarity), best first."""
+        with self.lock:
+            n = len(self.ids)
+            if n == 0 or k <= 0:
+                return []
+            scores = self.matrix[:n] @ _normalize(query_vector)
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top]
+
+    # ─── Snapshots ───────────────────────────────────────────────────────────
+
+    def _paths(self):
+        base = os.path.join(VECTOR_INDEX_DIR, str(self.family_id))
+        return f"{base}.npy", f"{base}.ids.json"
+
+    def save(self):
+        with self.lock:
+            os.makedirs(VECTOR_INDEX_DIR, exist_ok=True)
+            matrix_path, ids_path = self._paths()
+            # np.save appends .npy when missing, so keep the suffix on the temp name
+            tmp_matrix = f"{matrix_path[:-4]}.tmp.npy"
+            np.save(tmp_matrix, np.ascontiguousarray(self.matrix[:len(self.ids)]))
+            with open(f"{ids_path}.tmp", "w") as f:
+                json.dump(self.ids, f)
+            os.replace(tmp_matrix, matrix_path)
+            os.replace(f"{ids_path}.tmp", ids_path)
+            self.dirty = False
+            self.saved_at = time.monotonic()
+
+    def maybe_save(self):
+        if self.dirty and time.monotonic() - self.saved_at >= SNAPSHOT_INTERVAL:
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Vector index snapshot failed for family {self.family_id}: {e}")
+
+    @classmethod
+    def load_snapshot(cls, family_id: str) -> Optional["FamilyVectorIndex"]:
+        index = cls(family_id, [], np.zeros((0, 0), dtype=np.float32))
+        matrix_path, ids_path = index._paths()
+        if not (os.path.exists(matrix_path) and os.path.exists(ids_path)):
+            return None
+        try:
+            with open(ids_path) as f:
+                ids = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable vector snapshot for family {family_id}: {e}")
+            return None
+        if matrix.shape[0] != len(ids):
+            return None
+        loaded = cls(family_id, ids, matrix)
+        loaded.saved_at = time.monotonic()
+        return loaded
+
+    @classmethod
+    def load_from_db(cls, family_id: str, db: Session) -> "FamilyVectorIndex":
+        from backend.database.models import Memory
+
+        rows = db.query(Memory.id, Memory.embedding).filter(
+            Memory.family_id == family_id,
+            Memory.embedding.isnot(None),
+        ).all()
+        ids, vectors = [], []
+        for memory_id, value in rows:
+            try:
+                vector = decode_embedding(value)
+            except (ValueError, TypeError):
+                continue
+            if vector is not None and vector.size:
+                ids.append(str(memory_id))
+                vectors.append(vector)
+        if vectors:
+            matrix = np.vstack(vectors).astype(np.float32, copy=False)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms > 0, norms, 1)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return cls(family_id, ids, matrix)
+
+
+# ─── Process-wide registry ───────────────────────────────────────────────────
+
+_indexes: Dict[str, FamilyVectorIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def _reconcile(index: FamilyVectorIndex, db: Session) -> bool:
+    """Bring a loaded snapshot in line with the DB's embedded memory ids.
+
+    Reads only ids (plus embeddings of rows missing from the snapshot), so it
+    is far cheaper than rebuilding. Returns True if the index changed.
+    """
+    from backend.database.models import Memory
+
+    db_ids = {
+        str(memory_id)
+        for (memory_id,) in db.query(Memory.id).filter(
+            Memory.family_id == index.family_id,
+            Memory.embedding.isnot(None),
+        ).all()
+    }
+    snapshot_ids = set(index.ids)
+    for stale_id in snapshot_ids - db_ids:
+        index.remove(stale_id)
+
+    missing = list(db_ids - snapshot_ids)
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        for memory_id, value in db.query(Memory.id, Memory.embedding).filter(Memory.id.in_(chunk)).all():
+            try:
+                vector = decode_embedding(value)
+            except (ValueError, TypeError):
+                continue
+            if vector is not None and vector.size:
+                index.add(str(memory_id), vector)
+    return bool(missing) or snapshot_ids != db_ids
+
+
+def _fingerprint(family_id: str, db: Session) -> tuple:
+    """(embedded rows, newest created_at, rows at the current model version). One indexed aggregate."""
+    from backend.database.models import Memory
+    from backend.rag.embeddings import EMBEDDING_MODEL_VERSION
+
+    count, newest, current = db.query(
+        func.count(Memory.id),
+        func.max(Memory.created_at),
+        func.sum(case((Memory.embedding_model == EMBEDDING_MODEL_VERSION, 1), else_=0)),
+    ).filter(
+        Memory.family_id == family_id,
+        Memory.embedding.isnot(None),
+    ).one()
+    return count, newest, int(current or 0)
+
+
+def _rewritten(old: tuple, new: tuple) -> bool:
+    """More rows reached the current model version than were added: some
+    existing vectors were re-embedded in place."""
+    return new[2] - old[2] > max(0, new[0] - old[0])
+
+
+def get_index(family_id: str, db: Session) -> FamilyVectorIndex:
+    """Return the family's index, loading a snapshot or the DB on first use and
+    catching up with writes made by other processes."""
+    family_id = str(family_id)
+    fingerprint = _fingerprint(family_id, db)
+    index = _indexes.get(family_id)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+
+    with _registry_lock:
+        index = _indexes.get(family_id)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        if index is not None and _rewritten(index.fingerprint, fingerprint):
+            # Vectors rewritten in place by another process (re-embed): rebuild,
+            # overwriting any snapshot this process wrote from the old vectors
+            index = FamilyVectorIndex.load_from_db(family_id, db)
+            changed = True
+        elif index is None:
+            index = FamilyVectorIndex.load_snapshot(family_id)
+            if index is None:
+                index = FamilyVectorIndex.load_from_db(family_id, db)
+                changed = True
+            else:
+                changed = _reconcile(index, db)
+        else:
+            changed = _reconcile(index, db)
+        # Taken before reconciling: a write racing it is caught on the next search
+        index.fingerprint = fingerprint
+        if changed:
+            try:
+                index.save()
+            except OSError as e:
+                logger.warning(f"Vector index snapshot failed for family {family_id}: {e}")
+        _indexes[family_id] = index
+    return index
+
+
+def search(family_id: str, query_vector, db: Session, k: int = 20) -> List[Tuple[str, float]]:
+    """Cosine top-k over the family's embeddings. O(n * d)."""
+    return get_index(family_id, db).search(query_vector, k)
+
+
+def add(family_id: str, memory_id: str, vector):
+    """Add/replace a memory's vector if the family's index is loaded. Amortized O(d)."""
+    index = _indexes.get(str(family_id))
+    if index is not None and vector is not None:
+        index.add(str(memory_id), vector)
+        index.maybe_save()
+
+
+def remove(family_id: str, memory_id: str):
+    """Drop a memory from the family's index if loaded. O(d)."""
+    index = _indexes.get(str(family_id))
+    if index is not None:
+        index.remove(str(memory_id))
+        index.maybe_save()
+
+
+def invalidate(family_id: Optional[str] = None):
+    """Forget loaded indexes and snapshots (one family or all) so the next
+    search rebuilds from the database."""
+    with _registry_lock:
+        family_ids = list(_indexes) if family_id is None else [str(family_id)]
+        for fid in family_ids:
+            _indexes.pop(fid, None)
+        if family_id is None and os.path.isdir(VECTOR_INDEX_DIR):
+            family_ids = {name.split(".", 1)[0] for name in os.listdir(VECTOR_INDEX_DIR)}
+        for fid in family_ids:
+            for path in FamilyVectorIndex(fid, [], np.zeros((0, 0), dtype=np.float32))._paths():
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+@atexit.register
+def _flush_snapshots():
+    for index in list(_indexes.values()):
+        if index.dirty:
+            try:
+                index.save()
+            except Exception:
+                pass
@@ -0,0 +1,207 @@
+"""
+Approximate nearest-neighbour index management for pgvector.
+
+Creates and maintains an HNSW (default) or IVFFlat index on memories.embedding
+with vector_cosine_ops, matching the `<=>` operator used by semantic_search.
+Query-time recall/latency knobs (hnsw.ef_search, ivfflat.probes) are applied
+per transaction via set_config(..., is_local => true), so they are safe with
+pooled connections and PgBouncer transaction mode.
+
+Usage:
+  python -m backend.rag.pgvector_index create
+  python -m backend.rag.pgvector_index rebuild            # e.g. IVFFlat after bulk loads
+  python -m backend.rag.pgvector_index benchmark --queries 100 --ef-search 20 40 100 200
+
+Complexity:
+  - exact search:  O(n) sequential scan per family
+  - HNSW search:   ~O(log n) graph traversal, recall tuned by ef_search
+  - IVFFlat:       O(n * probes / lists)
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import Optional, List
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "hnsw").lower()  # hnsw | ivfflat | none
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# 0 = pick automatically from the row count (rows / 1000, at least 10)
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))
+# pgvector >= 0.8: keep scanning the graph until LIMIT rows pass the family filter.
+# Leave empty on older pgvector, which rejects the setting.
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "")
+
+INDEX_NAMES = {
+    "hnsw": "idx_memories_embedding_hnsw",
+    "ivfflat": "idx_memories_embedding_ivfflat",
+}
+
+
+def _index_ddl(kind: str, conn) -> str:
+    if kind == "hnsw":
+        return (
+            f"CREATE INDEX IF NOT EXISTS {INDEX_NAMES['hnsw']} ON memories "
+            f"USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+        )
+    if kind == "ivfflat":
+        lists = IVFFLAT_LISTS
+        if lists <= 0:
+            rows = conn.execute(text("SELECT count(*) FROM memories WHERE embedding IS NOT NULL")).scalar() or 0
+            lists = max(10, rows // 1000)
+        return (
+            f"CREATE INDEX IF NOT EXISTS {INDEX_NAMES['ivfflat']} ON memories "
+            f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+        )
+    raise ValueError(f"Unsupported VECTOR_INDEX: {kind}")
+
+
+def create_vector_index(conn, kind: str = VECTOR_INDEX):
+    """Create the configured ANN index if missing, dropping the other kind.
+
+    Called from init_db; the caller commits.
+    """
+    if kind == "none":
+        return
+    for other, name in INDEX_NAMES.items():
+        if other != kind:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text(_index_ddl(kind, conn)))
+
+
+def rebuild_vector_index(kind: str = VECTOR_INDEX):
+    """Drop and recreate the ANN index without blocking writes.
+
+    Uses CONCURRENTLY, which must run outside a transaction block. IVFFlat
+    centroids are computed at build time, so rebuild after large backfills.
+    """
+    from backend.database.config import engine
+
+    if kind == "none":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        name = INDEX_NAMES[kind]
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        ddl = _index_ddl(kind, conn).replace("CREATE INDEX IF NOT EXISTS", "CREATE INDEX CONCURRENTLY")
+        conn.execute(text(ddl))
+    logger.info(f"Rebuilt {kind} index {INDEX_NAMES[kind]}")
+
+
+def apply_search_params(db: Session, ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """Set ANN query-time parameters for the current transaction only. O(1)."""
+    if ef_search:
+        db.execute(text("SELECT set_config('hnsw.ef_search', :v, true)"), {"v": str(int(ef_search))})
+    if probes:
+        db.execute(text("SELECT set_config('ivfflat.probes', :v, true)"), {"v": str(int(probes))})
+    if HNSW_ITERATIVE_SCAN:
+        db.execute(text("SELECT set_config('hnsw.iterative_scan', :v, true)"), {"v": HNSW_ITERATIVE_SCAN})
+
+
+# ─── Recall vs latency benchmark ─────────────────────────────────────────────
+
+_KNN_SQL = text("""
+    SELECT m.id FROM memories m
+    WHERE m.family_id = :family_id AND m.embedding IS NOT NULL
+    ORDER BY m.embedding <=> CAST(:embedding AS vector)
+    LIMIT :limit
+""")
+
+
+def _timed_knn(db: Session, family_id, embedding: str, limit: int, exact: bool = False,
+               ef_search: Optional[int] = None, probes: Optional[int] = None):
+    if exact:
+        # Planner can't use the ANN index -> exact sequential scan
+        db.execute(text("SELECT set_config('enable_indexscan', 'off', true)"))
+    else:
+        apply_search_params(db, ef_search=ef_search, probes=probes)
+    start = time.perf_counter()
+    ids = [row[0] for row in db.execute(_KNN_SQL, {
+        "family_id": family_id, "embedding": embedding, "limit": limit,
+    }).fetchall()]
+    elapsed = time.perf_counter() - start
+    db.rollback()  # end the transaction so the LOCAL settings reset
+    return ids, elapsed
+
+
+def benchmark(queries: int = 50, limit: int = 20, ef_search: List[int] = None,
+              probes: List[int] = None) -> List[dict]:
+    """Compare ANN results against exact search on sampled stored embeddings.
+
+    Returns one row per setting with mean recall@limit and p50/p95 latency (ms).
+    """
+    from backend.database.config import SessionLocal
+
+    settings = [{"ef_search": v} for v in (ef_search or [])] + [{"probes": v} for v in (probes or [])]
+    if not settings:
+        settings = [{}]
+
+    db = SessionLocal()
+    try:
+        samples = db.execute(text("""
+            SELECT family_id, embedding::text FROM memories
+            WHERE embedding IS NOT NULL ORDER BY random() LIMIT :n
+        """), {"n": queries}).fetchall()
+        db.rollback()
+        if not samples:
+            raise RuntimeError("No embedded memories to benchmark; run backend.jobs.reembed first")
+
+        exact = [_timed_knn(db, fam, emb, limit, exact=True) for fam, emb in samples]
+        report = [_summarize("exact", [1.0] * len(exact), [t for _, t in exact])]
+
+        for setting in settings:
+            recalls, latencies = [], []
+            for (fam, emb), (truth, _) in zip(samples, exact):
+                ids, elapsed = _timed_knn(db, fam, emb, limit, **setting)
+                recalls.append(len(set(ids) & set(truth)) / len(truth) if truth else 1.0)
+                latencies.append(elapsed)
+            label = ", ".join(f"{k}={v}" for k, v in setting.items()) or "default"
+            report.append(_summarize(f"{VECTOR_INDEX} {label}", recalls, latencies))
+        return report
+    finally:
+        db.close()
+
+
+def _summarize(label: str, recalls: List[float], latencies: List[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "setting": label,
+        "recall": round(sum(recalls) / len(recalls), 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the pgvector ANN index on memories.embedding.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="create the VECTOR_INDEX index if missing")
+    sub.add_parser("rebuild", help="drop and recreate the index concurrently")
+    bench = sub.add_parser("benchmark", help="recall vs latency against exact search")
+    bench.add_argument("--queries", type=int, default=50)
+    bench.add_argument("--limit", type=int, default=20)
+    bench.add_argument("--ef-search", type=int, nargs="*", default=[])
+    bench.add_argument("--probes", type=int, nargs="*", default=[])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "create":
+        from backend.database.config import engine
+        with engine.begin() as conn:
+            create_vector_index(conn)
+    elif args.command == "rebuild":
+        rebuild_vector_index()
+    else:
+        for row in benchmark(args.queries, args.limit, args.ef_search, args.probes):
+            print(f"{row['setting']:<32} recall={row['recall']:.4f}  "
+                  f"p50={row['p50_ms']:.2f}ms  p95={row['p95_ms']:.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Search result cache with family-scoped, O(1) invalidation.
+
+Results of /home/rag/query, /family/{id}/search and the assistant's memory
+tool are cached under sha256(family, family version, mode, params, normalized
+query). Every family has a version counter; writes that can change a family's
+search results (memory create/delete, re-embedding, person renames) bump it,
+which orphans all of the family's cached entries at once without scanning.
+Orphaned entries age out of the LRU and expire from Redis via SEARCH_CACHE_TTL.
+
+Tiers mirror the embedding cache: an in-process LRU, then Redis (when
+REDIS_URL is set) holding JSON results. With Redis, the version counter lives
+there too, so a write in one worker invalidates every worker's entries. The
+local counter is always bumped as well and is part of the key, so this
+process never serves stale entries while Redis is unreachable.
+
+Complexity: O(1) lookup/store (plus O(n) key hashing), O(1) invalidation.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from backend.utils.cache import LRUCache, get_redis, redis_get, redis_incr, redis_set
+from backend.utils.executors import io_executor
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+_VERSION_PREFIX = "memoir:search:ver:"
+_RESULT_PREFIX = "memoir:search:"
+
+
+class SearchResultCache:
+    """Two-tier (LRU + Redis) cache of search results keyed per family version."""
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: int = SEARCH_CACHE_TTL):
+        self.local = LRUCache(maxsize)
+        self.ttl = ttl
+        self.versions: Dict[str, int] = {}
+        self.lru_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _version(self, family_id: str) -> str:
+        local = self.versions.get(family_id, 0)
+        remote = redis_get(f"{_VERSION_PREFIX}{family_id}")
+        return f"{local}.{int(remote) if remote else 0}"
+
+    def key(self, family_id, mode: str, query_text: str, limit: int, **params) -> str:
+        """Content hash of family version, mode, params and normalized query. O(n)."""
+        family_id = str(family_id)
+        normalized = " ".join(query_text.lower().split())
+        extra = ",".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+        digest = hashlib.sha256(
+            f"{family_id}:{self._version(family_id)}:{mode}:{limit}:{extra}\0{normalized}".encode("utf-8")
+        ).hexdigest()
+        return f"{_RESULT_PREFIX}{digest}"
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """LRU, then Redis. Returns a copy the caller may mutate, or None."""
+        results = self.local.get(key)
+        if results is not None:
+            with self._lock:
+                self.lru_hits += 1
+            return [dict(r) for r in results]
+
+        raw = redis_get(key)
+        if raw:
+            try:
+                results = json.loads(raw)
+            except ValueError:
+                results = None
+        if results is not None:
+            self.local.set(key, results)
+            with self._lock:
+                self.redis_hits += 1
+            return [dict(r) for r in results]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, results: List[dict]):
+        stored = [dict(r) for r in results]
+        self.local.set(key, stored)
+        redis_set(key, json.dumps(stored, default=str).encode("utf-8"), self.ttl)
+
+    def invalidate(self, family_id):
+        """Bump the family's version so all of its cached results are ignored. O(1)."""
+        family_id = str(family_id)
+        with self._lock:
+            self.versions[family_id] = self.versions.get(family_id, 0) + 1
+            self.invalidations += 1
+        redis_incr(f"{_VERSION_PREFIX}{family_id}")
+
+    def stats(self) -> dict:
+        total = self.lru_hits + self.redis_hits + self.misses
+        return {
+            "lru_hits": self.lru_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.lru_hits + self.redis_hits) / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "lru_size": len(self.local),
+        }
+
+
+search_cache = SearchResultCache()
+
+
+def invalidate_family(family_id):
+    """Drop every cached search result for a family. O(1)."""
+    search_cache.invalidate(family_id)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Call a cache method from async code; Redis round trips go to the io lane.
+
+    Never refused for saturation: these calls are bounded by
+    REDIS_SOCKET_TIMEOUT and include post-commit invalidations.
+    """
+    if get_redis() is None:
+        return fn(*args, **kwargs)
+    return await io_executor.run_required(fn, *args, **kwargs)
@@ -1,41 +1,90 @@
 """
-Hybrid search module combining pgvector semantic similarity and PostgreSQL
-full-text search (tsvector), merged via weighted re-ranking.
+Hybrid search module combining pgvector semantic similarity and full-text
+search (PostgreSQL tsvector, or FTS5 on SQLite), merged via weighted re-ranking or reciprocal
+rank fusion (RRF).
+
+Modes:
+  - semantic / keyword: a single leg
+  - hybrid:     both legs as separate queries, fused in Python
+  - hybrid_sql: both legs as CTEs in one statement, fused and joined to
+                people in SQL (PostgreSQL + pgvector only; falls back to hybrid)
+
+hybrid_query_async runs the two legs concurrently in worker threads, each on
+its own session/connection, with a per-leg timeout (SEARCH_LEG_TIMEOUT): a
+slow leg is dropped and the request returns the other leg's results.
+
+Both entry points consult backend.rag.search_cache (family-versioned result
+cache) unless called with use_cache=False; degraded results are not cached.
+The search functions take an optional `degraded` list and append the leg's
+name when they swallow an error (or the query could not be embedded) and
+return fewer results than a healthy search would.
+
+Without pgvector, semantic search runs on the in-process NumPy index in
+backend.rag.local_index instead of being skipped.
 
 Complexity:
-  - semantic_search: O(n) cosine similarity over all embedding rows
+  - semantic_search: ~O(log n) via the HNSW index (O(n) exact scan without it;
+                     O(n * d) vectorized scan on the local index)
   - keyword_search:  O(log n) via GIN index on tsvector
   - hybrid_query:    O(n log n) merge + re-rank of two result sets
+  - hybrid_sql:      same legs, one round trip, only top-k rows returned
+  - hybrid_query_async: latency ~max(legs) instead of their sum
 """
+import os
+import asyncio
 import logging
-import hashlib
-import json
 from typing import Optional, List
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.orm import Session
 
+from backend.database.config import PGVECTOR_AVAILABLE, get_capabilities
+from backend.database.models import EmbeddingType
+from backend.rag import local_index
+from backend.rag.pgvector_index import apply_search_params
+from backend.rag.search_cache import search_cache, run_blocking
+from backend.utils.executors import ExecutorSaturated, run_io
+
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ("semantic", "keyword", "hybrid", "hybrid_sql")
+FUSION_METHODS = ("weighted", "rrf")
+
 # Weighted re-rank constants
 SEMANTIC_WEIGHT = 0.6
 KEYWORD_WEIGHT = 0.4
+# RRF: score = sum(1 / (RRF_K + rank)) over the legs a result appears in
+RRF_K = 60
+# Seconds each leg of hybrid_query_async may take before it is dropped
+SEARCH_LEG_TIMEOUT = float(os.getenv("SEARCH_LEG_TIMEOUT", "2.0"))
 
 
-def _query_cache_key(user_id: str, query: str) -> str:
-    """Generate a Redis cache key for embedding results. O(1)."""
-    h = hashlib.sha256(f"{user_id}:{query}".encode()).hexdigest()[:16]
-    return f"memoir:embedding:{h}"
+def _get_embedding(text: str) -> Optional[list]:
+    """Generate embedding via the shared model registry. O(n) on text length."""
+    from backend.rag.embeddings import embed
+    return embed(text)
 
 
-def _get_embedding(text: str) -> Optional[list]:
-    """Generate embedding using sentence-transformers. O(n) on model size."""
-    try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        return model.encode(text).tolist()
-    except Exception as e:
-        logger.warning(f"Embedding generation failed: {e}")
-        return None
+def _degrade(degraded: Optional[list], leg: str):
+    if degraded is not None:
+        degraded.append(leg)
+
+
+def _embedding_failed(degraded: Optional[list]):
+    """No query embedding: degraded unless embeddings are disabled for good."""
+    from backend.rag.embeddings import embeddings_disabled
+    if not embeddings_disabled():
+        _degrade(degraded, "Semantic")
+
+
+def _pgvector_enabled() -> bool:
+    """pgvector importable and the extension installed (cached capability, no I/O)."""
+    return PGVECTOR_AVAILABLE and get_capabilities()["pgvector"]
+
+
+def uses_local_index() -> bool:
+    """Whether semantic_search serves from backend.rag.local_index, i.e. whether
+    memory writes must keep it updated."""
+    return not _pgvector_enabled() and local_index.NUMPY_AVAILABLE
 
 
 def _build_tsvector_query(query_text: str) -> str:
@@ -55,16 +104,27 @@ def semantic_search(
     redis_client=None,
     user_id: Optional[str] = None,
     limit: int = 20,
+    query_embedding: Optional[list] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    degraded: Optional[list] = None,
 ) -> List[dict]:
-    """Perform pgvector cosine similarity search. O(n) on embedding dimension.
+    """Perform pgvector cosine similarity search via the ANN index.
 
-    Results cached in Redis for 1 hour (key: hash of query text + user_id).
+    `ef_search` (HNSW) / `probes` (IVFFlat) trade latency for recall; they apply
+    to this transaction only. None keeps the server defaults.
+
+    Pass `query_embedding` when the caller already encoded the query (e.g. through
+    the async micro-batcher); otherwise it is computed here. Query embeddings
+    are served from the shared two-tier embedding cache (LRU + Redis).
     """
-    embedding = _get_embedding(query_text)
+    embedding = query_embedding or _get_embedding(query_text)
     if not embedding:
+        _embedding_failed(degraded)
         return []
 
-    embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
+    if not _pgvector_enabled():
+        return _local_semantic_search(family_id, embedding, db, limit, degraded)
 
     sql = text("""
         SELECT m.id, m.title, m.story_text, m.memory_date,
@@ -75,11 +135,12 @@ def semantic_search(
         WHERE m.family_id = :family_id AND m.embedding IS NOT NULL
         ORDER BY m.embedding <=> :embedding
         LIMIT :limit
-    """)
+    """).bindparams(bindparam("embedding", type_=EmbeddingType()))
 
     try:
+        apply_search_params(db, ef_search=ef_search, probes=probes)
         rows = db.execute(sql, {
-            "embedding": embedding_str,
+            "embedding": embedding,
             "family_id": family_id,
             "limit": limit,
         }).fetchall()
@@ -98,80 +159,326 @@ def semantic_search(
         return results
     except Exception as e:
         logger.warning(f"Semantic search failed: {e}")
+        db.rollback()  # don't leave the session in an aborted transaction
+        _degrade(degraded, "Semantic")
         return []
 
 
+def _local_semantic_search(family_id: str, embedding: list, db: Session, limit: int,
+                           degraded: Optional[list] = None) -> List[dict]:
+    """Cosine top-k on the in-process index, then one query for the rows. O(n * d)."""
+    if not local_index.NUMPY_AVAILABLE:
+        return []
+    try:
+        hits = local_index.search(family_id, embedding, db, k=limit)
+    except Exception as e:
+        logger.warning(f"Local vector search failed: {e}")
+        _degrade(degraded, "Semantic")
+        return []
+    if not hits:
+        return []
+
+    from backend.database.models import Memory, Person
+    rows = db.query(
+        Memory.id, Memory.title, Memory.story_text, Memory.memory_date, Person.name, Person.id,
+    ).join(Person, Person.id == Memory.person_id).filter(
+        Memory.id.in_([memory_id for memory_id, _ in hits]),
+    ).all()
+    by_id = {str(row[0]): row for row in rows}
+
+    results = []
+    for memory_id, score in hits:
+        row = by_id.get(memory_id)
+        if row is None:
+            continue  # deleted since the index was loaded
+        results.append({
+            "id": memory_id,
+            "title": row[1],
+            "story_text": row[2],
+            "memory_date": row[3].isoformat() if row[3] else None,
+            "person_name": row[4],
+            "person_id": str(row[5]) if row[5] else None,
+            "score": score,
+        })
+    return results
+
+
 def keyword_search(
     family_id: str,
     query_text: str,
     db: Session,
     limit: int = 20,
+    degraded: Optional[list] = None,
 ) -> List[dict]:
-    """Perform PostgreSQL full-text search via tsvector. O(log n) with GIN index.
+    """Full-text search: FTS5 on SQLite, tsvector on PostgreSQL. O(log n) with the index.
 
-    Falls back to ILIKE if tsvector column/index doesn't exist.
+    Falls back to substring_search (pg_trgm-ranked when available, else ILIKE)
+    if the tsvector column doesn't exist.
     """
     tsquery = _build_tsvector_query(query_text)
     if not tsquery:
         return []
 
-    # Try tsvector first
+    capabilities = get_capabilities()
+    if capabilities["fts5"]:
+        results = _fts5_search(family_id, query_text, db, limit)
+        if results is not None:
+            return results
+        _degrade(degraded, "Keyword")  # ILIKE fallback below
+
+    # tsvector when the column exists (cached capability), otherwise straight to ILIKE
+    if capabilities["tsvector"]:
+        try:
+            sql = text("""
+                SELECT m.id, m.title, m.story_text, m.memory_date,
+                       p.name as person_name, p.id as person_id,
+                       ts_rank(m.search_vector, to_tsquery('english', :tsquery)) as score
+                FROM memories m
+                JOIN people p ON p.id = m.person_id
+                WHERE m.family_id = :family_id
+                  AND m.search_vector @@ to_tsquery('english', :tsquery)
+                ORDER BY score DESC
+                LIMIT :limit
+            """)
+            rows = db.execute(sql, {
+                "tsquery": tsquery,
+                "family_id": family_id,
+                "limit": limit,
+            }).fetchall()
+
+            results = []
+            for row in rows:
+                results.append({
+                    "id": str(row[0]),
+                    "title": row[1],
+                    "story_text": row[2],
+                    "memory_date": row[3].isoformat() if row[3] else None,
+                    "person_name": row[4],
+                    "person_id": str(row[5]) if row[5] else None,
+                    "score": float(row[6]) if row[6] else 0.5,
+                })
+            return results
+        except Exception as e:
+            logger.warning(f"tsvector search failed, falling back to ILIKE: {e}")
+            db.rollback()
+            _degrade(degraded, "Keyword")
+
+    return substring_search(family_id, [query_text], db, limit)
+
+
+def _fts5_search(family_id: str, query_text: str, db: Session, limit: int) -> Optional[List[dict]]:
+    """SQLite FTS5 search ranked by BM25. Returns None if the query fails.
+
+    bm25() is <= 0 with lower meaning better; x = -bm25 is squashed to [0, 1)
+    as x / (1 + x) and placed in [0.5, 1) so a full-text match never ranks
+    below the ILIKE fallback's neutral 0.5 (BM25 IDF is ~0 in small families).
+    Terms are quoted, so user input can't inject FTS5 query syntax; terms are
+    ANDed and prefix-matched ("beach par" finds "beach party").
+    """
+    import re
+    terms = re.findall(r'\w+', query_text.lower())
+    if not terms:
+        return []
+    match = " ".join(f'"{t}"*' for t in terms)
+
+    sql = text("""
+        SELECT m.id, m.title, m.story_text, m.memory_date,
+               p.name as person_name, p.id as person_id,
+               -bm25(memories_fts) as relevance
+        FROM memories_fts
+        JOIN memories m ON m.rowid = memories_fts.rowid
+        LEFT JOIN people p ON p.id = m.person_id
+        WHERE memories_fts MATCH :match AND m.family_id = :family_id
+        ORDER BY bm25(memories_fts)
+        LIMIT :limit
+    """)
     try:
-        sql = text(f"""
-            SELECT m.id, m.title, m.story_text, m.memory_date,
-                   p.name as person_name, p.id as person_id,
-                   ts_rank(m.search_vector, to_tsquery('english', :tsquery)) as score
+        rows = db.execute(sql, {"match": match, "family_id": str(family_id), "limit": limit}).fetchall()
+    except Exception as e:
+        logger.warning(f"FTS5 search failed, falling back to ILIKE: {e}")
+        db.rollback()
+        return None
+
+    results = []
+    for row in rows:
+        relevance = max(float(row[6] or 0), 0.0)
+        results.append({
+            "id": str(row[0]),
+            "title": row[1],
+            "story_text": row[2],
+            "memory_date": row[3] if isinstance(row[3], str) or row[3] is None else row[3].isoformat(),
+            "person_name": row[4] or "Unknown",
+            "person_id": str(row[5]) if row[5] else None,
+            "score": 0.5 + 0.5 * relevance / (1 + relevance),
+        })
+    return results
+
+
+def substring_search(
+    family_id: str,
+    terms: List[str],
+    db: Session,
+    limit: int = 20,
+    person_id: Optional[str] = None,
+    date_range: Optional[dict] = None,
+) -> List[dict]:
+    """Substring match where every term appears in the title or story (AND).
+
+    With pg_trgm (cached capability) the ILIKE predicates are served by the
+    GIN trigram indexes created in init_db, and results are ranked by trigram
+    similarity (0-1). Otherwise plain ILIKE, newest first, with a neutral 0.5.
+
+    Complexity: O(log n + matches) with trigram indexes, O(n) scan without.
+    """
+    from sqlalchemy import or_, func, literal
+    from backend.database.models import Memory, Person
+
+    terms = [t for t in terms if t]
+    if not terms:
+        return []
+
+    trigram = get_capabilities()["trigram"]
+    if trigram:
+        phrase = " ".join(terms)
+        score = func.greatest(
+            func.similarity(Memory.title, phrase),
+            func.word_similarity(phrase, func.coalesce(Memory.story_text, "")),
+        )
+    else:
+        score = literal(0.5)
+
+    query = db.query(
+        Memory.id, Memory.title, Memory.story_text, Memory.memory_date, Person.name, Person.id, score,
+    ).outerjoin(Person, Person.id == Memory.person_id).filter(Memory.family_id == family_id)
+    for term in terms:
+        query = query.filter(or_(Memory.title.ilike(f"%{term}%"), Memory.story_text.ilike(f"%{term}%")))
+    if person_id:
+        query = query.filter(Memory.person_id == person_id)
+    if date_range:
+        if date_range.get("start"):
+            query = query.filter(Memory.memory_date >= date_range["start"])
+        if date_range.get("end"):
+            query = query.filter(Memory.memory_date <= date_range["end"])
+    order = score.desc() if trigram else Memory.memory_date.desc().nullslast()
+    rows = query.order_by(order).limit(limit).all()
+
+    return [
+        {
+            "id": str(row[0]),
+            "title": row[1],
+            "story_text": row[2],
+            "memory_date": row[3].isoformat() if row[3] else None,
+            "person_name": row[4] or "Unknown",
+            "person_id": str(row[5]) if row[5] else None,
+            "score": float(row[6]) if row[6] is not None else 0.5,
+        }
+        for row in rows
+    ]
+
+
+_HYBRID_SQL = """
+    WITH semantic AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rank, 1 - distance AS score
+        FROM (
+            SELECT m.id, m.embedding <=> :embedding AS distance
+            FROM memories m
+            WHERE m.family_id = :family_id AND m.embedding IS NOT NULL
+            ORDER BY m.embedding <=> :embedding
+            LIMIT :candidates
+        ) nearest
+    ),
+    keyword AS (
+        SELECT id, row_number() OVER (ORDER BY score DESC) AS rank, score
+        FROM (
+            SELECT m.id, ts_rank(m.search_vector, to_tsquery('english', :tsquery)) AS score
             FROM memories m
-            JOIN people p ON p.id = m.person_id
             WHERE m.family_id = :family_id
               AND m.search_vector @@ to_tsquery('english', :tsquery)
             ORDER BY score DESC
-            LIMIT :limit
-        """)
+            LIMIT :candidates
+        ) matched
+    ),
+    fused AS (
+        SELECT coalesce(s.id, k.id) AS id, {score} AS score
+        FROM semantic s
+        FULL OUTER JOIN keyword k ON k.id = s.id
+        ORDER BY score DESC
+        LIMIT :limit
+    )
+    SELECT m.id, m.title, m.story_text, m.memory_date,
+           p.name AS person_name, p.id AS person_id, f.score
+    FROM fused f
+    JOIN memories m ON m.id = f.id
+    JOIN people p ON p.id = m.person_id
+    ORDER BY f.score DESC
+"""
+
+_FUSION_SQL = {
+    "weighted": "coalesce(s.score, 0) * :semantic_weight + coalesce(k.score, 0) * :keyword_weight",
+    "rrf": "coalesce(1.0 / (:rrf_k + s.rank), 0) + coalesce(1.0 / (:rrf_k + k.rank), 0)",
+}
+
+
+def hybrid_sql_search(
+    family_id: str,
+    query_text: str,
+    db: Session,
+    limit: int = 20,
+    query_embedding: Optional[list] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    fusion: str = "weighted",
+) -> Optional[List[dict]]:
+    """Semantic + full-text candidates, fusion and the people join in one statement.
+
+    Each leg contributes at most `limit` candidates (same as the Python merge,
+    so the two modes are directly comparable) and only the fused top-k rows
+    cross the wire. Returns None when the statement can't run (no tsvector
+    column, etc.) so the caller can fall back to the Python merge.
+
+    Complexity: one round trip; legs as in semantic_search/keyword_search,
+    fusion O(k log k) in the database.
+    """
+    capabilities = get_capabilities()
+    if not (capabilities["pgvector"] and capabilities["tsvector"]):
+        return None
+    tsquery = _build_tsvector_query(query_text)
+    embedding = query_embedding or _get_embedding(query_text)
+    if not embedding or not tsquery:
+        return None  # a single leg: nothing to fuse in SQL
+
+    sql = text(_HYBRID_SQL.format(score=_FUSION_SQL[fusion])).bindparams(
+        bindparam("embedding", type_=EmbeddingType()),
+    )
+    try:
+        apply_search_params(db, ef_search=ef_search, probes=probes)
         rows = db.execute(sql, {
+            "embedding": embedding,
             "tsquery": tsquery,
             "family_id": family_id,
+            "candidates": limit,
             "limit": limit,
+            "semantic_weight": SEMANTIC_WEIGHT,
+            "keyword_weight": KEYWORD_WEIGHT,
+            "rrf_k": RRF_K,
         }).fetchall()
+    except Exception as e:
+        logger.warning(f"Single-statement hybrid search failed, using Python merge: {e}")
+        db.rollback()
+        return None
 
-        results = []
-        for row in rows:
-            results.append({
-                "id": str(row[0]),
-                "title": row[1],
-                "story_text": row[2],
-                "memory_date": row[3].isoformat() if row[3] else None,
-                "person_name": row[4],
-                "person_id": str(row[5]) if row[5] else None,
-                "score": float(row[6]) if row[6] else 0.5,
-            })
-        return results
-    except Exception:
-        # Fallback to ILIKE
-        logger.info("tsvector unavailable, falling back to ILIKE")
-        from sqlalchemy import or_
-        from backend.database.models import Memory, Person
-        memories = db.query(Memory).filter(
-            Memory.family_id == family_id,
-            or_(
-                Memory.title.ilike(f"%{query_text}%"),
-                Memory.story_text.ilike(f"%{query_text}%"),
-            )
-        ).order_by(Memory.memory_date.desc().nullslast()).limit(limit).all()
-
-        results = []
-        for mem in memories:
-            person = db.query(Person).filter(Person.id == mem.person_id).first()
-            results.append({
-                "id": str(mem.id),
-                "title": mem.title,
-                "story_text": mem.story_text,
-                "memory_date": mem.memory_date.isoformat() if mem.memory_date else None,
-                "person_name": person.name if person else "Unknown",
-                "person_id": str(person.id) if person else None,
-                "score": 0.5,
-            })
-        return results
+    return [
+        {
+            "id": str(row[0]),
+            "title": row[1],
+            "story_text": row[2],
+            "memory_date": row[3].isoformat() if row[3] else None,
+            "person_name": row[4],
+            "person_id": str(row[5]) if row[5] else None,
+            "score": float(row[6]) if row[6] else 0,
+        }
+        for row in rows
+    ]
 
 
 def hybrid_query(
@@ -182,6 +489,12 @@ def hybrid_query(
     redis_client=None,
     user_id: Optional[str] = None,
     limit: int = 20,
+    query_embedding: Optional[list] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    fusion: str = "weighted",
+    use_cache: bool = True,
+    degraded: Optional[list] = None,
 ) -> List[dict]:
     """Hybrid search combining semantic + keyword results with weighted re-rank.
 
@@ -189,26 +502,59 @@ def hybrid_query(
         family_id: UUID of the family to search within.
         query_text: The user's search query.
         db: SQLAlchemy session.
-        mode: 'semantic' | 'keyword' | 'hybrid' (default hybrid).
-        redis_client: Optional Redis client for caching embeddings.
+        mode: 'semantic' | 'keyword' | 'hybrid' (default) | 'hybrid_sql'.
+        redis_client: Unused; embeddings are cached by backend.rag.embeddings.
         user_id: Optional user ID for cache key.
         limit: Max results to return.
+        query_embedding: Optional precomputed embedding of query_text.
+        ef_search: Optional HNSW ef_search for the semantic leg (recall vs latency).
+        probes: Optional IVFFlat probes for the semantic leg.
+        fusion: 'weighted' (SEMANTIC_WEIGHT/KEYWORD_WEIGHT, default) or 'rrf'.
+        use_cache: Serve/store results through the family-versioned search cache.
+        degraded: Optional list; names of legs that failed are appended.
 
     Returns:
         List of dicts with keys: id, title, story_text, memory_date,
         person_name, person_id, score (0-1).
 
-    Complexity: O(n log n) for merge + sort of two result sets.
+    Complexity: O(n log n) for merge + sort of two result sets; O(1) on a cache hit.
     """
+    if use_cache:
+        key = search_cache.key(family_id, mode, query_text, limit, fusion=fusion, ef_search=ef_search, probes=probes)
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+        failed = []
+        results = hybrid_query(
+            family_id, query_text, db, mode, redis_client, user_id, limit,
+            query_embedding, ef_search, probes, fusion, use_cache=False, degraded=failed,
+        )
+        if degraded is not None:
+            degraded.extend(failed)
+        if not failed:
+            search_cache.set(key, results)
+        return results
+
     if mode == "semantic":
-        return semantic_search(family_id, query_text, db, redis_client, user_id, limit)
+        return semantic_search(
+            family_id, query_text, db, redis_client, user_id, limit, query_embedding, ef_search, probes, degraded,
+        )
 
     if mode == "keyword":
-        return keyword_search(family_id, query_text, db, limit)
+        return keyword_search(family_id, query_text, db, limit, degraded)
+
+    if mode == "hybrid_sql" and _pgvector_enabled():
+        results = hybrid_sql_search(
+            family_id, query_text, db, limit, query_embedding, ef_search, probes, fusion,
+        )
+        if results is not None:
+            return results
 
     # Hybrid: run both and merge
-    semantic_results = semantic_search(family_id, query_text, db, redis_client, user_id, limit)
-    keyword_results = keyword_search(family_id, query_text, db, limit)
+    semantic_results = semantic_search(
+        family_id, query_text, db, redis_client, user_id, limit, query_embedding, ef_search, probes, degraded,
+    )
+    keyword_results = keyword_search(family_id, query_text, db, limit, degraded)
 
     # Log raw scores for debugging
     logger.debug(
@@ -220,27 +566,134 @@ def hybrid_query(
     for r in keyword_results:
         logger.debug(f"  keyword:  {r['title']!r} score={r['score']:.4f}")
 
-    # Merge by memory ID, applying weighted scores
-    merged = {}
-    for r in semantic_results:
-        rid = r["id"]
-        merged[rid] = r
-        merged[rid]["score"] = r["score"] * SEMANTIC_WEIGHT
+    return _fuse(semantic_results, keyword_results, fusion, limit)
 
-    for r in keyword_results:
-        rid = r["id"]
-        if rid in merged:
-            merged[rid]["score"] += r["score"] * KEYWORD_WEIGHT
-        else:
-            r["score"] = r["score"] * KEYWORD_WEIGHT
-            merged[rid] = r
+
+def _fuse(semantic_results: List[dict], keyword_results: List[dict], fusion: str, limit: int) -> List[dict]:
+    """Merge two ranked result lists by memory ID. O(n log n)."""
+    merged = {}
+    for weight, results in ((SEMANTIC_WEIGHT, semantic_results), (KEYWORD_WEIGHT, keyword_results)):
+        for rank, r in enumerate(results, start=1):
+            score = 1.0 / (RRF_K + rank) if fusion == "rrf" else r["score"] * weight
+            rid = r["id"]
+            if rid in merged:
+                merged[rid]["score"] += score
+            else:
+                r["score"] = score
+                merged[rid] = r
 
     # Sort by combined score descending, return top-k
     sorted_results = sorted(merged.values(), key=lambda x: x["score"], reverse=True)
 
     # Log final scores after threshold
-    logger.debug(f"hybrid_query final scores (top {limit}):")
+    logger.debug(f"hybrid_query final scores (top {limit}, {fusion}):")
     for r in sorted_results[:limit]:
         logger.debug(f"  final: {r['title']!r} score={r['score']:.4f}")
 
     return sorted_results[:limit]
+
+
+
+def _with_session(fn, *args, **kwargs):
+    """Run a search function on a fresh session (own connection); for worker threads."""
+    from backend.database.config import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return fn(*args, db=db, **kwargs)
+    finally:
+        db.close()
+
+
+async def _run_leg(name: str, coro, timeout: float, degraded: list) -> List[dict]:
+    """Await one search leg, degrading to no results on timeout or error."""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except ExecutorSaturated:
+        raise  # shed the request (503) rather than serve a silently degraded result
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} search exceeded {timeout}s, returning results without it")
+    except Exception as e:
+        logger.warning(f"{name} search failed: {e}")
+    degraded.append(name)
+    return []
+
+
+async def hybrid_query_async(
+    family_id: str,
+    query_text: str,
+    mode: str = "hybrid",
+    limit: int = 20,
+    query_embedding: Optional[list] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    fusion: str = "weighted",
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+) -> List[dict]:
+    """Async counterpart of hybrid_query that never blocks the event loop.
+
+    The semantic leg (query encode through the micro-batcher, then the vector
+    search) and the keyword leg start together; DB work runs in worker threads
+    on separate sessions, so each leg holds its own connection. A leg that
+    exceeds `timeout` seconds (default SEARCH_LEG_TIMEOUT) is dropped (its thread finishes and releases the
+    session in the background), degrading hybrid to single-mode results.
+
+    hybrid_sql is a single statement, so it runs as one leg under the timeout.
+
+    Complexity: as hybrid_query; wall time ~max(semantic, keyword).
+    """
+    from backend.rag.embeddings import embed_async
+
+    timeout = SEARCH_LEG_TIMEOUT if timeout is None else timeout
+
+    if use_cache:
+        key = await run_blocking(
+            search_cache.key, family_id, mode, query_text, limit, fusion=fusion, ef_search=ef_search, probes=probes,
+        )
+        cached = await run_blocking(search_cache.get, key)
+        if cached is not None:
+            return cached
+    degraded: List[str] = []
+
+    async def semantic_leg():
+        embedding = query_embedding or await embed_async(query_text)
+        if not embedding:
+            _embedding_failed(degraded)
+            return []
+        return await run_io(
+            _with_session, semantic_search, family_id, query_text,
+            limit=limit, query_embedding=embedding, ef_search=ef_search, probes=probes, degraded=degraded,
+        )
+
+    async def keyword_leg():
+        return await run_io(_with_session, keyword_search, family_id, query_text, limit=limit, degraded=degraded)
+
+    async def sql_leg():
+        embedding = query_embedding or await embed_async(query_text)
+        return await run_io(
+            _with_session, hybrid_query, family_id, query_text, mode="hybrid_sql", limit=limit,
+            query_embedding=embedding, ef_search=ef_search, probes=probes, fusion=fusion, use_cache=False,
+            degraded=degraded,
+        )
+
+    if mode == "semantic":
+        results = await _run_leg("Semantic", semantic_leg(), timeout, degraded)
+    elif mode == "keyword":
+        results = await _run_leg("Keyword", keyword_leg(), timeout, degraded)
+    elif mode == "hybrid_sql" and _pgvector_enabled():
+        results = await _run_leg("Hybrid SQL", sql_leg(), timeout, degraded)
+    else:
+        semantic_results, keyword_results = await asyncio.gather(
+            _run_leg("Semantic", semantic_leg(), timeout, degraded),
+            _run_leg("Keyword", keyword_leg(), timeout, degraded),
+        )
+        logger.debug(
+            f"hybrid_query_async [{query_text!r}]: "
+            f"{len(semantic_results)} semantic, {len(keyword_results)} keyword results"
+        )
+        results = _fuse(semantic_results, keyword_results, fusion, limit)
+
+    if use_cache and not degraded:
+        await run_blocking(search_cache.set, key, results)
+    return results
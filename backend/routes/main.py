@@ -1,19 +1,19 @@
 import os
 import uuid
+import asyncio
 import logging
-import shutil
 from datetime import datetime, timedelta, date
+from functools import lru_cache
 from typing import Optional, List
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import text, or_
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy import select, func, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 
 from backend.database.models import (
@@ -25,9 +25,31 @@ from backend.database.models import (
     RelationshipCreate, RelationshipResponse,
     MemoryCreate, MemoryResponse, SearchQuery, UploadResponse,
 )
-from backend.database.config import engine, SessionLocal, get_db, check_pgvector, init_db, PGVECTOR_AVAILABLE
+from backend.database.config import (
+    async_engine, get_async_db, run_in_sync_session, check_pgvector, init_db, PGVECTOR_AVAILABLE,
+    detect_capabilities, CAPABILITY_RECHECK_SECONDS, pool_stats,
+)
 from backend.utils import encrypt_api_key, decrypt_api_key, mask_api_key, get_user_llm_client
-from backend.rag.vector_store import hybrid_query
+from backend.rag.vector_store import hybrid_query_async, uses_local_index, SEARCH_MODES, FUSION_METHODS
+from backend.rag import local_index
+from backend.rag.search_cache import search_cache, invalidate_family, run_blocking
+from backend.utils.pagination import paginate_async
+from backend.utils import principals
+from backend.utils.principals import (
+    Principal, Membership, FamilyAccess, ResourceAccess, get_principal, get_membership, invalidate_user,
+    resource_family, remember_resource_family, forget_resource,
+)
+from backend.utils.passwords import hash_password_async, verify_password_async, password_executor
+from backend.utils.uploads import (
+    UPLOAD_MAX_REQUEST_BYTES, UploadTooLarge, StoredUpload, store_upload, release_uploads,
+)
+from backend.utils.executors import (
+    ExecutorSaturated, io_executor, run_io, run_cpu, executor_stats, shutdown_executors,
+)
+from backend.rag.embeddings import (
+    embed_async, embedding_cache, warm_up as warm_up_embeddings,
+    EMBEDDING_WARMUP, EMBEDDING_MODEL_VERSION,
+)
 from backend.graph.algorithms import shortest_path, detect_communities, centrality_ranking, build_adjacency_list
 from backend.scheduling.sm2 import sm2_update, get_due_memories, get_today_memories_for_user
 
@@ -48,8 +70,9 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173")
+# Comma-separated emails allowed to call the /admin endpoints
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # ─── App Setup ────────────────────────────────────────────────────────────────
@@ -62,8 +85,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Refuse oversized bodies from Content-Length, before multipart parsing spools them."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > UPLOAD_MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+
 # Static files for uploads
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
@@ -73,19 +107,40 @@ app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    init_db()  # also detects database capabilities (pgvector, tsvector)
     logger.info("Database initialized")
+    if EMBEDDING_WARMUP and warm_up_embeddings():
+        logger.info("Embedding model warmed up")
+    if CAPABILITY_RECHECK_SECONDS > 0:
+        app.state.capability_task = asyncio.create_task(_recheck_capabilities())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if async_engine is not None:
+        await async_engine.dispose()
+    shutdown_executors(wait=False)
+    password_executor.shutdown(wait=False)
+
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    """Backpressure: a full worker lane sheds the request instead of queueing it."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
-# ─── Helpers ──────────────────────────────────────────────────────────────────
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password.encode("utf-8")[:72])
-
+async def _recheck_capabilities():
+    """Refresh cached database capabilities, e.g. after `CREATE EXTENSION vector`."""
+    while True:
+        await asyncio.sleep(CAPABILITY_RECHECK_SECONDS)
+        await io_executor.run_required(detect_capabilities)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain.encode("utf-8")[:72], hashed)
 
+# ─── Helpers ──────────────────────────────────────────────────────────────────
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -94,14 +149,15 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """The authenticated user with their family memberships (short-TTL cached)."""
     token = credentials.credentials
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await get_principal(db, user_id)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -109,41 +165,162 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def save_upload(file: UploadFile) -> str:
-    """Save uploaded file to UPLOAD_DIR and return the URL path."""
-    ext = file.filename.rsplit(".", 1)[-1] if "." in file.filename else ""
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    return f"/uploads/{filename}"
+async def get_family_access(family_id: str, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> FamilyAccess:
+    """Dependency for routes taking family_id (path or query): the caller and
+    their membership, or 403. Served from the principal cache."""
+    member = await get_membership(db, current_user, family_id)
+    if not member:
+        raise HTTPException(status_code=403, detail="Not a family member")
+    return FamilyAccess(current_user, member)
+
+
+@lru_cache(maxsize=None)
+def require_membership(model, param: str, load: bool = True, admin: bool = False, not_found: Optional[str] = None):
+    """Dependency factory: resolve `model` by the path/query parameter `param`,
+    plus its family and the caller's membership, in one joined query.
+
+    Yields a ResourceAccess, or raises 404 (unknown resource) / 403 (not a
+    member, or not an admin when `admin`). With load=False the route only
+    needs authorization: a remembered resource family is checked against the
+    cached principal with no query at all. Factories are memoized, so FastAPI
+    also resolves each one at most once per request.
+    """
+    table = model.__tablename__
+    not_found = not_found or f"{model.__name__} not found"
+
+    async def dependency(
+        request: Request,
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+    ) -> ResourceAccess:
+        raw_id = request.path_params.get(param) or request.query_params.get(param)
+        try:
+            resource_id = uuid.UUID(str(raw_id))
+        except ValueError:
+            raise HTTPException(status_code=404, detail=not_found)
+
+        resource, family_id, member = None, None, None
+        if not load:
+            family_id = resource_family(table, resource_id)
+            if family_id is not None:
+                member = await get_membership(db, current_user, family_id)
+        if family_id is None:
+            target = model if load else model.family_id
+            row = (await db.execute(
+                select(target, FamilyMember)
+                .outerjoin(FamilyMember, and_(
+                    FamilyMember.family_id == model.family_id,
+                    FamilyMember.user_id == current_user.id,
+                ))
+                .where(model.id == resource_id)
+            )).first()
+            if row is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            found, fm = row
+            resource, family_id = (found, found.family_id) if load else (None, found)
+            remember_resource_family(table, resource_id, family_id)
+            if fm is not None:
+                member = Membership(fm.id, fm.user_id, fm.family_id, fm.role, fm.joined_at)
+
+        if member is None:
+            raise HTTPException(status_code=403, detail="Not a family member")
+        if admin and member.role != MemberRole.admin:
+            raise HTTPException(status_code=403, detail="Admin access required")
+        return ResourceAccess(resource, family_id, current_user, member)
+
+    return dependency
+
+
+def get_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return current_user
+
+
+async def keyset_page(db: AsyncSession, stmt, model, cursor: Optional[str], limit: int, descending: bool = True):
+    """Keyset-paginate `stmt` on (model.created_at, model.id); bad cursors are a 400."""
+    try:
+        return await paginate_async(db, stmt, model.created_at, model.id, cursor, limit, descending)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def stream_upload(file: UploadFile, db: AsyncSession) -> StoredUpload:
+    """Stream an upload into content-addressed storage, referenced in db's transaction."""
+    try:
+        return await store_upload(db, file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 
+async def save_upload(file: UploadFile, db: AsyncSession) -> str:
+    """Save uploaded file (deduplicated by content) and return the URL path."""
+    return (await stream_upload(file, db)).url
 
-def serialize_memory(memory: Memory, db: Session) -> dict:
+
+async def serialize_memory(memory: Memory, db: AsyncSession) -> dict:
     """Serialize a memory object with photos and contributor info."""
-    photos = db.query(MemoryPhoto).filter(MemoryPhoto.memory_id == memory.id).order_by(MemoryPhoto.display_order).all()
-    contributor = db.query(User).filter(User.id == memory.created_by_user_id).first()
-    person = db.query(Person).filter(Person.id == memory.person_id).first()
-    return {
-        "id": str(memory.id),
-        "person_id": str(memory.person_id),
-        "family_id": str(memory.family_id),
-        "title": memory.title,
-        "story_text": memory.story_text,
-        "memory_date": memory.memory_date.isoformat() if memory.memory_date else None,
-        "voice_note_url": memory.voice_note_url,
-        "created_by_user_id": str(memory.created_by_user_id),
-        "created_at": memory.created_at.isoformat() if memory.created_at else None,
-        "photos": [{"id": str(p.id), "photo_url": p.photo_url, "caption": p.caption, "display_order": p.display_order} for p in photos],
-        "contributor": {"name": contributor.name, "avatar_url": contributor.avatar_url} if contributor else None,
-        "person_name": person.name if person else None,
+    return (await serialize_memories([memory], db))[0]
+
+
+async def serialize_memories(memories: List[Memory], db: AsyncSession) -> List[dict]:
+    """Serialize memories with photos, contributor and person name.
+
+    Prefetches photos, contributors and people with one IN-list query each,
+    so the cost is 3 queries regardless of len(memories). O(n + photos).
+    """
+    if not memories:
+        return []
+    memory_ids = [m.id for m in memories]
+    photos_by_memory = {}
+    for photo in await db.scalars(
+        select(MemoryPhoto).where(MemoryPhoto.memory_id.in_(memory_ids)).order_by(MemoryPhoto.display_order)
+    ):
+        photos_by_memory.setdefault(photo.memory_id, []).append(photo)
+    contributors = {
+        u.id: u for u in await db.scalars(select(User).where(User.id.in_({m.created_by_user_id for m in memories})))
+    }
+    people = {
+        p.id: p for p in await db.scalars(select(Person).where(Person.id.in_({m.person_id for m in memories})))
     }
 
+    results = []
+    for memory in memories:
+        photos = photos_by_memory.get(memory.id, [])
+        contributor = contributors.get(memory.created_by_user_id)
+        person = people.get(memory.person_id)
+        results.append({
+            "id": str(memory.id),
+            "person_id": str(memory.person_id),
+            "family_id": str(memory.family_id),
+            "title": memory.title,
+            "story_text": memory.story_text,
+            "memory_date": memory.memory_date.isoformat() if memory.memory_date else None,
+            "voice_note_url": memory.voice_note_url,
+            "created_by_user_id": str(memory.created_by_user_id),
+            "created_at": memory.created_at.isoformat() if memory.created_at else None,
+            "photos": [{"id": str(p.id), "photo_url": p.photo_url, "caption": p.caption, "display_order": p.display_order} for p in photos],
+            "contributor": {"name": contributor.name, "avatar_url": contributor.avatar_url} if contributor else None,
+            "person_name": person.name if person else None,
+        })
+    return results
+
 
-def serialize_person(person: Person, db: Session) -> dict:
+async def serialize_person(person: Person, db: AsyncSession) -> dict:
     """Serialize a person with memory count."""
-    memory_count = db.query(Memory).filter(Memory.person_id == person.id).count()
-    return {
+    return (await serialize_people([person], db))[0]
+
+
+async def serialize_people(people: List[Person], db: AsyncSession) -> List[dict]:
+    """Serialize people with memory counts from one grouped COUNT query. O(n)."""
+    if not people:
+        return []
+    memory_counts = dict((await db.execute(
+        select(Memory.person_id, func.count())
+        .where(Memory.person_id.in_([p.id for p in people]))
+        .group_by(Memory.person_id)
+    )).all())
+    return [{
         "id": str(person.id),
         "family_id": str(person.family_id),
         "name": person.name,
@@ -153,41 +330,31 @@ def serialize_person(person: Person, db: Session) -> dict:
         "bio": person.bio,
         "created_by": str(person.created_by),
         "created_at": person.created_at.isoformat() if person.created_at else None,
-        "memory_count": memory_count,
-    }
-
-
-def get_embedding(text: str) -> Optional[list]:
-    """Generate embedding for text using sentence-transformers. Returns None if unavailable."""
-    try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        return model.encode(text).tolist()
-    except Exception as e:
-        logger.warning(f"Embedding generation failed: {e}")
-        return None
+        "memory_count": memory_counts.get(person.id, 0),
+    } for person in people]
 
 
 # ─── Auth Routes ──────────────────────────────────────────────────────────────
 
 @app.post("/auth/signup", response_model=LoginResponse)
-async def signup(data: UserCreate, db: Session = Depends(get_db)):
+async def signup(data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     logger.info(f"Signup attempt: {data.email}")
     
-    existing = db.query(User).filter(User.email == data.email).first()
+    existing = await db.scalar(select(User).where(User.email == data.email))
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    password_hash = await hash_password_async(data.password)
     try:
         user = User(
             id=uuid.uuid4(),
             email=data.email,
-            password_hash=hash_password(data.password),
+            password_hash=password_hash,
             name=data.name,
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         token = create_access_token({"user_id": str(user.id), "sub": user.email})
         
@@ -197,18 +364,25 @@ async def signup(data: UserCreate, db: Session = Depends(get_db)):
             user=UserResponse(id=str(user.id), name=user.name, email=user.email, avatar_url=user.avatar_url)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Signup failed: {e}")
         raise HTTPException(status_code=500, detail=f"Signup failed: {str(e)}")
 
 
 @app.post("/auth/login", response_model=LoginResponse)
-async def login(data: UserLogin, db: Session = Depends(get_db)):
+async def login(data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     logger.info(f"Login attempt: {data.email}")
     
-    user = db.query(User).filter(User.email == data.email).first()
-    if not user or not verify_password(data.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == data.email))
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await verify_password_async(data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored at a different BCRYPT_ROUNDS: upgrade while we have the plaintext
+        user.password_hash = new_hash
+        await db.commit()
     
     token = create_access_token({"user_id": str(user.id), "sub": user.email})
     
@@ -220,21 +394,21 @@ async def login(data: UserLogin, db: Session = Depends(get_db)):
 
 
 @app.get("/auth/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     return UserResponse(id=str(current_user.id), name=current_user.name, email=current_user.email, avatar_url=current_user.avatar_url)
 
 
 # ─── Family Routes ────────────────────────────────────────────────────────────
 
 @app.post("/family", response_model=FamilyResponse)
-async def create_family(data: FamilyCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_family(data: FamilyCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     family = Family(
         id=uuid.uuid4(),
         name=data.name,
         created_by=current_user.id,
     )
     db.add(family)
-    db.flush()
+    await db.flush()
     
     member = FamilyMember(
         id=uuid.uuid4(),
@@ -243,76 +417,70 @@ async def create_family(data: FamilyCreate, current_user: User = Depends(get_cur
         role=MemberRole.admin,
     )
     db.add(member)
-    db.commit()
-    db.refresh(family)
+    await db.commit()
+    invalidate_user(current_user.id)
+    await db.refresh(family)
     
-    return _serialize_family(family, db)
-
-
-def _serialize_family(family, db):
-    members = db.query(FamilyMember).filter(FamilyMember.family_id == family.id).all()
-    member_list = []
-    for m in members:
-        user = db.query(User).filter(User.id == m.user_id).first()
-        if user:
-            member_list.append({
-                "id": str(m.id),
-                "name": user.name,
-                "avatar_url": user.avatar_url,
-                "role": m.role.value,
-            })
-    
-    return {
+    return await _serialize_family(family, db)
+
+
+async def _serialize_family(family, db: AsyncSession):
+    return (await _serialize_families([family], db))[0]
+
+
+async def _serialize_families(families: List[Family], db: AsyncSession) -> List[dict]:
+    """Serialize families with their members (joined to users) in one query."""
+    if not families:
+        return []
+    members_by_family = {}
+    for m, user in (await db.execute(
+        select(FamilyMember, User).join(User, User.id == FamilyMember.user_id)
+        .where(FamilyMember.family_id.in_([f.id for f in families]))
+    )).all():
+        members_by_family.setdefault(m.family_id, []).append(
+            {"id": str(m.id), "name": user.name, "avatar_url": user.avatar_url, "role": m.role.value}
+        )
+
+    return [{
         "id": str(family.id),
         "name": family.name,
         "cover_photo_url": family.cover_photo_url,
         "invite_token": str(family.invite_token),
         "created_by": str(family.created_by),
         "created_at": family.created_at.isoformat() if family.created_at else None,
-        "members": member_list,
-    }
+        "members": members_by_family.get(family.id, []),
+    } for family in families]
 
 
 @app.get("/family/{family_id}")
-async def get_family(family_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    family = db.query(Family).filter(Family.id == family_id).first()
+async def get_family(family_id: str, access: FamilyAccess = Depends(get_family_access), db: AsyncSession = Depends(get_async_db)):
+    family = await db.scalar(select(Family).where(Family.id == family_id))
     if not family:
         raise HTTPException(status_code=404, detail="Family not found")
     
-    # Check membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
     
-    return _serialize_family(family, db)
+    return await _serialize_family(family, db)
 
 
 @app.get("/family/{family_id}/invite-link")
-async def get_invite_link(family_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    family = db.query(Family).filter(Family.id == family_id).first()
+async def get_invite_link(family_id: str, access: FamilyAccess = Depends(get_family_access), db: AsyncSession = Depends(get_async_db)):
+    family = await db.scalar(select(Family).where(Family.id == family_id))
     if not family:
         raise HTTPException(status_code=404, detail="Family not found")
     
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
     
     return {"invite_url": f"http://localhost:5173/join/{family.invite_token}"}
 
 
 @app.post("/family/join/{invite_token}")
-async def join_family(invite_token: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    family = db.query(Family).filter(Family.invite_token == invite_token).first()
+async def join_family(invite_token: str, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    family = await db.scalar(select(Family).where(Family.invite_token == invite_token))
     if not family:
         raise HTTPException(status_code=404, detail="Invalid invite token")
     
-    existing = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family.id, FamilyMember.user_id == current_user.id
-    ).first()
+    existing = await get_membership(db, current_user, family.id)
     if existing:
         raise HTTPException(status_code=400, detail="Already a member of this family")
     
@@ -323,35 +491,39 @@ async def join_family(invite_token: str, current_user: User = Depends(get_curren
         role=MemberRole.member,
     )
     db.add(member)
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.id)
     
-    return _serialize_family(family, db)
+    return await _serialize_family(family, db)
 
 
 @app.get("/user/families")
-async def get_user_families(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    memberships = db.query(FamilyMember).filter(FamilyMember.user_id == current_user.id).all()
-    families = []
-    for m in memberships:
-        family = db.query(Family).filter(Family.id == m.family_id).first()
-        if family:
-            families.append(_serialize_family(family, db))
-    return families
+async def get_user_families(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    family_ids = [m.family_id for m in current_user.memberships.values()]
+    if not family_ids:
+        return []
+    families = {f.id: f for f in await db.scalars(select(Family).where(Family.id.in_(family_ids)))}
+    return await _serialize_families([families[fid] for fid in family_ids if fid in families], db)
 
 
 # ─── People Routes ────────────────────────────────────────────────────────────
 
 @app.get("/family/{family_id}/people")
-async def get_people(family_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+async def get_people(
+    family_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=500),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List people, newest first. Keyset-paginated; the next cursor is in X-Next-Cursor."""
+    current_user, member = access
     
-    people = db.query(Person).filter(Person.family_id == family_id).order_by(Person.created_at.desc()).all()
-    return [serialize_person(p, db) for p in people]
+    people, next_cursor = await keyset_page(db, select(Person).where(Person.family_id == family_id), Person, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return await serialize_people(people, db)
 
 
 @app.post("/family/{family_id}/people")
@@ -362,14 +534,10 @@ async def create_person(
     dob: Optional[str] = Form(None),
     bio: Optional[str] = Form(None),
     photo: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
     
     # Parse relationship tag enum
     tag_enum = None
@@ -389,7 +557,7 @@ async def create_person(
     
     photo_url = None
     if photo:
-        photo_url = save_upload(photo)
+        photo_url = await save_upload(photo, db)
     
     person = Person(
         id=uuid.uuid4(),
@@ -402,29 +570,20 @@ async def create_person(
         created_by=current_user.id,
     )
     db.add(person)
-    db.commit()
-    db.refresh(person)
+    await db.commit()
+    await db.refresh(person)
     
-    return serialize_person(person, db)
+    return await serialize_person(person, db)
 
 
 @app.get("/people/{person_id}")
-async def get_person(person_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    person = db.query(Person).filter(Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+async def get_person(person_id: str, access: ResourceAccess = Depends(require_membership(Person, "person_id")), db: AsyncSession = Depends(get_async_db)):
+    person = access.resource
     
-    memories = db.query(Memory).filter(Memory.person_id == person_id).order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()).all()
+    memories = (await db.scalars(select(Memory).where(Memory.person_id == person_id).order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()))).all()
     
-    result = serialize_person(person, db)
-    result["memories"] = [serialize_memory(m, db) for m in memories]
+    result = await serialize_person(person, db)
+    result["memories"] = await serialize_memories(memories, db)
     return result
 
 
@@ -436,19 +595,10 @@ async def update_person(
     dob: Optional[str] = Form(None),
     bio: Optional[str] = Form(None),
     photo: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Person, "person_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    person = db.query(Person).filter(Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    person = access.resource
     
     if name:
         person.name = name
@@ -465,11 +615,14 @@ async def update_person(
     if bio is not None:
         person.bio = bio
     if photo:
-        person.photo_url = save_upload(photo)
+        await release_uploads(db, [person.photo_url])
+        person.photo_url = await save_upload(photo, db)
     
-    db.commit()
-    db.refresh(person)
-    return serialize_person(person, db)
+    await db.commit()
+    await db.refresh(person)
+    if name:
+        await run_blocking(invalidate_family, person.family_id)  # cached search results carry person_name
+    return await serialize_person(person, db)
 
 
 # ─── Relationship Routes ──────────────────────────────────────────────────────
@@ -478,27 +631,23 @@ async def update_person(
 async def create_relationship(
     family_id: str,
     data: RelationshipCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
     
     # Verify both people exist in this family
-    person_a = db.query(Person).filter(Person.id == data.person_a_id, Person.family_id == family_id).first()
-    person_b = db.query(Person).filter(Person.id == data.person_b_id, Person.family_id == family_id).first()
+    person_a = await db.scalar(select(Person).where(Person.id == data.person_a_id, Person.family_id == family_id))
+    person_b = await db.scalar(select(Person).where(Person.id == data.person_b_id, Person.family_id == family_id))
     if not person_a or not person_b:
         raise HTTPException(status_code=404, detail="Person not found")
     
-    existing = db.query(Relationship).filter(
+    existing = await db.scalar(select(Relationship).where(
         or_(
             (Relationship.person_a_id == data.person_a_id) & (Relationship.person_b_id == data.person_b_id),
             (Relationship.person_a_id == data.person_b_id) & (Relationship.person_b_id == data.person_a_id),
         )
-    ).first()
+    ))
     if existing:
         raise HTTPException(status_code=400, detail="Relationship already exists")
     
@@ -510,8 +659,8 @@ async def create_relationship(
         label=data.label,
     )
     db.add(rel)
-    db.commit()
-    db.refresh(rel)
+    await db.commit()
+    await db.refresh(rel)
     
     return {
         "id": str(rel.id),
@@ -522,18 +671,16 @@ async def create_relationship(
 
 
 @app.get("/family/{family_id}/relationships")
-async def get_relationships(family_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+async def get_relationships(family_id: str, access: FamilyAccess = Depends(get_family_access), db: AsyncSession = Depends(get_async_db)):
+    current_user, member = access
     
-    rels = db.query(Relationship).filter(Relationship.family_id == family_id).all()
+    rels = (await db.scalars(select(Relationship).where(Relationship.family_id == family_id))).all()
+    person_ids = {r.person_a_id for r in rels} | {r.person_b_id for r in rels}
+    people = {p.id: p for p in await db.scalars(select(Person).where(Person.id.in_(person_ids)))} if rels else {}
     result = []
     for rel in rels:
-        person_a = db.query(Person).filter(Person.id == rel.person_a_id).first()
-        person_b = db.query(Person).filter(Person.id == rel.person_b_id).first()
+        person_a = people.get(rel.person_a_id)
+        person_b = people.get(rel.person_b_id)
         result.append({
             "id": str(rel.id),
             "person_a": {"id": str(person_a.id), "name": person_a.name} if person_a else {},
@@ -544,20 +691,14 @@ async def get_relationships(family_id: str, current_user: User = Depends(get_cur
 
 
 @app.delete("/relationships/{relationship_id}")
-async def delete_relationship(relationship_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rel = db.query(Relationship).filter(Relationship.id == relationship_id).first()
-    if not rel:
-        raise HTTPException(status_code=404, detail="Relationship not found")
-    
-    # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == rel.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-    
-    db.delete(rel)
-    db.commit()
+async def delete_relationship(
+    relationship_id: str,
+    access: ResourceAccess = Depends(require_membership(Relationship, "relationship_id")),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await db.delete(access.resource)
+    await db.commit()
+    forget_resource(Relationship.__tablename__, relationship_id)
     return {"message": "Relationship deleted"}
 
 
@@ -571,19 +712,10 @@ async def create_memory(
     memory_date: Optional[str] = Form(None),
     photos: List[UploadFile] = File(default=[]),
     voice_note: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Person, "person_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    person = db.query(Person).filter(Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    person, current_user = access.resource, access.user
     
     # Parse date
     mem_date = None
@@ -596,13 +728,11 @@ async def create_memory(
     # Save voice note
     voice_note_url = None
     if voice_note and voice_note.filename:
-        voice_note_url = save_upload(voice_note)
+        voice_note_url = await save_upload(voice_note, db)
     
     # Generate embedding
     embedding_text = f"{title} {story_text or ''}"
-    embedding = get_embedding(embedding_text)
-    # Store as JSON string if pgvector is not available (PGVECTOR_AVAILABLE is imported from config at top of file)
-    embedding_value = embedding if PGVECTOR_AVAILABLE else (str(embedding) if embedding else None)
+    embedding = await embed_async(embedding_text)
     
     memory = Memory(
         id=uuid.uuid4(),
@@ -613,15 +743,16 @@ async def create_memory(
         memory_date=mem_date,
         voice_note_url=voice_note_url,
         created_by_user_id=current_user.id,
-        embedding=embedding_value,
+        embedding=embedding,
+        embedding_model=EMBEDDING_MODEL_VERSION if embedding else None,
     )
     db.add(memory)
-    db.flush()
+    await db.flush()
     
     # Save photos
     for i, photo in enumerate(photos):
         if photo.filename:
-            photo_url = save_upload(photo)
+            photo_url = await save_upload(photo, db)
             mp = MemoryPhoto(
                 id=uuid.uuid4(),
                 memory_id=memory.id,
@@ -630,136 +761,86 @@ async def create_memory(
             )
             db.add(mp)
     
-    db.commit()
-    db.refresh(memory)
+    await db.commit()
+    await db.refresh(memory)
+    if embedding and uses_local_index():
+        await io_executor.run_required(local_index.add, memory.family_id, memory.id, embedding)
+    await run_blocking(invalidate_family, memory.family_id)
     
-    return serialize_memory(memory, db)
+    return await serialize_memory(memory, db)
 
 
 @app.get("/people/{person_id}/memories")
-async def get_person_memories(person_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    person = db.query(Person).filter(Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-    
-    memories = db.query(Memory).filter(Memory.person_id == person_id).order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()).all()
-    return [serialize_memory(m, db) for m in memories]
+async def get_person_memories(
+    person_id: str,
+    access: ResourceAccess = Depends(require_membership(Person, "person_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    memories = (await db.scalars(select(Memory).where(Memory.person_id == person_id).order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()))).all()
+    return await serialize_memories(memories, db)
 
 
 @app.get("/memories/{memory_id}/public")
-async def get_public_memory(memory_id: str, db: Session = Depends(get_db)):
+async def get_public_memory(memory_id: str, db: AsyncSession = Depends(get_async_db)):
     """No auth required - for sharing."""
-    memory = db.query(Memory).filter(Memory.id == memory_id).first()
+    memory = await db.scalar(select(Memory).where(Memory.id == memory_id))
     if not memory:
         raise HTTPException(status_code=404, detail="Memory not found")
     
-    person = db.query(Person).filter(Person.id == memory.person_id).first()
-    family = db.query(Family).filter(Family.id == memory.family_id).first()
+    person = await db.scalar(select(Person).where(Person.id == memory.person_id))
+    family = await db.scalar(select(Family).where(Family.id == memory.family_id))
     
-    result = serialize_memory(memory, db)
+    result = await serialize_memory(memory, db)
     result["family_name"] = family.name if family else None
     result["person_name"] = person.name if person else None
     return result
 
 
 @app.delete("/memories/{memory_id}")
-async def delete_memory(memory_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    memory = db.query(Memory).filter(Memory.id == memory_id).first()
-    if not memory:
-        raise HTTPException(status_code=404, detail="Memory not found")
+async def delete_memory(
+    memory_id: str,
+    access: ResourceAccess = Depends(require_membership(Memory, "memory_id")),
+    db: AsyncSession = Depends(get_async_db),
+):
+    memory, current_user, member = access.resource, access.user, access.member
     
     # Only creator or family admin can delete
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == memory.family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-    
     if memory.created_by_user_id != current_user.id and member.role != MemberRole.admin:
         raise HTTPException(status_code=403, detail="Only the creator or family admin can delete")
     
-    db.delete(memory)
-    db.commit()
+    family_id = memory.family_id
+    photo_urls = (await db.scalars(select(MemoryPhoto.photo_url).where(MemoryPhoto.memory_id == memory.id))).all()
+    await release_uploads(db, [memory.voice_note_url, *photo_urls])
+    await db.delete(memory)
+    await db.commit()
+    forget_resource(Memory.__tablename__, memory_id)
+    if uses_local_index():
+        await io_executor.run_required(local_index.remove, family_id, memory_id)
+    await run_blocking(invalidate_family, family_id)
     return {"message": "Memory deleted"}
 
 
 # ─── Search Route ─────────────────────────────────────────────────────────────
 
 @app.post("/family/{family_id}/search")
-async def search_family(family_id: str, data: SearchQuery, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id, FamilyMember.user_id == current_user.id
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-    
-    query_text = data.query
-    results = []
-    
-    # Try pgvector semantic search first
-    pgvector_ok = PGVECTOR_AVAILABLE and check_pgvector()
-    
-    if pgvector_ok:
-        try:
-            embedding = get_embedding(query_text)
-            if embedding:
-                embedding_str = "[" + ",".join(str(v) for v in embedding) + "]"
-                sql = text("""
-                    SELECT m.id, m.title, m.story_text, m.memory_date, p.name as person_name,
-                           1 - (m.embedding <=> :embedding) as score
-                    FROM memories m
-                    JOIN people p ON p.id = m.person_id
-                    WHERE m.family_id = :family_id AND m.embedding IS NOT NULL
-                    ORDER BY m.embedding <=> :embedding
-                    LIMIT 20
-                """)
-                rows = db.execute(sql, {"embedding": embedding_str, "family_id": family_id}).fetchall()
-                for row in rows:
-                    results.append({
-                        "memory": {
-                            "id": str(row[0]),
-                            "title": row[1],
-                            "story_text": row[2],
-                            "memory_date": row[3].isoformat() if row[3] else None,
-                        },
-                        "person_name": row[4],
-                        "score": float(row[5]) if row[5] else 0,
-                    })
-        except Exception as e:
-            logger.warning(f"Vector search failed, falling back to ILIKE: {e}")
-            pgvector_ok = False
-    
-    # Fallback: ILIKE search
-    if not pgvector_ok:
-        memories = db.query(Memory).filter(
-            Memory.family_id == family_id,
-            or_(
-                Memory.title.ilike(f"%{query_text}%"),
-                Memory.story_text.ilike(f"%{query_text}%"),
-            )
-        ).order_by(Memory.memory_date.desc().nullslast()).limit(20).all()
-        
-        for memory in memories:
-            person = db.query(Person).filter(Person.id == memory.person_id).first()
-            results.append({
-                "memory": {
-                    "id": str(memory.id),
-                    "title": memory.title,
-                    "story_text": memory.story_text,
-                    "memory_date": memory.memory_date.isoformat() if memory.memory_date else None,
-                },
-                "person_name": person.name if person else "Unknown",
-                "score": 0.5,
-            })
+async def search_family(family_id: str, data: SearchQuery, access: FamilyAccess = Depends(get_family_access), db: AsyncSession = Depends(get_async_db)):
+    current_user, member = access
     
-    return results
+    # Same engine as /home/rag/query (hybrid, cached, legs off the event loop)
+    results = await hybrid_query_async(family_id=family_id, query_text=data.query, limit=20)
+    return [
+        {
+            "memory": {
+                "id": r["id"],
+                "title": r["title"],
+                "story_text": r["story_text"],
+                "memory_date": r["memory_date"],
+            },
+            "person_name": r["person_name"] or "Unknown",
+            "score": r["score"],
+        }
+        for r in results
+    ]
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -770,8 +851,8 @@ async def search_family(family_id: str, data: SearchQuery, current_user: User =
 async def set_api_key(
     provider: str = Form(...),
     key: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Store an encrypted API key for the user.
     Only ENCRYPTION_SECRET lives in .env; user provider keys are encrypted at rest.
@@ -783,10 +864,10 @@ async def set_api_key(
 
     encrypted = encrypt_api_key(key.strip())
 
-    existing = db.query(ApiKey).filter(
+    existing = await db.scalar(select(ApiKey).where(
         ApiKey.user_id == current_user.id,
         ApiKey.provider == provider,
-    ).first()
+    ))
 
     if existing:
         existing.encrypted_key = encrypted
@@ -799,17 +880,17 @@ async def set_api_key(
         )
         db.add(new_key)
 
-    db.commit()
+    await db.commit()
     return {"message": f"{provider} API key saved", "provider": provider}
 
 
 @app.get("/home/settings/api-key")
 async def get_api_keys(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Return providers + masked keys (never the full key)."""
-    keys = db.query(ApiKey).filter(ApiKey.user_id == current_user.id).all()
+    keys = (await db.scalars(select(ApiKey).where(ApiKey.user_id == current_user.id))).all()
     return [
         {
             "provider": k.provider,
@@ -823,18 +904,18 @@ async def get_api_keys(
 @app.delete("/home/settings/api-key")
 async def delete_api_key(
     provider: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Delete a stored API key for a given provider."""
-    key = db.query(ApiKey).filter(
+    key = await db.scalar(select(ApiKey).where(
         ApiKey.user_id == current_user.id,
         ApiKey.provider == provider,
-    ).first()
+    ))
     if not key:
         raise HTTPException(status_code=404, detail=f"No {provider} key found")
-    db.delete(key)
-    db.commit()
+    await db.delete(key)
+    await db.commit()
     return {"message": f"{provider} API key removed"}
 
 
@@ -847,34 +928,59 @@ async def rag_query(
     query: str = Form(...),
     family_id: str = Form(...),
     mode: str = Form("hybrid"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    ef_search: Optional[int] = Form(None),
+    probes: Optional[int] = Form(None),
+    fusion: str = Form("weighted"),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Hybrid search combining semantic + keyword search with weighted re-rank.
-    Mode: semantic | keyword | hybrid (default).
+    Mode: semantic | keyword | hybrid (default) | hybrid_sql (one SQL round trip).
+    Fusion: weighted (default) | rrf (reciprocal rank fusion).
+    ef_search / probes optionally tune the pgvector ANN index (recall vs latency).
     """
     # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
-    if mode not in ("semantic", "keyword", "hybrid"):
-        raise HTTPException(status_code=400, detail="Mode must be: semantic, keyword, or hybrid")
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(SEARCH_MODES)}")
+    if fusion not in FUSION_METHODS:
+        raise HTTPException(status_code=400, detail=f"Fusion must be one of: {', '.join(FUSION_METHODS)}")
 
-    results = hybrid_query(
+    # Legs run concurrently off the event loop; a slow leg is dropped after SEARCH_LEG_TIMEOUT
+    results = await hybrid_query_async(
         family_id=family_id,
         query_text=query,
-        db=db,
         mode=mode,
-        user_id=str(current_user.id),
+        ef_search=ef_search,
+        probes=probes,
+        fusion=fusion,
     )
 
     return {"results": results, "mode": mode, "count": len(results)}
 
 
+@app.get("/home/rag/stats")
+async def rag_stats(current_user: Principal = Depends(get_current_user)):
+    """Hit/miss counters for the embedding and search result caches (LRU + Redis tiers)."""
+    return {"embedding_cache": embedding_cache.stats(), "search_cache": search_cache.stats()}
+
+
+@app.get("/admin/db/pool")
+async def db_pool_stats(admin: Principal = Depends(get_admin_user)):
+    """Database connection pool usage (checked out, overflow, checkout waits) and
+    principal cache hits, each of which saved the per-request user/membership queries."""
+    return {**pool_stats(), "principal_cache": principals.stats()}
+
+
+@app.get("/admin/executors")
+async def executor_pool_stats(admin: Principal = Depends(get_admin_user)):
+    """In-flight, peak and rejected (503) counts for the io, cpu and password worker pools."""
+    return {**executor_stats(), "password": password_executor.stats()}
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECTION 2: Graph Algorithms
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -883,29 +989,19 @@ async def rag_query(
 async def graph_shortest_path(
     from_id: str = Query(..., alias="from"),
     to_id: str = Query(..., alias="to"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Person, "from", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """BFS shortest path between two people. O(V + E)."""
-    person_a = db.query(Person).filter(Person.id == from_id).first()
-    person_b = db.query(Person).filter(Person.id == to_id).first()
-    if not person_a or not person_b:
+    family_id = access.family_id
+    person_b = await db.scalar(select(Person).where(Person.id == to_id))
+    if not person_b:
         raise HTTPException(status_code=404, detail="Person not found")
-
-    # Verify membership in same family
-    if person_a.family_id != person_b.family_id:
+    if person_b.family_id != family_id:
         raise HTTPException(status_code=400, detail="People are in different families")
 
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person_a.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    family_id = person_a.family_id
-    people = db.query(Person).filter(Person.family_id == family_id).all()
-    rels = db.query(Relationship).filter(Relationship.family_id == family_id).all()
+    people = (await db.scalars(select(Person).where(Person.family_id == family_id))).all()
+    rels = (await db.scalars(select(Relationship).where(Relationship.family_id == family_id))).all()
 
     people_map = {str(p.id): p.name for p in people}
     rel_list = [{
@@ -918,7 +1014,7 @@ async def graph_shortest_path(
         rel_list,
     )
 
-    result = shortest_path(from_id, to_id, adj, people_map)
+    result = await run_cpu(shortest_path, from_id, to_id, adj, people_map)
     if result is None:
         return {"path": None, "degree": None, "message": "No path found between these people"}
     return result
@@ -927,19 +1023,14 @@ async def graph_shortest_path(
 @app.get("/graph/communities")
 async def graph_communities(
     family_id: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Detect communities (connected components) in the family graph. O(E α(V))."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
 
-    people = db.query(Person).filter(Person.family_id == family_id).all()
-    rels = db.query(Relationship).filter(Relationship.family_id == family_id).all()
+    people = (await db.scalars(select(Person).where(Person.family_id == family_id))).all()
+    rels = (await db.scalars(select(Relationship).where(Relationship.family_id == family_id))).all()
 
     people_map = {str(p.id): p.name for p in people}
     rel_list = [{
@@ -952,26 +1043,21 @@ async def graph_communities(
         rel_list,
     )
 
-    communities = detect_communities(adj, people_map)
+    communities = await run_cpu(detect_communities, adj, people_map)
     return {"communities": communities, "count": len(communities)}
 
 
 @app.get("/graph/centrality")
 async def graph_centrality(
     family_id: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Rank people by degree centrality. O(V)."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
 
-    people = db.query(Person).filter(Person.family_id == family_id).all()
-    rels = db.query(Relationship).filter(Relationship.family_id == family_id).all()
+    people = (await db.scalars(select(Person).where(Person.family_id == family_id))).all()
+    rels = (await db.scalars(select(Relationship).where(Relationship.family_id == family_id))).all()
 
     people_map = {str(p.id): p.name for p in people}
     rel_list = [{
@@ -984,7 +1070,7 @@ async def graph_centrality(
         rel_list,
     )
 
-    rankings = centrality_ranking(adj, people_map)
+    rankings = await run_cpu(centrality_ranking, adj, people_map)
     return {"rankings": rankings}
 
 
@@ -995,11 +1081,11 @@ async def graph_centrality(
 @app.get("/home/jobs/{job_id}")
 async def get_job_status_endpoint(
     job_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Poll job status from Redis. O(1)."""
     from backend.jobs import get_job_status as _job_status
-    status = _job_status(job_id)
+    status = await run_io(_job_status, job_id)  # sync Redis GET
     return status
 
 
@@ -1012,43 +1098,32 @@ async def get_memories_in_range(
     person_id: str,
     start: str = Query(None),
     end: str = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Person, "person_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get memories for a person filtered by date range.
     Uses Postgres range types for efficient querying when available,
     with simple comparison fallback.
     Complexity: O(log n) with B-tree index on memory_date.
     """
-    person = db.query(Person).filter(Person.id == person_id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
-
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == person.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    query = db.query(Memory).filter(Memory.person_id == person_id)
+    query = select(Memory).where(Memory.person_id == person_id)
 
     if start:
         try:
             start_date = date.fromisoformat(start)
-            query = query.filter(Memory.memory_date >= start_date)
+            query = query.where(Memory.memory_date >= start_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid start date format. Use YYYY-MM-DD")
 
     if end:
         try:
             end_date = date.fromisoformat(end)
-            query = query.filter(Memory.memory_date <= end_date)
+            query = query.where(Memory.memory_date <= end_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid end date format. Use YYYY-MM-DD")
 
-    memories = query.order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()).all()
-    return {"memories": [serialize_memory(m, db) for m in memories], "count": len(memories)}
+    memories = (await db.scalars(query.order_by(Memory.memory_date.desc().nullslast(), Memory.created_at.desc()))).all()
+    return {"memories": await serialize_memories(memories, db), "count": len(memories)}
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -1057,13 +1132,13 @@ async def get_memories_in_range(
 
 @app.get("/home/resurface/today")
 async def get_resurfacing_today(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get memories due for review today (SM-2 spaced repetition).
     Returns both scheduled memories and 'On This Day' fallback.
     """
-    memories = get_today_memories_for_user(str(current_user.id), db)
+    memories = await db.run_sync(lambda session: get_today_memories_for_user(str(current_user.id), session))
     return {"memories": memories, "count": len(memories)}
 
 
@@ -1071,8 +1146,8 @@ async def get_resurfacing_today(
 async def review_resurfaced_memory(
     memory_id: str,
     quality: int = Form(...),  # 0-5 SM-2 quality rating
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Memory, "memory_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Submit an SM-2 review quality rating for a resurfaced memory.
     Quality: 0-2 = 'let it fade' (fail), 3-5 = 'still meaningful' (pass).
@@ -1080,9 +1155,7 @@ async def review_resurfaced_memory(
     if quality < 0 or quality > 5:
         raise HTTPException(status_code=400, detail="Quality must be 0-5")
 
-    memory = db.query(Memory).filter(Memory.id == memory_id).first()
-    if not memory:
-        raise HTTPException(status_code=404, detail="Memory not found")
+    memory = access.resource
 
     # Apply SM-2 update
     result = sm2_update(quality, memory.interval_days, memory.ease_factor)
@@ -1092,7 +1165,7 @@ async def review_resurfaced_memory(
     memory.ease_factor = result["ease_factor"]
     memory.next_review_at = datetime.fromisoformat(result["next_review_at"].replace("Z", ""))
 
-    db.commit()
+    await db.commit()
     return {
         "message": "Review recorded",
         "quality": quality,
@@ -1114,14 +1187,11 @@ async def create_trip(
     start_date: Optional[str] = Form(None),
     end_date: Optional[str] = Form(None),
     notes: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a new trip."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
@@ -1136,8 +1206,8 @@ async def create_trip(
         created_by=current_user.id,
     )
     db.add(trip)
-    db.commit()
-    db.refresh(trip)
+    await db.commit()
+    await db.refresh(trip)
     return {
         "id": str(trip.id),
         "name": trip.name,
@@ -1151,22 +1221,26 @@ async def create_trip(
 @app.get("/home/trips")
 async def get_trips(
     family_id: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """List all trips for a family."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    trips = db.query(Trip).filter(Trip.family_id == family_id).order_by(Trip.created_at.desc()).all()
+    """List trips for a family, newest first (keyset-paginated via next_cursor)."""
+    current_user, member = access
+
+    trips, next_cursor = await keyset_page(db, select(Trip).where(Trip.family_id == family_id), Trip, cursor, limit)
+    trip_ids = [t.id for t in trips]
+    person_counts, memory_counts = {}, {}
+    if trip_ids:
+        person_counts = dict((await db.execute(
+            select(TripPerson.trip_id, func.count()).where(TripPerson.trip_id.in_(trip_ids)).group_by(TripPerson.trip_id)
+        )).all())
+        memory_counts = dict((await db.execute(
+            select(TripMemory.trip_id, func.count()).where(TripMemory.trip_id.in_(trip_ids)).group_by(TripMemory.trip_id)
+        )).all())
     results = []
     for t in trips:
-        person_count = db.query(TripPerson).filter(TripPerson.trip_id == t.id).count()
-        memory_count = db.query(TripMemory).filter(TripMemory.trip_id == t.id).count()
         results.append({
             "id": str(t.id),
             "name": t.name,
@@ -1174,41 +1248,33 @@ async def get_trips(
             "start_date": t.start_date.isoformat() if t.start_date else None,
             "end_date": t.end_date.isoformat() if t.end_date else None,
             "notes": t.notes,
-            "person_count": person_count,
-            "memory_count": memory_count,
+            "person_count": person_counts.get(t.id, 0),
+            "memory_count": memory_counts.get(t.id, 0),
         })
-    return {"trips": results}
+    return {"trips": results, "next_cursor": next_cursor}
 
 
 @app.get("/home/trip/{trip_id}")
 async def get_trip_detail(
     trip_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Trip, "trip_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get trip details with associated people and memories."""
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
-    if not trip:
-        raise HTTPException(status_code=404, detail="Trip not found")
-
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == trip.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    people = []
-    for tp in db.query(TripPerson).filter(TripPerson.trip_id == trip_id).all():
-        p = db.query(Person).filter(Person.id == tp.person_id).first()
-        if p:
-            people.append({"id": str(p.id), "name": p.name})
+    trip = access.resource
 
-    memories = []
-    for tm in db.query(TripMemory).filter(TripMemory.trip_id == trip_id).all():
-        m = db.query(Memory).filter(Memory.id == tm.memory_id).first()
-        if m:
-            memories.append({"id": str(m.id), "title": m.title})
+    people = [
+        {"id": str(p.id), "name": p.name}
+        for p in await db.scalars(
+            select(Person).join(TripPerson, TripPerson.person_id == Person.id).where(TripPerson.trip_id == trip.id)
+        )
+    ]
+    memories = [
+        {"id": str(m.id), "title": m.title}
+        for m in await db.scalars(
+            select(Memory).join(TripMemory, TripMemory.memory_id == Memory.id).where(TripMemory.trip_id == trip.id)
+        )
+    ]
 
     return {
         "id": str(trip.id),
@@ -1226,31 +1292,20 @@ async def get_trip_detail(
 async def add_person_to_trip(
     trip_id: str,
     person_id: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Trip, "trip_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Add a person to a trip."""
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
-    if not trip:
-        raise HTTPException(status_code=404, detail="Trip not found")
-
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == trip.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    existing = db.query(TripPerson).filter(
+    existing = await db.scalar(select(TripPerson).where(
         TripPerson.trip_id == trip_id,
         TripPerson.person_id == person_id,
-    ).first()
+    ))
     if existing:
         raise HTTPException(status_code=400, detail="Person already added to this trip")
 
     tp = TripPerson(id=uuid.uuid4(), trip_id=trip_id, person_id=person_id)
     db.add(tp)
-    db.commit()
+    await db.commit()
     return {"message": "Person added to trip"}
 
 
@@ -1258,31 +1313,20 @@ async def add_person_to_trip(
 async def add_memory_to_trip(
     trip_id: str,
     memory_id: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Trip, "trip_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Associate a memory with a trip."""
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
-    if not trip:
-        raise HTTPException(status_code=404, detail="Trip not found")
-
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == trip.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
-
-    existing = db.query(TripMemory).filter(
+    existing = await db.scalar(select(TripMemory).where(
         TripMemory.trip_id == trip_id,
         TripMemory.memory_id == memory_id,
-    ).first()
+    ))
     if existing:
         raise HTTPException(status_code=400, detail="Memory already on this trip")
 
     tm = TripMemory(id=uuid.uuid4(), trip_id=trip_id, memory_id=memory_id)
     db.add(tm)
-    db.commit()
+    await db.commit()
     return {"message": "Memory added to trip"}
 
 
@@ -1295,8 +1339,8 @@ async def assistant_chat(
     message: str = Form(...),
     family_id: str = Form(...),
     conversation_id: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Conversational memory assistant endpoint.
 
@@ -1309,21 +1353,19 @@ async def assistant_chat(
       - data: {"type": "done"} — end of stream
     """
     # Verify membership
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
     # Check if user has an API key for LLM calls
-    api_key_record = db.query(ApiKey).filter(ApiKey.user_id == current_user.id).first()
+    api_key_record = await db.scalar(select(ApiKey).where(ApiKey.user_id == current_user.id))
 
-    agent_result = build_agent_response(
+    # Tools embed queries and run sync searches: keep them off the event loop
+    agent_result = await run_in_sync_session(
+        build_agent_response,
         user_message=message,
         user_id=str(current_user.id),
         family_id=family_id,
-        db=db,
     )
 
     async def event_stream():
@@ -1378,38 +1420,86 @@ from backend.database.models import (
 )
 
 
-def serialize_post(post: Post, db: Session, current_user_id: str) -> dict:
+async def _bump_post_counter(db: AsyncSession, post_id, column, delta: int) -> int:
+    """Atomically add `delta` to a post counter in the current transaction; returns the new value.
+
+    A single UPDATE ... SET n = n + delta (no read-modify-write), so concurrent
+    likes/comments never lose updates. Drift is repaired by reconcile_post_counters.
+    """
+    return await db.scalar(
+        update(Post).where(Post.id == post_id).values({column: column + delta}).returning(column)
+    )
+
+
+async def serialize_post(post: Post, db: AsyncSession, current_user_id: str) -> dict:
     """Serialize a post with photos, likes, comments, and user info."""
-    photos = db.query(PostPhoto).filter(PostPhoto.post_id == post.id).order_by(PostPhoto.display_order).all()
-    likes = db.query(PostLike).filter(PostLike.post_id == post.id).count()
-    comments_q = db.query(PostComment).filter(PostComment.post_id == post.id).order_by(PostComment.created_at.desc()).limit(2).all()
-    total_comments = db.query(PostComment).filter(PostComment.post_id == post.id).count()
-    user_liked = db.query(PostLike).filter(PostLike.post_id == post.id, PostLike.user_id == current_user_id).first() is not None
-    user = db.query(User).filter(User.id == post.user_id).first()
-    tagged_people = db.query(Person).filter(Person.id.in_(
-        db.query(PostPhoto.photo_url).filter(PostPhoto.post_id == post.id)  # placeholder — tag via caption parse
-    )).all() if False else []
+    return (await serialize_posts([post], db, current_user_id))[0]
 
-    return {
-        "id": str(post.id),
-        "user_id": str(post.user_id),
-        "family_id": str(post.family_id),
-        "caption": post.caption,
-        "location": post.location,
-        "created_at": post.created_at.isoformat() if post.created_at else None,
-        "photos": [{"id": str(p.id), "photo_url": p.photo_url, "caption": p.caption, "display_order": p.display_order} for p in photos],
-        "user": {"id": str(user.id), "name": user.name, "avatar_url": user.avatar_url} if user else None,
-        "likes_count": likes,
-        "comments_count": total_comments,
-        "user_has_liked": user_liked,
-        "recent_comments": [{
-            "id": str(c.id),
-            "user_id": str(c.user_id),
-            "user_name": db.query(User).filter(User.id == c.user_id).first().name if db.query(User).filter(User.id == c.user_id).first() else "Unknown",
-            "text": c.text,
-            "created_at": c.created_at.isoformat() if c.created_at else None,
-        } for c in reversed(comments_q)],
-    }
+
+async def serialize_posts(posts: List[Post], db: AsyncSession, current_user_id: str) -> List[dict]:
+    """Serialize a page of posts in a fixed number of queries.
+
+    Like/comment counts are the denormalized Post columns. Photos, the viewer's
+    likes, the last two comments per post (ROW_NUMBER window) and every author
+    involved are each fetched with one batched query: 4 queries for any page
+    size. O(n + rows).
+    """
+    if not posts:
+        return []
+
+    post_ids = [p.id for p in posts]
+
+    photos_by_post = {}
+    for photo in await db.scalars(
+        select(PostPhoto).where(PostPhoto.post_id.in_(post_ids)).order_by(PostPhoto.display_order)
+    ):
+        photos_by_post.setdefault(photo.post_id, []).append(photo)
+
+    liked = set(await db.scalars(
+        select(PostLike.post_id).where(PostLike.post_id.in_(post_ids), PostLike.user_id == current_user_id)
+    ))
+
+    ranked = select(
+        PostComment.id.label("id"),
+        func.row_number().over(
+            partition_by=PostComment.post_id, order_by=PostComment.created_at.desc(),
+        ).label("rn"),
+    ).where(PostComment.post_id.in_(post_ids)).subquery()
+    recent = (await db.scalars(
+        select(PostComment).join(ranked, ranked.c.id == PostComment.id)
+        .where(ranked.c.rn <= 2).order_by(PostComment.created_at)
+    )).all()
+    comments_by_post = {}
+    for comment in recent:
+        comments_by_post.setdefault(comment.post_id, []).append(comment)
+
+    user_ids = {p.user_id for p in posts} | {c.user_id for c in recent}
+    users = {u.id: u for u in await db.scalars(select(User).where(User.id.in_(user_ids)))}
+
+    results = []
+    for post in posts:
+        user = users.get(post.user_id)
+        results.append({
+            "id": str(post.id),
+            "user_id": str(post.user_id),
+            "family_id": str(post.family_id),
+            "caption": post.caption,
+            "location": post.location,
+            "created_at": post.created_at.isoformat() if post.created_at else None,
+            "photos": [{"id": str(p.id), "photo_url": p.photo_url, "caption": p.caption, "display_order": p.display_order} for p in photos_by_post.get(post.id, [])],
+            "user": {"id": str(user.id), "name": user.name, "avatar_url": user.avatar_url} if user else None,
+            "likes_count": post.likes_count or 0,
+            "comments_count": post.comments_count or 0,
+            "user_has_liked": post.id in liked,
+            "recent_comments": [{
+                "id": str(c.id),
+                "user_id": str(c.user_id),
+                "user_name": users[c.user_id].name if c.user_id in users else "Unknown",
+                "text": c.text,
+                "created_at": c.created_at.isoformat() if c.created_at else None,
+            } for c in comments_by_post.get(post.id, [])],
+        })
+    return results
 
 
 @app.post("/posts")
@@ -1418,14 +1508,11 @@ async def create_post(
     caption: Optional[str] = Form(None),
     location: Optional[str] = Form(None),
     photos: List[UploadFile] = File(default=[]),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a new post with optional photos."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
@@ -1437,11 +1524,11 @@ async def create_post(
         location=location,
     )
     db.add(post)
-    db.flush()
+    await db.flush()
 
     for i, photo in enumerate(photos):
         if photo.filename:
-            photo_url = save_upload(photo)
+            photo_url = await save_upload(photo, db)
             pp = PostPhoto(
                 id=uuid.uuid4(),
                 post_id=post.id,
@@ -1450,9 +1537,9 @@ async def create_post(
             )
             db.add(pp)
 
-    db.commit()
-    db.refresh(post)
-    return serialize_post(post, db, str(current_user.id))
+    await db.commit()
+    await db.refresh(post)
+    return await serialize_post(post, db, str(current_user.id))
 
 
 @app.get("/feed")
@@ -1460,61 +1547,45 @@ async def get_feed(
     family_id: str = Query(...),
     cursor: Optional[str] = Query(None),
     limit: int = Query(10, le=50),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Cursor-based paginated feed."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    """Keyset-paginated feed over (created_at, id); posts sharing a timestamp are never skipped."""
+    current_user, member = access
 
-    query = db.query(Post).filter(Post.family_id == family_id)
-    if cursor:
-        try:
-            cursor_dt = datetime.fromisoformat(cursor)
-            query = query.filter(Post.created_at < cursor_dt)
-        except ValueError:
-            pass
-
-    posts = query.order_by(Post.created_at.desc()).limit(limit + 1).all()
-    has_more = len(posts) > limit
-    if has_more:
-        posts = posts[:limit]
+    posts, next_cursor = await keyset_page(db, select(Post).where(Post.family_id == family_id), Post, cursor, limit)
 
     return {
-        "posts": [serialize_post(p, db, str(current_user.id)) for p in posts],
-        "next_cursor": posts[-1].created_at.isoformat() if has_more and posts else None,
-        "has_more": has_more,
+        "posts": await serialize_posts(posts, db, str(current_user.id)),
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
     }
 
 
 @app.post("/posts/{post_id}/like")
 async def toggle_like(
     post_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Post, "post_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Like or unlike a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    post, current_user = access.resource, access.user
 
-    existing = db.query(PostLike).filter(
+    existing = await db.scalar(select(PostLike).where(
         PostLike.post_id == post_id,
         PostLike.user_id == current_user.id,
-    ).first()
+    ))
 
     if existing:
-        db.delete(existing)
-        db.commit()
-        return {"liked": False, "likes_count": db.query(PostLike).filter(PostLike.post_id == post_id).count()}
+        await db.delete(existing)
+        likes_count = await _bump_post_counter(db, post.id, Post.likes_count, -1)
+        await db.commit()
+        return {"liked": False, "likes_count": likes_count}
     else:
         like = PostLike(id=uuid.uuid4(), post_id=post_id, user_id=current_user.id)
         db.add(like)
-        db.commit()
+        likes_count = await _bump_post_counter(db, post.id, Post.likes_count, 1)
+        await db.commit()
         # Create notification
         if str(post.user_id) != str(current_user.id):
             notif = Notification(
@@ -1526,21 +1597,19 @@ async def toggle_like(
                 from_user_id=current_user.id,
             )
             db.add(notif)
-            db.commit()
-        return {"liked": True, "likes_count": db.query(PostLike).filter(PostLike.post_id == post_id).count()}
+            await db.commit()
+        return {"liked": True, "likes_count": likes_count}
 
 
 @app.post("/posts/{post_id}/comment")
 async def add_comment(
     post_id: str,
     text: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Post, "post_id")),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Add a comment to a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    post, current_user = access.resource, access.user
 
     comment = PostComment(
         id=uuid.uuid4(),
@@ -1549,8 +1618,9 @@ async def add_comment(
         text=text,
     )
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await _bump_post_counter(db, post.id, Post.comments_count, 1)
+    await db.commit()
+    await db.refresh(comment)
 
     # Create notification
     if str(post.user_id) != str(current_user.id):
@@ -1563,13 +1633,12 @@ async def add_comment(
             from_user_id=current_user.id,
         )
         db.add(notif)
-        db.commit()
+        await db.commit()
 
-    user = db.query(User).filter(User.id == current_user.id).first()
     return {
         "id": str(comment.id),
         "user_id": str(current_user.id),
-        "user_name": user.name if user else "Unknown",
+        "user_name": current_user.name,
         "text": comment.text,
         "created_at": comment.created_at.isoformat() if comment.created_at else None,
     }
@@ -1578,18 +1647,22 @@ async def add_comment(
 @app.get("/posts/{post_id}/comments")
 async def get_comments(
     post_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=200),
+    access: ResourceAccess = Depends(require_membership(Post, "post_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Get all comments for a post."""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    comments = db.query(PostComment).filter(PostComment.post_id == post_id).order_by(PostComment.created_at.asc()).all()
+    """Get comments for a post, oldest first. Keyset-paginated; the next cursor is in X-Next-Cursor."""
+    comments, next_cursor = await keyset_page(
+        db, select(PostComment).where(PostComment.post_id == post_id), PostComment, cursor, limit, descending=False,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    users = {u.id: u for u in await db.scalars(select(User).where(User.id.in_({c.user_id for c in comments})))} if comments else {}
     result = []
     for c in comments:
-        user = db.query(User).filter(User.id == c.user_id).first()
+        user = users.get(c.user_id)
         result.append({
             "id": str(c.id),
             "user_id": str(c.user_id),
@@ -1610,18 +1683,15 @@ async def create_story(
     family_id: str = Form(...),
     caption: Optional[str] = Form(None),
     media: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a 24hr story."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
-    media_url = save_upload(media)
+    media_url = await save_upload(media, db)
     ext = media.filename.rsplit(".", 1)[-1].lower() if media.filename else ""
     media_type = "video" if ext in ("mp4", "mov", "avi", "webm") else "image"
 
@@ -1635,8 +1705,8 @@ async def create_story(
         expires_at=datetime.utcnow() + timedelta(hours=24),
     )
     db.add(story)
-    db.commit()
-    db.refresh(story)
+    await db.commit()
+    await db.refresh(story)
 
     return {
         "id": str(story.id),
@@ -1650,40 +1720,44 @@ async def create_story(
 @app.get("/stories")
 async def get_active_stories(
     family_id: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get active (non-expired) stories for a family."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
 
     now = datetime.utcnow()
-    stories = db.query(Story).filter(
+    stories = (await db.scalars(select(Story).where(
         Story.family_id == family_id,
         Story.expires_at > now,
-    ).order_by(Story.created_at.desc()).all()
+    ).order_by(Story.created_at.desc()))).all()
+
+    if not stories:
+        return []
+    story_ids = [s.id for s in stories]
+    users = {u.id: u for u in await db.scalars(select(User).where(User.id.in_({s.user_id for s in stories})))}
+    view_counts = dict((await db.execute(
+        select(StoryView.story_id, func.count()).where(StoryView.story_id.in_(story_ids)).group_by(StoryView.story_id)
+    )).all())
+    viewed = set(await db.scalars(select(StoryView.story_id).where(
+        StoryView.story_id.in_(story_ids),
+        StoryView.viewer_id == current_user.id,
+    )))
 
     # Group by user
     users_map = {}
     for story in stories:
         uid = str(story.user_id)
         if uid not in users_map:
-            user = db.query(User).filter(User.id == story.user_id).first()
+            user = users.get(story.user_id)
             users_map[uid] = {
                 "user_id": uid,
                 "user_name": user.name if user else "Unknown",
-                "avatar_url": user.avatar_url,
+                "avatar_url": user.avatar_url if user else None,
                 "stories": [],
             }
-        has_viewed = db.query(StoryView).filter(
-            StoryView.story_id == story.id,
-            StoryView.viewer_id == current_user.id,
-        ).first() is not None
-        view_count = db.query(StoryView).filter(StoryView.story_id == story.id).count()
+        has_viewed = story.id in viewed
+        view_count = view_counts.get(story.id, 0)
         users_map[uid]["stories"].append({
             "id": str(story.id),
             "media_url": story.media_url,
@@ -1701,18 +1775,19 @@ async def get_active_stories(
 @app.post("/stories/{story_id}/view")
 async def view_story(
     story_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(Story, "story_id", load=False)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Mark a story as viewed."""
-    existing = db.query(StoryView).filter(
+    current_user = access.user
+    existing = await db.scalar(select(StoryView).where(
         StoryView.story_id == story_id,
         StoryView.viewer_id == current_user.id,
-    ).first()
+    ))
     if not existing:
         view = StoryView(id=uuid.uuid4(), story_id=story_id, viewer_id=current_user.id)
         db.add(view)
-        db.commit()
+        await db.commit()
     return {"viewed": True}
 
 
@@ -1726,18 +1801,15 @@ async def vault_upload(
     name: str = Form(...),
     folder: str = Form("All"),
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Upload a file to the family vault."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
+    member = await get_membership(db, current_user, family_id)
     if not member:
         raise HTTPException(status_code=403, detail="Not a family member")
 
-    file_url = save_upload(file)
+    stored = await stream_upload(file, db)
     ext = file.filename.rsplit(".", 1)[-1].lower() if file.filename else ""
     img_types = {"jpg", "jpeg", "png", "gif", "webp"}
     doc_types = {"pdf", "doc", "docx", "txt"}
@@ -1755,20 +1827,21 @@ async def vault_upload(
         id=uuid.uuid4(),
         family_id=family_id,
         name=name,
-        file_url=file_url,
+        file_url=stored.url,
         file_type=file_type,
-        file_size=0,
+        file_size=stored.size,
         folder=folder,
         uploaded_by=current_user.id,
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return {
         "id": str(item.id),
         "name": item.name,
         "file_url": item.file_url,
         "file_type": item.file_type,
+        "file_size": item.file_size,
         "folder": item.folder,
     }
 
@@ -1778,30 +1851,28 @@ async def get_vault(
     family_id: str = Query(...),
     folder: Optional[str] = Query(None),
     file_type: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=200),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """List vault items, optionally filtered by folder or type."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    """List vault items, optionally filtered by folder or type (keyset-paginated via next_cursor)."""
+    current_user, member = access
 
-    query = db.query(VaultItem).filter(VaultItem.family_id == family_id)
+    query = select(VaultItem).where(VaultItem.family_id == family_id)
     if folder and folder != "All":
-        query = query.filter(VaultItem.folder == folder)
+        query = query.where(VaultItem.folder == folder)
     if file_type:
-        query = query.filter(VaultItem.file_type == file_type)
+        query = query.where(VaultItem.file_type == file_type)
 
-    items = query.order_by(VaultItem.created_at.desc()).all()
-    folders = db.query(VaultItem.folder).filter(VaultItem.family_id == family_id).distinct().all()
-    folder_list = ["All"] + [f[0] for f in folders if f[0] != "All"]
+    items, next_cursor = await keyset_page(db, query, VaultItem, cursor, limit)
+    folders = (await db.scalars(select(VaultItem.folder).where(VaultItem.family_id == family_id).distinct())).all()
+    folder_list = ["All"] + [f for f in folders if f != "All"]
+    uploaders = {u.id: u for u in await db.scalars(select(User).where(User.id.in_({i.uploaded_by for i in items})))} if items else {}
 
     result = []
     for item in items:
-        uploader = db.query(User).filter(User.id == item.uploaded_by).first()
+        uploader = uploaders.get(item.uploaded_by)
         result.append({
             "id": str(item.id),
             "name": item.name,
@@ -1814,29 +1885,20 @@ async def get_vault(
             "is_admin": member.role == MemberRole.admin,
         })
 
-    return {"items": result, "folders": folder_list}
+    return {"items": result, "folders": folder_list, "next_cursor": next_cursor}
 
 
 @app.delete("/vault/{item_id}")
 async def delete_vault_item(
     item_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: ResourceAccess = Depends(require_membership(VaultItem, "item_id", admin=True, not_found="Item not found")),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Delete a vault item (admin only)."""
-    item = db.query(VaultItem).filter(VaultItem.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == item.family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member or member.role != MemberRole.admin:
-        raise HTTPException(status_code=403, detail="Admin access required")
-
-    db.delete(item)
-    db.commit()
+    await release_uploads(db, [access.resource.file_url])
+    await db.delete(access.resource)
+    await db.commit()
+    forget_resource(VaultItem.__tablename__, item_id)
     return {"message": "Item deleted"}
 
 
@@ -1846,17 +1908,24 @@ async def delete_vault_item(
 
 @app.get("/notifications")
 async def get_notifications(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Get all notifications for the current user."""
-    notifs = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-    ).order_by(Notification.created_at.desc()).limit(50).all()
+    """Get notifications for the current user, newest first. Next cursor in X-Next-Cursor."""
+    notifs, next_cursor = await keyset_page(
+        db, select(Notification).where(Notification.user_id == current_user.id), Notification, cursor, limit,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    sender_ids = {n.from_user_id for n in notifs if n.from_user_id}
+    senders = {u.id: u for u in await db.scalars(select(User).where(User.id.in_(sender_ids)))} if sender_ids else {}
 
     result = []
     for n in notifs:
-        from_user = db.query(User).filter(User.id == n.from_user_id).first() if n.from_user_id else None
+        from_user = senders.get(n.from_user_id) if n.from_user_id else None
         result.append({
             "id": str(n.id),
             "type": n.type,
@@ -1875,28 +1944,29 @@ async def get_notifications(
 
 @app.post("/notifications/read-all")
 async def mark_all_read(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Mark all notifications as read."""
-    db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.read == 0,
-    ).update({"read": 1})
-    db.commit()
+    await db.execute(
+        update(Notification)
+        .where(Notification.user_id == current_user.id, Notification.read == 0)
+        .values(read=1)
+    )
+    await db.commit()
     return {"message": "All notifications marked as read"}
 
 
 @app.get("/notifications/unread-count")
 async def unread_count(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get unread notification count."""
-    count = db.query(Notification).filter(
+    count = await db.scalar(select(func.count()).select_from(Notification).where(
         Notification.user_id == current_user.id,
         Notification.read == 0,
-    ).count()
+    ))
     return {"count": count}
 
 
@@ -1907,23 +1977,18 @@ async def unread_count(
 @app.get("/birthdays")
 async def get_upcoming_birthdays(
     family_id: str = Query(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    access: FamilyAccess = Depends(get_family_access),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get upcoming birthdays in the next 30 days."""
-    member = db.query(FamilyMember).filter(
-        FamilyMember.family_id == family_id,
-        FamilyMember.user_id == current_user.id,
-    ).first()
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a family member")
+    current_user, member = access
 
     from sqlalchemy import func, extract
     today = date.today()
-    people = db.query(Person).filter(
+    people = (await db.scalars(select(Person).where(
         Person.family_id == family_id,
         Person.dob.isnot(None),
-    ).all()
+    ))).all()
 
     birthdays = []
     for p in people:
@@ -1958,8 +2023,10 @@ async def get_upcoming_birthdays(
 # ─── File Upload Route ────────────────────────────────────────────────────────
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
-    url = save_upload(file)
+async def upload_file(file: UploadFile = File(...), current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # The caller stores the URL elsewhere, so this reference is never released
+    url = await save_upload(file, db)
+    await db.commit()
     return {"url": url}
 
 
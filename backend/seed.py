@@ -14,13 +14,12 @@ from backend.database.models import (
     MemberRole, RelationshipTag
 )
 from backend.database.config import engine, SessionLocal, init_db
-from passlib.context import CryptContext
+from backend.utils.passwords import hash_password
 
 # Set UTF-8 for Windows console
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding="utf-8", errors="replace")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def seed():
@@ -51,7 +50,7 @@ def seed():
                 id=uuid.uuid4(),
                 name=ud["name"],
                 email=ud["email"],
-                password_hash=pwd_context.hash(ud["password"][:72]),
+                password_hash=hash_password(ud["password"]),
             )
             db.add(user)
             users.append(user)
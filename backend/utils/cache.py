@@ -0,0 +1,144 @@
+"""
+Shared caching primitives: a bounded in-process LRU and a lazily-connected
+Redis client that backs off after connection failures.
+
+Redis is opt-in: the client is only created when REDIS_URL is set, and every
+caller must treat None (no Redis / Redis down) as a cache miss.
+
+Complexity: O(1) get/set for both tiers.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+# After a Redis error, skip the Redis tier for this many seconds
+REDIS_RETRY_SECONDS = 30.0
+
+
+class LRUCache:
+    """Thread-safe bounded LRU map. O(1) get/set."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_redis_client = None
+_redis_retry_at = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """Return a shared Redis client, or None if unconfigured or recently failing."""
+    global _redis_client
+    if not REDIS_URL or time.monotonic() < _redis_retry_at:
+        return None
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                try:
+                    import redis as redis_lib
+                    _redis_client = redis_lib.from_url(
+                        REDIS_URL,
+                        socket_timeout=REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                    )
+                except Exception as e:
+                    logger.warning(f"Redis unavailable for caching: {e}")
+                    mark_redis_failed()
+    return _redis_client
+
+
+def mark_redis_failed():
+    """Disable the Redis tier for REDIS_RETRY_SECONDS after an error."""
+    global _redis_client, _redis_retry_at
+    _redis_client = None
+    _redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+def redis_get(key: str) -> Optional[bytes]:
+    """GET from Redis, treating any failure as a miss."""
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        return r.get(key)
+    except Exception as e:
+        logger.warning(f"Redis GET failed, disabling Redis cache briefly: {e}")
+        mark_redis_failed()
+        return None
+
+
+def redis_mget(keys: list) -> list:
+    """MGET from Redis; returns a list of None on any failure."""
+    r = get_redis()
+    if r is None or not keys:
+        return [None] * len(keys)
+    try:
+        return r.mget(keys)
+    except Exception as e:
+        logger.warning(f"Redis MGET failed, disabling Redis cache briefly: {e}")
+        mark_redis_failed()
+        return [None] * len(keys)
+
+
+def redis_set(key: str, value: bytes, ttl: int):
+    """SETEX into Redis, ignoring failures."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.setex(key, ttl, value)
+    except Exception as e:
+        logger.warning(f"Redis SET failed, disabling Redis cache briefly: {e}")
+        mark_redis_failed()
+
+
+def redis_incr(key: str) -> Optional[int]:
+    """INCR in Redis; returns None on any failure."""
+    r = get_redis()
+    if r is None:
+        return None
+    try:
+        return r.incr(key)
+    except Exception as e:
+        logger.warning(f"Redis INCR failed, disabling Redis cache briefly: {e}")
+        mark_redis_failed()
+        return None
@@ -0,0 +1,166 @@
+"""
+Bounded executors for blocking work called from async handlers.
+
+Two lanes, sized independently:
+  - io:  threads for blocking file/socket/sync-DB calls (uploads, Redis,
+         sync search sessions, the agent's tools)
+  - cpu: CPU-heavy calls (embedding encodes, graph algorithms).
+         Threads by default, because torch and numpy release the GIL;
+         CPU_EXECUTOR_MODE=process moves the lane to a process pool (spawned
+         workers, so callables and arguments must be picklable module-level
+         functions).
+
+Password hashing has its own process pool (backend.utils.passwords).
+
+Each lane admits at most `workers + queue_depth` calls at once. Past that,
+run() raises ExecutorSaturated instead of queueing without bound; the API
+turns it into 503 Service Unavailable with a Retry-After header, so a burst
+sheds load at the door rather than piling up latency for every request.
+
+The in-flight count is released when the worker finishes (not when the
+awaiting coroutine gives up), so a timed-out call still holds its slot until
+its thread is actually free.
+
+Complexity: O(1) admission per call.
+"""
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "32"))
+IO_EXECUTOR_QUEUE = int(os.getenv("IO_EXECUTOR_QUEUE", "256"))
+CPU_EXECUTOR_MODE = os.getenv("CPU_EXECUTOR_MODE", "thread").lower()  # thread | process
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(os.cpu_count() or 2)))
+CPU_EXECUTOR_QUEUE = int(os.getenv("CPU_EXECUTOR_QUEUE", "64"))
+# Seconds a client is told to wait before retrying a 503
+EXECUTOR_RETRY_AFTER = int(os.getenv("EXECUTOR_RETRY_AFTER", "2"))
+
+if CPU_EXECUTOR_MODE not in ("thread", "process"):
+    logger.warning(f"Unknown CPU_EXECUTOR_MODE={CPU_EXECUTOR_MODE!r}, using thread")
+    CPU_EXECUTOR_MODE = "thread"
+
+
+class ExecutorSaturated(RuntimeError):
+    """A lane is at its in-flight limit; the caller should retry later."""
+
+    def __init__(self, lane: str, retry_after: int = EXECUTOR_RETRY_AFTER):
+        super().__init__(f"{lane} executor saturated")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """An Executor behind an admission limit of workers + queue_depth calls."""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int, queue_depth: int):
+        self.name = name
+        self.workers = workers
+        self.limit = workers + queue_depth
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._factory()
+        return self._executor
+
+    def _admit(self, force: bool):
+        with self._lock:
+            if not force and self.in_flight >= self.limit:
+                self.rejected += 1
+                raise ExecutorSaturated(self.name)
+            self.in_flight += 1
+            self.submitted += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def _submit(self, force: bool, fn, args, kwargs):
+        self._admit(force)
+        try:
+            future = self._get_executor().submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the lane. Raises ExecutorSaturated when full."""
+        return await self._submit(False, fn, args, kwargs)
+
+    async def run_required(self, fn, *args, **kwargs):
+        """run() without the admission check, for work that must not be
+        refused (e.g. bookkeeping after a request has already committed)."""
+        return await self._submit(True, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "peak": self.peak,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _cpu_factory() -> Executor:
+    if CPU_EXECUTOR_MODE == "process":
+        # spawn: forking a process that has started torch/OpenMP threads can deadlock
+        return ProcessPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+
+
+io_executor = BoundedExecutor(
+    "io",
+    lambda: ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS, thread_name_prefix="io"),
+    IO_EXECUTOR_WORKERS, IO_EXECUTOR_QUEUE,
+)
+cpu_executor = BoundedExecutor("cpu", _cpu_factory, CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_QUEUE)
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O call on the io lane."""
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-bound call on the cpu lane."""
+    return await cpu_executor.run(fn, *args, **kwargs)
+
+
+def executor_stats() -> dict:
+    """Per-lane admission counters, for the admin endpoint."""
+    return {"io": io_executor.stats(), "cpu": {"mode": CPU_EXECUTOR_MODE, **cpu_executor.stats()}}
+
+
+def shutdown_executors(wait: bool = True):
+    io_executor.shutdown(wait=wait)
+    cpu_executor.shutdown(wait=wait)
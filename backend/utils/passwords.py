@@ -0,0 +1,132 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~250 ms at cost 12), so signup/login hash and
+verify on a dedicated process pool with its own admission cap, separate from
+the shared cpu lane: a login burst queues behind at most
+PASSWORD_HASH_WORKERS cores and, past PASSWORD_HASH_QUEUE waiting calls,
+sheds with 503 (ExecutorSaturated) instead of stalling every other request.
+
+BCRYPT_ROUNDS sets the cost of new hashes. Stored hashes at any other cost
+are flagged on a successful login and rehashed there, so raising (or
+lowering) the cost migrates users as they sign in.
+
+Usage (benchmark):
+  python -m backend.utils.passwords --workers 1,2,4 --rounds 10,12
+
+Complexity: O(2^rounds) per hash or verify.
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+from backend.utils.executors import BoundedExecutor
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+
+
+def _make_context(rounds: int) -> CryptContext:
+    # min == max == rounds: any other cost needs_update, in either direction
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = _make_context(BCRYPT_ROUNDS)
+
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:72]  # bcrypt ignores bytes past 72
+
+
+def hash_password(password: str) -> str:
+    """bcrypt hash at BCRYPT_ROUNDS. Blocking."""
+    return pwd_context.hash(_secret(password))
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    """Blocking verify."""
+    return pwd_context.verify(_secret(plain), hashed)
+
+
+def verify_and_update(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Verify; on success also return a fresh hash if `hashed` uses another cost."""
+    return pwd_context.verify_and_update(_secret(plain), hashed)
+
+
+# Spawned workers only import this module (passlib + dotenv), never the app
+password_executor = BoundedExecutor(
+    "password",
+    lambda: ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")),
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password pool. Raises ExecutorSaturated when full."""
+    return await password_executor.run(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update on the password pool: (valid, new_hash or None)."""
+    return await password_executor.run(verify_and_update, plain, hashed)
+
+
+# ─── Benchmark ───────────────────────────────────────────────────────────────
+
+def _bench_verify(rounds: int, hashed: str, n: int) -> int:
+    context = _make_context(rounds)
+    for _ in range(n):
+        context.verify(b"benchmark-password", hashed)
+    return n
+
+
+def benchmark(workers: int, rounds: int, seconds: float = 3.0) -> dict:
+    """Login (verify) throughput of a `workers`-process pool at cost `rounds`."""
+    hashed = _make_context(rounds).hash(b"benchmark-password")
+    per_call = max(1, int(0.2 / (0.25 * 2 ** (rounds - 12))))  # ~0.2 s per task
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(_bench_verify, [rounds] * workers, [hashed] * workers, [1] * workers))  # spawn + import
+        done = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            done += sum(pool.map(_bench_verify, [rounds] * workers, [hashed] * workers, [per_call] * workers))
+        elapsed = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "rounds": rounds,
+        "logins_per_sec": done / elapsed,
+        "per_worker": done / elapsed / workers,
+        "ms_per_login": 1000 * elapsed * workers / done,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt login throughput per pool size and cost.")
+    parser.add_argument("--workers", default=f"1,{PASSWORD_HASH_WORKERS}", help="comma-separated pool sizes")
+    parser.add_argument("--rounds", default=str(BCRYPT_ROUNDS), help="comma-separated bcrypt costs")
+    parser.add_argument("--seconds", type=float, default=3.0, help="measurement time per combination")
+    args = parser.parse_args(argv)
+
+    print(f"{'workers':>7} {'rounds':>6} {'logins/s':>10} {'per worker':>10} {'ms/login':>9}")
+    for rounds in sorted({int(r) for r in args.rounds.split(",")}):
+        for workers in sorted({int(w) for w in args.workers.split(",")}):
+            r = benchmark(workers, rounds, args.seconds)
+            print(f"{r['workers']:>7} {r['rounds']:>6} {r['logins_per_sec']:>10.1f} "
+                  f"{r['per_worker']:>10.1f} {r['ms_per_login']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Short-TTL cache of authenticated principals.
+
+A principal is the authenticated user's profile columns plus every family
+membership (id, role) they hold, loaded in two indexed queries and reused by
+the same process for PRINCIPAL_CACHE_TTL seconds. With it, get_current_user
+and the per-route "is this user in family X, and as what" check stop costing
+a SELECT each on nearly every request.
+
+Only positive answers are trusted from the cache: get_membership() reloads
+the principal before reporting "not a member", so a join made through
+another worker is seen at once. Membership changes for a user (join, family
+create, leave, role change) must call invalidate_user() for that user.
+Invalidation is per process: other workers pick a removal or role change up
+when their entry expires, so the TTL bounds how long a removed member keeps
+access elsewhere. PRINCIPAL_CACHE_TTL=0 disables caching.
+
+Resource ids (people, trips, posts, ...) never change family, so the family
+a resource belongs to is also remembered for RESOURCE_FAMILY_CACHE_TTL
+seconds; routes that only need to authorize against a resource then skip the
+database entirely. Deleting a resource should call forget_resource().
+
+Complexity: O(1) lookup; O(m) load for a user with m memberships.
+"""
+import os
+import time
+import uuid
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+from dotenv import load_dotenv
+
+from backend.database.models import User, FamilyMember, MemberRole
+from backend.utils.cache import LRUCache
+
+load_dotenv()
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+RESOURCE_FAMILY_CACHE_TTL = float(os.getenv("RESOURCE_FAMILY_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class Membership:
+    """A detached, read-only FamilyMember row."""
+    id: uuid.UUID
+    user_id: uuid.UUID
+    family_id: uuid.UUID
+    role: MemberRole
+    joined_at: Optional[datetime] = None
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Read-only stand-in for the User row: id, email, name, avatar_url, plus
+    memberships keyed by str(family_id)."""
+    id: uuid.UUID
+    email: str
+    name: str
+    avatar_url: Optional[str]
+    memberships: Dict[str, Membership] = field(default_factory=dict)
+
+    @staticmethod
+    def membership_key(family_id) -> Optional[str]:
+        """Canonical key for a UUID or any UUID string form; None if not a UUID."""
+        if family_id is None:
+            return None
+        try:
+            return str(family_id if isinstance(family_id, uuid.UUID) else uuid.UUID(str(family_id)))
+        except ValueError:
+            return None
+
+    def membership(self, family_id) -> Optional[Membership]:
+        """The cached membership in `family_id`, or None. Prefer get_membership()."""
+        key = self.membership_key(family_id)
+        return self.memberships.get(key) if key else None
+
+
+class FamilyAccess(NamedTuple):
+    """What get_family_access yields: the caller and their membership."""
+    user: Principal
+    member: Membership
+
+
+class ResourceAccess(NamedTuple):
+    """What require_membership() yields: the resource (None when not loaded),
+    its family id, the caller and their membership."""
+    resource: Any
+    family_id: uuid.UUID
+    user: Principal
+    member: Membership
+
+
+_cache = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE)  # str(user_id) -> (expires_at, Principal)
+_epoch = 0  # bumped by every invalidation; loads that raced one are not cached
+_epoch_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_resource_families = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE * 4)  # (table, id) -> (expires_at, family_id)
+
+
+async def load_principal(db, user_id) -> Optional[Principal]:
+    """Read the user and their memberships from the database (no cache)."""
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if user is None:
+        return None
+    members = (await db.scalars(select(FamilyMember).where(FamilyMember.user_id == user.id))).all()
+    return Principal(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        avatar_url=user.avatar_url,
+        memberships={
+            str(m.family_id): Membership(m.id, m.user_id, m.family_id, m.role, m.joined_at)
+            for m in members
+        },
+    )
+
+
+async def get_principal(db, user_id) -> Optional[Principal]:
+    """Cached principal for `user_id`; None if the user does not exist."""
+    global _hits, _misses
+    key = str(user_id)
+    if PRINCIPAL_CACHE_TTL > 0:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            _hits += 1
+            return entry[1]
+    _misses += 1
+
+    epoch = _epoch
+    principal = await load_principal(db, user_id)
+    if principal is not None and PRINCIPAL_CACHE_TTL > 0 and epoch == _epoch:
+        _cache.set(key, (time.monotonic() + PRINCIPAL_CACHE_TTL, principal))
+    return principal
+
+
+async def get_membership(db, principal: Principal, family_id) -> Optional[Membership]:
+    """The principal's membership in `family_id`, or None if not a member.
+
+    A miss is re-checked against the database (and the cache refreshed), so
+    a denial always reflects the current rows.
+    """
+    member = principal.membership(family_id)
+    if member is not None or principal.membership_key(family_id) is None:
+        return member
+    invalidate_user(principal.id)
+    fresh = await get_principal(db, principal.id)
+    return fresh.membership(family_id) if fresh is not None else None
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached principal after their profile or memberships change."""
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+    _cache.pop(str(user_id))
+
+
+def resource_family(table: str, resource_id) -> Optional[uuid.UUID]:
+    """Remembered family of a resource, or None."""
+    entry = _resource_families.get((table, str(resource_id)))
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def remember_resource_family(table: str, resource_id, family_id):
+    if RESOURCE_FAMILY_CACHE_TTL > 0:
+        _resource_families.set((table, str(resource_id)), (time.monotonic() + RESOURCE_FAMILY_CACHE_TTL, family_id))
+
+
+def forget_resource(table: str, resource_id):
+    _resource_families.pop((table, str(resource_id)))
+
+
+def clear():
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+    _cache.clear()
+    _resource_families.clear()
+
+
+def stats() -> dict:
+    return {"hits": _hits, "misses": _misses, "size": len(_cache), "ttl": PRINCIPAL_CACHE_TTL}
@@ -0,0 +1,261 @@
+"""
+Streaming, content-addressed upload storage.
+
+Uploads are copied to a temp file in UPLOAD_CHUNK_SIZE chunks with aiofiles
+while a SHA-256 is computed over the same chunks, so no file is ever held in
+memory whole and the size limit (UPLOAD_MAX_BYTES) is enforced as bytes
+arrive. The finished file is renamed to blobs/<sha[:2]>/<sha><.ext> under
+UPLOAD_DIR and an upload_blobs row is upserted with ref_count + 1: the same
+photo posted to a memory, a post, a story and the vault is stored once.
+
+Deleting a referencing row calls release_uploads(), which only decrements;
+blobs that have sat at zero references for a grace period are deleted by
+
+  python -m backend.utils.uploads gc [--grace-hours 24] [--dry-run]
+
+so a rolled-back request can never lose a file another row still uses. The
+file is moved into place before the request commits, so the same command
+also removes blob files that have no row (the first upload of that content
+rolled back, or the process died before commit) and abandoned temp files,
+once they are older than the grace period.
+URLs from before content addressing (/uploads/<uuid>_<name>) are left alone.
+
+Complexity: O(size) hashing and I/O per upload, O(1) statements.
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import aiofiles
+import aiofiles.os
+from sqlalchemy import update, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from dotenv import load_dotenv
+
+from backend.database.models import UploadBlob
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# Whole multipart request, checked from Content-Length before the body is parsed
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+# 256 KiB keeps each inline SHA-256 update well under a millisecond of loop time
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+BLOB_DIR = "blobs"
+TMP_DIR = ".tmp"
+_BLOB_URL = re.compile(rf"^/uploads/{BLOB_DIR}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(?:\.\w+)?$")
+_SAFE_EXT = re.compile(r"^[a-z0-9]{1,10}$")
+
+
+class UploadTooLarge(ValueError):
+    """An upload exceeded UPLOAD_MAX_BYTES."""
+
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    url: str
+    sha256: str
+    size: int
+    deduplicated: bool  # the content was already stored
+
+
+def _extension(filename: Optional[str]) -> str:
+    ext = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    return f".{ext}" if _SAFE_EXT.match(ext) else ""
+
+
+def blob_sha(url: Optional[str]) -> Optional[str]:
+    """SHA-256 of a content-addressed upload URL; None for legacy/other URLs."""
+    match = _BLOB_URL.match(url or "")
+    return match.group(1) if match else None
+
+
+def _upsert(dialect: str):
+    return pg_insert if dialect == "postgresql" else sqlite_insert
+
+
+async def store_upload(db, file, max_bytes: int = UPLOAD_MAX_BYTES) -> StoredUpload:
+    """Stream `file` (a Starlette UploadFile) into blob storage and count a reference.
+
+    The reference is added in `db`'s transaction, so it commits (or rolls
+    back) with the row that stores the returned URL. Raises UploadTooLarge.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    tmp_dir = os.path.join(UPLOAD_DIR, TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                await out.write(chunk)
+
+        sha = digest.hexdigest()
+        now = datetime.utcnow()
+        insert = _upsert(db.bind.dialect.name)(UploadBlob).values(
+            sha256=sha, path=os.path.join(BLOB_DIR, sha[:2], sha + _extension(file.filename)),
+            size=size, ref_count=1, created_at=now, updated_at=now,
+        )
+        # Same content under another extension keeps the first stored path
+        ref_count, path = (await db.execute(
+            insert.on_conflict_do_update(
+                index_elements=[UploadBlob.sha256],
+                set_={"ref_count": UploadBlob.ref_count + 1, "updated_at": now},
+            ).returning(UploadBlob.ref_count, UploadBlob.path)
+        )).one()
+
+        final_path = os.path.join(UPLOAD_DIR, path)
+        await aiofiles.os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # After the upsert, never before: gc deletes a blob's file while holding
+        # its row, so this rename always lands after any concurrent removal.
+        # Always rename: identical bytes, atomic, and it restores a missing file.
+        await aiofiles.os.replace(tmp_path, final_path)
+    except BaseException:
+        try:
+            await aiofiles.os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return StoredUpload(url=f"/uploads/{path}", sha256=sha, size=size, deduplicated=ref_count > 1)
+
+
+async def release_uploads(db, urls: Iterable[Optional[str]]):
+    """Drop one reference per content-addressed URL (in `db`'s transaction)."""
+    now = datetime.utcnow()
+    for url in urls:
+        sha = blob_sha(url)
+        if sha:
+            await db.execute(
+                update(UploadBlob)
+                .where(UploadBlob.sha256 == sha)
+                .values(ref_count=UploadBlob.ref_count - 1, updated_at=now)
+            )
+
+
+# ─── Garbage collection ──────────────────────────────────────────────────────
+
+def collect_garbage(grace: timedelta = timedelta(hours=24), dry_run: bool = False) -> dict:
+    """Delete blobs unreferenced for longer than `grace`, then files older than
+    `grace` that no row points at. Returns counts."""
+    from backend.database.config import SessionLocal
+
+    cutoff = datetime.utcnow() - grace
+    removed, freed = 0, 0
+    db = SessionLocal()
+    try:
+        candidates = db.execute(
+            select(UploadBlob.sha256, UploadBlob.path, UploadBlob.size)
+            .where(UploadBlob.ref_count <= 0, UploadBlob.updated_at < cutoff)
+        ).all()
+        for sha, path, size in candidates:
+            if dry_run:
+                removed, freed = removed + 1, freed + size
+                continue
+            # Re-check in the DELETE: an upload may have re-referenced it since
+            deleted = db.execute(
+                delete(UploadBlob).where(UploadBlob.sha256 == sha, UploadBlob.ref_count <= 0)
+            ).rowcount
+            if not deleted:
+                db.rollback()
+                continue
+            # Remove the file while the DELETE still holds the row (SQLite: the
+            # write lock): a concurrent store_upload's upsert waits for this
+            # commit and only then moves its copy into place. If the commit
+            # fails, the row survives and the next upload restores the file.
+            try:
+                os.remove(os.path.join(UPLOAD_DIR, path))
+            except FileNotFoundError:
+                pass
+            db.commit()
+            removed, freed = removed + 1, freed + size
+    finally:
+        db.close()
+    cutoff_ts = time.time() - grace.total_seconds()
+    orphaned = 0
+    for path, size in _orphan_files(cutoff_ts):
+        if not dry_run:
+            try:
+                # A re-upload may have just replaced the file (fresh mtime) and referenced it
+                if os.stat(path).st_mtime >= cutoff_ts:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+        removed, freed, orphaned = removed + 1, freed + size, orphaned + 1
+    return {"removed": removed, "freed_bytes": freed, "orphans": orphaned, "dry_run": dry_run}
+
+
+def _orphan_files(cutoff_ts: float, batch: int = 500) -> list:
+    """(path, size) of temp files and rowless blob files last modified before cutoff_ts."""
+    from backend.database.config import SessionLocal
+
+    orphans, blobs = [], []
+    for sub in (TMP_DIR, BLOB_DIR):
+        for root, _dirs, files in os.walk(os.path.join(UPLOAD_DIR, sub)):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime >= cutoff_ts:
+                    continue
+                if sub == TMP_DIR:
+                    orphans.append((path, st.st_size))
+                else:
+                    blobs.append((os.path.relpath(path, UPLOAD_DIR), path, st.st_size))
+
+    db = SessionLocal()
+    try:
+        for i in range(0, len(blobs), batch):
+            chunk = blobs[i:i + batch]
+            # Compare whole paths: the row may point at the same content under another extension
+            known = set(db.scalars(select(UploadBlob.path).where(UploadBlob.path.in_([rel for rel, _, _ in chunk]))))
+            orphans.extend((path, size) for rel, path, size in chunk if rel not in known)
+    finally:
+        db.close()
+    return orphans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed upload storage maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="delete blobs no row references any more")
+    gc.add_argument("--grace-hours", type=float, default=24.0)
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    result = collect_garbage(timedelta(hours=args.grace_hours), dry_run=args.dry_run)
+    print(f"{'Would remove' if result['dry_run'] else 'Removed'} {result['removed']} blobs "
+          f"({result['orphans']} without a row, {result['freed_bytes']} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
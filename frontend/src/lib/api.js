@@ -32,6 +32,39 @@ api.interceptors.response.use(
   }
 );
 
+// ─── Pagination ───────────────────────────────────────────────────────────────
+
+// List endpoints are keyset-paginated. These helpers follow the cursor to the
+// last page so callers keep receiving the whole list.
+const withCursor = (url, cursor) =>
+  cursor ? `${url}${url.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}` : url;
+
+// Array bodies carry the next cursor in the X-Next-Cursor header
+const getAllPages = async (url) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const r = await api.get(withCursor(url, cursor));
+    items.push(...r.data);
+    cursor = r.headers['x-next-cursor'];
+  } while (cursor);
+  return items;
+};
+
+// Object bodies carry it as next_cursor next to the `key` array
+const getAllPagesOf = async (url, key) => {
+  const items = [];
+  let data;
+  let cursor = null;
+  do {
+    const r = await api.get(withCursor(url, cursor));
+    data = r.data;
+    items.push(...(data[key] || []));
+    cursor = data.next_cursor;
+  } while (cursor);
+  return { ...data, [key]: items, next_cursor: null };
+};
+
 // ─── Auth ─────────────────────────────────────────────────────────────────────
 
 export const authAPI = {
@@ -53,7 +86,7 @@ export const familyAPI = {
 // ─── People ───────────────────────────────────────────────────────────────────
 
 export const peopleAPI = {
-  list: (familyId) => api.get(`/family/${familyId}/people`).then((r) => r.data),
+  list: (familyId) => getAllPages(`/family/${familyId}/people`),
   create: (familyId, formData) =>
     api.post(`/family/${familyId}/people`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
@@ -117,7 +150,7 @@ export const feedAPI = {
     fd.append('text', text);
     return api.post(`/posts/${postId}/comment`, fd).then((r) => r.data);
   },
-  getComments: (postId) => api.get(`/posts/${postId}/comments`).then((r) => r.data),
+  getComments: (postId) => getAllPages(`/posts/${postId}/comments`),
 };
 
 export const storiesAPI = {
@@ -132,7 +165,7 @@ export const vaultAPI = {
     let url = `/vault?family_id=${familyId}`;
     if (folder && folder !== 'All') url += `&folder=${encodeURIComponent(folder)}`;
     if (fileType) url += `&file_type=${fileType}`;
-    return api.get(url).then((r) => r.data);
+    return getAllPagesOf(url, 'items');
   },
   upload: (formData) =>
     api.post('/vault/upload', formData, { headers: { 'Content-Type': 'multipart/form-data' } }).then((r) => r.data),
@@ -140,7 +173,7 @@ export const vaultAPI = {
 };
 
 export const notificationsAPI = {
-  list: () => api.get('/notifications').then((r) => r.data),
+  list: () => getAllPages('/notifications'),
   markAllRead: () => api.post('/notifications/read-all').then((r) => r.data),
   unreadCount: () => api.get('/notifications/unread-count').then((r) => r.data),
 };
@@ -152,7 +185,7 @@ export const birthdaysAPI = {
 // ─── Trips ────────────────────────────────────────────────────────────────────
 
 export const tripsAPI = {
-  list: (familyId) => api.get(`/home/trips?family_id=${familyId}`).then((r) => r.data),
+  list: (familyId) => getAllPagesOf(`/home/trips?family_id=${familyId}`, 'trips'),
   get: (tripId) => api.get(`/home/trip/${tripId}`).then((r) => r.data),
   create: (formData) =>
     api.post('/home/trip', formData, {
@@ -0,0 +1,36 @@
+"""
+Point the app at a throwaway SQLite database and upload directory before any
+backend module reads its settings at import time.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="memoir-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'memoir.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_tmp, "vector_index")
+
+
+@pytest.fixture
+def count_statements():
+    """Context manager counting SQL statements sent through `engine`."""
+    from sqlalchemy import event
+
+    @contextmanager
+    def counting(engine):
+        count = [0]
+
+        def before_cursor_execute(*args):
+            count[0] += 1
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield count
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
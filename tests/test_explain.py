@@ -0,0 +1,12 @@
+"""
+Every registered hot query must plan index lookups, not full table scans, on
+the seeded dataset (backend.database.explain; the CLI runs a larger seed).
+"""
+from backend.database.explain import check_hot_queries, HOT_QUERIES
+
+
+def test_hot_queries_use_indexes():
+    report = check_hot_queries(families=30, per_family=10)
+    assert len(report) == len(HOT_QUERIES)
+    scans = {name: (tables, plan) for name, tables, plan in report if tables}
+    assert not scans, "\n".join(f"{name} scans {', '.join(t)}:\n  " + "\n  ".join(p) for name, (t, p) in scans.items())
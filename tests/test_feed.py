@@ -0,0 +1,101 @@
+"""
+GET /feed assembles a page in a fixed number of statements, however many
+posts (and comments per post) it holds, without changing the response shape.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.database.config import SessionLocal, async_engine
+from backend.database.models import (
+    User, Family, FamilyMember, MemberRole, Post, PostPhoto, PostLike, PostComment,
+)
+from backend.routes.main import app, create_access_token
+
+POST_KEYS = {
+    "id", "user_id", "family_id", "caption", "location", "created_at", "photos", "user",
+    "likes_count", "comments_count", "user_has_liked", "recent_comments",
+}
+COMMENT_KEYS = {"id", "user_id", "user_name", "text", "created_at"}
+COMMENTS_PER_POST = 4
+
+
+def _user(name):
+    return User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name=name)
+
+
+def _seed(n):
+    """n posts by distinct authors, each with a photo, the viewer's like and
+    COMMENTS_PER_POST comments by distinct commenters."""
+    db = SessionLocal()
+    try:
+        viewer = _user("Viewer")
+        family = Family(id=uuid.uuid4(), name="Family", created_by=viewer.id)
+        db.add_all([viewer, family, FamilyMember(id=uuid.uuid4(), user_id=viewer.id, family_id=family.id,
+                                                 role=MemberRole.admin)])
+        start = datetime.utcnow() - timedelta(days=1)
+        for i in range(n):
+            author = _user(f"Author {i}")
+            post = Post(id=uuid.uuid4(), user_id=author.id, family_id=family.id, caption=f"Post {i}",
+                        created_at=start + timedelta(minutes=i), likes_count=1, comments_count=COMMENTS_PER_POST)
+            db.add_all([
+                author, post,
+                PostPhoto(id=uuid.uuid4(), post_id=post.id, photo_url=f"/uploads/{i}.jpg", display_order=0),
+                PostLike(id=uuid.uuid4(), post_id=post.id, user_id=viewer.id),
+            ])
+            for j in range(COMMENTS_PER_POST):
+                commenter = _user(f"Commenter {i}.{j}")
+                db.add_all([commenter, PostComment(
+                    id=uuid.uuid4(), post_id=post.id, user_id=commenter.id, text=f"comment {i}.{j}",
+                    created_at=start + timedelta(minutes=i, seconds=j + 1),
+                )])
+        db.commit()
+        return str(viewer.id), str(family.id)
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def _feed(client, count_statements, n):
+    viewer_id, family_id = _seed(n)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': viewer_id})}"}
+    path = f"/feed?family_id={family_id}&limit=50"
+    assert client.get(path, headers=headers).status_code == 200  # warms the principal cache
+    with count_statements(async_engine.sync_engine) as count:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return count[0], response.json()
+
+
+def test_feed_query_count_is_constant(client, count_statements):
+    small, _ = _feed(client, count_statements, 3)
+    large, body = _feed(client, count_statements, 30)
+    assert small == large
+    assert len(body["posts"]) == 30
+
+
+def test_feed_response_shape_and_recent_comments(client, count_statements):
+    _, body = _feed(client, count_statements, 3)
+    assert set(body) == {"posts", "next_cursor", "has_more"}
+    assert body["next_cursor"] is None and body["has_more"] is False
+    assert [p["caption"] for p in body["posts"]] == ["Post 2", "Post 1", "Post 0"]
+    for post in body["posts"]:
+        i = post["caption"].split()[1]
+        assert set(post) == POST_KEYS
+        assert set(post["user"]) == {"id", "name", "avatar_url"} and post["user"]["name"] == f"Author {i}"
+        assert [set(p) for p in post["photos"]] == [{"id", "photo_url", "caption", "display_order"}]
+        assert [p["photo_url"] for p in post["photos"]] == [f"/uploads/{i}.jpg"]
+        assert post["likes_count"] == 1 and post["user_has_liked"] is True
+        assert post["comments_count"] == COMMENTS_PER_POST
+        # The last two comments, oldest first, each with its author's name
+        last = range(COMMENTS_PER_POST - 2, COMMENTS_PER_POST)
+        assert [set(c) for c in post["recent_comments"]] == [COMMENT_KEYS] * 2
+        assert [c["text"] for c in post["recent_comments"]] == [f"comment {i}.{j}" for j in last]
+        assert [c["user_name"] for c in post["recent_comments"]] == [f"Commenter {i}.{j}" for j in last]
@@ -0,0 +1,97 @@
+"""
+List endpoints must batch their per-row lookups (users, counts, views) into
+IN-list or grouped queries: the statement count for a page of 3 rows and a
+page of 30 rows is the same.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.database.config import SessionLocal, async_engine
+from backend.database.models import (
+    User, Family, FamilyMember, MemberRole, Person, Relationship, Memory,
+    Trip, TripPerson, TripMemory, Story, StoryView,
+)
+from backend.routes.main import app, create_access_token
+
+
+def _user(name):
+    return User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name=name)
+
+
+def _seed(n):
+    """An owner in n families; the first has n members, people, relationships,
+    trips (the first linked to every person and memory) and viewed stories."""
+    db = SessionLocal()
+    try:
+        owner = _user("Owner")
+        families = [Family(id=uuid.uuid4(), name=f"Family {i}", created_by=owner.id) for i in range(n)]
+        db.add(owner)
+        db.add_all(families)
+        db.add_all([FamilyMember(id=uuid.uuid4(), user_id=owner.id, family_id=f.id, role=MemberRole.admin)
+                    for f in families])
+        family = families[0]
+        trips = [Trip(id=uuid.uuid4(), family_id=family.id, name=f"Trip {i}", created_by=owner.id) for i in range(n)]
+        db.add_all(trips)
+        people = []
+        for i in range(n):
+            user = _user(f"User {i}")
+            person = Person(id=uuid.uuid4(), family_id=family.id, name=f"Person {i}", created_by=owner.id)
+            memory = Memory(id=uuid.uuid4(), person_id=person.id, family_id=family.id,
+                            title=f"Memory {i}", created_by_user_id=user.id)
+            story = Story(id=uuid.uuid4(), user_id=user.id, family_id=family.id, media_url=f"/uploads/{i}.jpg",
+                          expires_at=datetime.utcnow() + timedelta(hours=1))
+            db.add_all([
+                user, person, memory, story,
+                FamilyMember(id=uuid.uuid4(), user_id=user.id, family_id=family.id, role=MemberRole.member),
+                StoryView(id=uuid.uuid4(), story_id=story.id, viewer_id=owner.id),
+                TripPerson(id=uuid.uuid4(), trip_id=trips[0].id, person_id=person.id),
+                TripMemory(id=uuid.uuid4(), trip_id=trips[0].id, memory_id=memory.id),
+            ])
+            if people:
+                db.add(Relationship(id=uuid.uuid4(), family_id=family.id, person_a_id=people[-1].id,
+                                    person_b_id=person.id, label="sibling"))
+            people.append(person)
+        db.commit()
+        return str(owner.id), str(family.id), str(trips[0].id)
+    finally:
+        db.close()
+
+
+PATHS = [
+    "/family/{family_id}",
+    "/user/families",
+    "/family/{family_id}/people",
+    "/family/{family_id}/relationships",
+    "/home/trips?family_id={family_id}",
+    "/home/trip/{trip_id}",
+    "/stories?family_id={family_id}",
+]
+
+
+def _query_counts(client, count_statements, n):
+    user_id, family_id, trip_id = _seed(n)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}
+    counts = {}
+    for template in PATHS:
+        path = template.format(family_id=family_id, trip_id=trip_id)
+        assert client.get(path, headers=headers).status_code == 200  # warms the principal cache
+        with count_statements(async_engine.sync_engine) as count:
+            response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        counts[template] = count[0]
+    return counts
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_list_endpoint_query_counts_are_constant(client, count_statements):
+    small = _query_counts(client, count_statements, 3)
+    large = _query_counts(client, count_statements, 30)
+    assert small == large
@@ -0,0 +1,59 @@
+"""
+The in-process vector index must pick up memories written, deleted or
+re-embedded by other processes (modelled here as direct DB writes that never
+call local_index.add/remove).
+"""
+import uuid
+
+import pytest
+
+from backend.database.config import SessionLocal, init_db
+from backend.database.models import User, Family, Person, Memory
+from backend.rag import local_index
+from backend.rag.embeddings import EMBEDDING_MODEL_VERSION
+
+pytestmark = pytest.mark.skipif(not local_index.NUMPY_AVAILABLE, reason="numpy not installed")
+
+
+def _memory(family, person, owner, vector, model=EMBEDDING_MODEL_VERSION):
+    return Memory(id=uuid.uuid4(), person_id=person.id, family_id=family.id, title="m",
+                  created_by_user_id=owner.id, embedding=vector, embedding_model=model)
+
+
+def _ids(family_id, db, vector):
+    return [memory_id for memory_id, _ in local_index.search(family_id, vector, db, k=10)]
+
+
+def test_index_sees_writes_from_other_processes():
+    init_db()
+    db = SessionLocal()
+    try:
+        owner = User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name="Owner")
+        family = Family(id=uuid.uuid4(), name="Family", created_by=owner.id)
+        person = Person(id=uuid.uuid4(), family_id=family.id, name="Person", created_by=owner.id)
+        a = _memory(family, person, owner, [1.0, 0.0, 0.0, 0.0])
+        stale = _memory(family, person, owner, [0.0, 1.0, 0.0, 0.0], model="old-model")
+        db.add_all([owner, family, person, a, stale])
+        db.commit()
+        family_id = str(family.id)
+        assert set(_ids(family_id, db, [1.0, 0.0, 0.0, 0.0])) == {str(a.id), str(stale.id)}
+
+        # Created elsewhere
+        b = _memory(family, person, owner, [0.0, 0.0, 1.0, 0.0])
+        db.add(b)
+        db.commit()
+        assert _ids(family_id, db, [0.0, 0.0, 1.0, 0.0])[0] == str(b.id)
+
+        # Deleted elsewhere
+        db.delete(a)
+        db.commit()
+        assert str(a.id) not in _ids(family_id, db, [1.0, 0.0, 0.0, 0.0])
+
+        # Re-embedded in place elsewhere: same ids, new vector
+        stale.embedding = [0.0, 0.0, 0.0, 1.0]
+        stale.embedding_model = EMBEDDING_MODEL_VERSION
+        db.commit()
+        top_id, score = local_index.search(family_id, [0.0, 0.0, 0.0, 1.0], db, k=1)[0]
+        assert top_id == str(stale.id) and score == pytest.approx(1.0)
+    finally:
+        db.close()
@@ -0,0 +1,73 @@
+"""
+Search results are cached only when every leg succeeded: a leg that swallows
+an error (or cannot embed the query) must not pin a degraded result until the
+family's next write.
+"""
+import uuid
+import asyncio
+
+import pytest
+
+from backend.database.config import SessionLocal, init_db
+from backend.database.models import User, Family, Person, Memory
+from backend.rag import vector_store, embeddings
+from backend.rag.search_cache import search_cache
+
+
+@pytest.fixture
+def family_id():
+    init_db()
+    db = SessionLocal()
+    try:
+        owner = User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name="Owner")
+        family = Family(id=uuid.uuid4(), name="Family", created_by=owner.id)
+        person = Person(id=uuid.uuid4(), family_id=family.id, name="Person", created_by=owner.id)
+        memory = Memory(id=uuid.uuid4(), person_id=person.id, family_id=family.id,
+                        title="Beach party", created_by_user_id=owner.id)
+        db.add_all([owner, family, person, memory])
+        db.commit()
+        return str(family.id)
+    finally:
+        db.close()
+
+
+def _cached(family_id, mode):
+    return search_cache.get(search_cache.key(family_id, mode, "beach", 20, fusion="weighted"))
+
+
+def _sync_search(family_id, mode):
+    db = SessionLocal()
+    try:
+        return vector_store.hybrid_query(family_id, "beach", db, mode=mode)
+    finally:
+        db.close()
+
+
+def _async_search(family_id, mode):
+    return asyncio.run(vector_store.hybrid_query_async(family_id, "beach", mode=mode))
+
+
+@pytest.mark.parametrize("search", [_sync_search, _async_search])
+def test_failed_keyword_leg_is_not_cached(monkeypatch, family_id, search):
+    monkeypatch.setattr(vector_store, "_fts5_search", lambda *args: None)  # FTS5 error
+    monkeypatch.setattr(vector_store, "get_capabilities",
+                        lambda: {"fts5": True, "tsvector": False, "trigram": False, "pgvector": False})
+    assert [r["title"] for r in search(family_id, "keyword")] == ["Beach party"]  # ILIKE fallback
+    assert _cached(family_id, "keyword") is None
+
+    monkeypatch.undo()
+    search(family_id, "keyword")
+    assert _cached(family_id, "keyword") is not None
+
+
+@pytest.mark.parametrize("search", [_sync_search, _async_search])
+def test_transient_embedding_failure_is_not_cached(monkeypatch, family_id, search):
+    monkeypatch.setattr(vector_store, "_get_embedding", lambda text: None)
+    monkeypatch.setattr(embeddings, "embed_async", lambda text: asyncio.sleep(0, result=None))
+    monkeypatch.setattr(embeddings, "_unavailable", False)  # a failed load, not a missing package
+    search(family_id, "hybrid")
+    assert _cached(family_id, "hybrid") is None
+
+    monkeypatch.setattr(embeddings, "_unavailable", True)  # sentence-transformers not installed
+    search(family_id, "hybrid")
+    assert _cached(family_id, "hybrid") is not None
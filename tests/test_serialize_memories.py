@@ -0,0 +1,47 @@
+"""
+serialize_memories must prefetch photos, contributors and people with one
+query each, however many memories it is given (no per-memory N+1).
+"""
+import uuid
+import asyncio
+
+from backend.database.config import init_db, async_engine, AsyncSessionLocal
+from backend.database.models import User, Family, Person, Memory, MemoryPhoto
+from backend.routes.main import serialize_memories
+
+
+async def _seed(db, n):
+    """n memories, each by its own contributor about its own person, with 2 photos."""
+    memories = []
+    owner = User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name="Owner")
+    family = Family(id=uuid.uuid4(), name="Family", created_by=owner.id)
+    db.add_all([owner, family])
+    for i in range(n):
+        user = User(id=uuid.uuid4(), email=f"{uuid.uuid4()}@example.com", password_hash="x", name=f"User {i}")
+        person = Person(id=uuid.uuid4(), family_id=family.id, name=f"Person {i}", created_by=owner.id)
+        memory = Memory(id=uuid.uuid4(), person_id=person.id, family_id=family.id,
+                        title=f"Memory {i}", created_by_user_id=user.id)
+        photos = [MemoryPhoto(id=uuid.uuid4(), memory_id=memory.id, photo_url=f"/uploads/{i}_{j}.jpg", display_order=j)
+                  for j in range(2)]
+        db.add_all([user, person, memory, *photos])
+        memories.append(memory)
+    await db.commit()
+    return memories
+
+
+async def _serialize_query_count(count_statements, n):
+    async with AsyncSessionLocal() as db:
+        memories = await _seed(db, n)
+    async with AsyncSessionLocal() as db:
+        memories = [await db.get(Memory, m.id) for m in memories]
+        with count_statements(async_engine.sync_engine) as count:
+            results = await serialize_memories(memories, db)
+    assert len(results) == n
+    assert all(len(r["photos"]) == 2 and r["contributor"] and r["person_name"] for r in results)
+    return count[0]
+
+
+def test_serialize_memories_query_count_is_constant(count_statements):
+    init_db()
+    assert asyncio.run(_serialize_query_count(count_statements, 3)) == 3
+    assert asyncio.run(_serialize_query_count(count_statements, 30)) == 3
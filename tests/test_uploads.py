@@ -0,0 +1,62 @@
+"""
+Upload blob garbage collection: unreferenced blobs past the grace period lose
+their row and file, and the file goes while the row's DELETE is still
+uncommitted, so a concurrent re-upload can never have its file removed.
+"""
+import os
+import uuid
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from backend.database.config import SessionLocal, engine, init_db
+from backend.database.models import UploadBlob
+from backend.utils import uploads
+
+
+def _blob(ref_count, age=timedelta(days=2)):
+    data = uuid.uuid4().bytes
+    sha = hashlib.sha256(data).hexdigest()
+    path = os.path.join(uploads.BLOB_DIR, sha[:2], f"{sha}.bin")
+    os.makedirs(os.path.join(uploads.UPLOAD_DIR, os.path.dirname(path)), exist_ok=True)
+    with open(os.path.join(uploads.UPLOAD_DIR, path), "wb") as f:
+        f.write(data)
+    updated = datetime.utcnow() - age
+    db = SessionLocal()
+    try:
+        db.add(UploadBlob(sha256=sha, path=path, size=len(data), ref_count=ref_count,
+                          created_at=updated, updated_at=updated))
+        db.commit()
+    finally:
+        db.close()
+    return sha, os.path.join(uploads.UPLOAD_DIR, path)
+
+
+def _row_committed(sha):
+    with engine.connect() as conn:
+        return conn.execute(select(UploadBlob.sha256).where(UploadBlob.sha256 == sha)).first() is not None
+
+
+def test_gc_removes_only_unreferenced_blobs_past_grace(monkeypatch):
+    init_db()
+    dead_sha, dead = _blob(0)
+    live_sha, live = _blob(1)
+    young_sha, young = _blob(0, age=timedelta(minutes=5))
+
+    seen_at_remove = {}
+    real_remove = os.remove
+
+    def remove(path):
+        if path == dead:
+            seen_at_remove["row_committed"] = _row_committed(dead_sha)
+        real_remove(path)
+
+    monkeypatch.setattr(uploads.os, "remove", remove)
+    result = uploads.collect_garbage(timedelta(hours=1))
+
+    assert result["removed"] >= 1
+    assert not os.path.exists(dead) and not _row_committed(dead_sha)
+    assert seen_at_remove == {"row_committed": True}  # file went before the DELETE committed
+    assert os.path.exists(live) and _row_committed(live_sha)
+    assert os.path.exists(young) and _row_committed(young_sha)